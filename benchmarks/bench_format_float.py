@@ -0,0 +1,52 @@
+"""
+Throughput benchmark for the distance formatting in 
+`newick.backend.util_funcs`.
+
+Usage:
+    python benchmarks/bench_format_float.py [count]
+"""
+import random
+import sys
+import time
+
+sys.path.append('.')
+from newick.backend.util_funcs import make_float_formatter
+
+
+def gen_distances(count:int, default_share:float=0.7, seed:int=0) -> list:
+    """
+    Generates `count` distances, of which about `default_share` are 
+    the default distance 1.0, and the rest are random.
+    """
+    rnd = random.Random(seed)
+    return [1.0 if rnd.random() < default_share 
+            else rnd.random() * 10 ** rnd.randint(-9, 3) 
+            for _ in range(count)]
+
+def run(count:int=10_000_000) -> dict:
+    """
+    Times all formatting modes on the same distances.
+
+    Returns:
+        dict: mode name -> distances per second.
+    """
+    distances = gen_distances(count)
+    formatters = {
+        "baseline": lambda num: format(num, 'f').rstrip('0').rstrip('.'),
+        "fixed6": make_float_formatter("fixed", 6),
+        "significant9": make_float_formatter("significant", 9),
+        "shortest": make_float_formatter("shortest"),
+    }
+    ret = dict()
+    for name, fmt in formatters.items():
+        start = time.perf_counter()
+        for d in distances:
+            fmt(d)
+        ret[name] = count / (time.perf_counter() - start)
+    return ret
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    for name, rate in run(count).items():
+        print(f"{name:>14}: {rate / 1e6:8.2f} M distances/s")
@@ -0,0 +1,83 @@
+"""
+Synthetic inputs for the benchmarks, as path tables in the format of 
+the `very_basic` parser (one path per line, waypoints separated by 
+",", lines terminated by ";").
+
+Each generator takes the approximate number of nodes of the resulting 
+tree and returns the list of lines (without the line delimiter).
+"""
+import math
+import random
+
+
+def gen_balanced(n_nodes:int, seed:int=0) -> list:
+    """
+    Binary tree: one line per leaf, labels encode the branch taken.
+    """
+    depth = max(1, round(math.log2(n_nodes + 1)) - 1)
+    lines = []
+    for leaf in range(2 ** depth):
+        waypoints = []
+        for level in range(depth, 0, -1):
+            waypoints.append("n" + format((leaf >> (level - 1)), 'b'))
+        lines.append(','.join(waypoints) + ':0.5')
+    return lines
+
+def gen_caterpillar(n_nodes:int, comb_depth:int=64, seed:int=0) -> list:
+    """
+    Combs of `comb_depth` levels each, where every spine node has one 
+    leaf. The depth is bounded, so that the recursive parts of the 
+    library are not limited by the recursion limit.
+    """
+    lines = []
+    n_combs = max(1, n_nodes // (2 * comb_depth))
+    for comb in range(n_combs):
+        spine = []
+        for level in range(comb_depth):
+            spine.append("c" + str(comb) + "_" + str(level))
+            lines.append(','.join(spine) + ",leaf" + str(level) + ":2")
+    return lines
+
+def gen_star(n_nodes:int, seed:int=0) -> list:
+    """
+    A root with `n_nodes` leaves.
+    """
+    return ["s" + str(i) + ":1.5" for i in range(n_nodes)]
+
+def gen_taxonomy(n_nodes:int, 
+                 duplicates:float=1.0, 
+                 seed:int=0) -> list:
+    """
+    Classification table with 7 ranks: few distinct values on the upper
+    ranks and many on the lower ones, occasional "n.a." placeholders 
+    and, on average, `duplicates` repetitions per distinct line.
+    """
+    rnd = random.Random(seed)
+    ranks = 7
+    n_lines = max(1, n_nodes // 2)
+    branching = max(2, math.ceil(n_lines ** (1 / (ranks - 1))))
+    distinct = []
+    for _ in range(n_lines):
+        line = []
+        index = 0
+        for r in range(ranks):
+            if rnd.random() < 0.02:
+                line.append("n.a.")
+                break
+            index = index * branching + rnd.randrange(branching)
+            line.append("t" + str(r) + "_" + str(index))
+        distinct.append(','.join(line))
+    lines = list(distinct)
+    for _ in range(int(n_lines * duplicates)):
+        # skewed towards the first lines
+        lines.append(distinct[int(len(distinct) * rnd.random() ** 3)])
+    rnd.shuffle(lines)
+    return lines
+
+
+SHAPES = {
+    "balanced": gen_balanced,
+    "caterpillar": gen_caterpillar,
+    "star": gen_star,
+    "taxonomy": gen_taxonomy,
+}
@@ -0,0 +1,205 @@
+"""
+Benchmark suite for parsing, insertion and serialization.
+
+Runs every selected input shape (see `generators.py`) at every selected
+size and writes the results as JSON, so that runs on different commits
+can be compared.
+
+Usage:
+    python benchmarks/run.py [--sizes 1000 10000 ...] [--shapes ...]
+                             [--repeat N] [--memory] [--output FILE]
+    python benchmarks/run.py --compare OLD.json NEW.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.dirname(__file__))
+from newick.backend.tree import Tree
+from newick.backend.path import Path
+from newick.frontend.very_basic import tree_parse_basic, PARSER_INFO_KEYS
+from generators import SHAPES
+
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+
+def _timed(fn, repeat:int):
+    """
+    Runs `fn` `repeat` times and returns the best time in seconds and
+    the result of the last run.
+    """
+    best = float('inf')
+    ret = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        ret = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, ret
+
+def _to_paths(lines:list, root_label:str) -> list:
+    paths = []
+    for line in lines:
+        path = Path(root_label)
+        for waypoint in line.split(','):
+            split = waypoint.split(':')
+            path.add(split[0], float(split[1]) if len(split) > 1 else float('-inf'))
+        paths.append(path)
+    return paths
+
+def bench_case(shape:str, size:int, repeat:int=3, memory:bool=False) -> dict:
+    """
+    Benchmarks a single input.
+
+    Returns:
+        dict: the metrics of this case.
+    """
+    lines = SHAPES[shape](size)
+    text = ';\n'.join(lines) + ';\n'
+    paths = _to_paths(lines, "r")
+    ret = {"shape": shape, "size": size, "lines": len(lines), 
+           "input_bytes": len(text)}
+    
+    parse = lambda: tree_parse_basic(text, "r")
+    ret["parse_s"], tree = _timed(parse, repeat)
+    ret["nodes"] = tree._root.get_subtree_size()
+    ret["parse_aggregated_s"], _ = _timed(
+        lambda: tree_parse_basic(text, "r", aggregate_lines=1 << 16), repeat)
+    
+    def insert():
+        t = Tree(Tree.RootNode("r"))
+        for p in paths:
+            t.add_new_node(p)
+        return t
+    ret["insert_s"], _ = _timed(insert, repeat)
+    
+    ret["to_string_s"], out = _timed(tree.to_string, repeat)
+    ret["output_bytes"] = len(out)
+    ret["to_string_nhx_s"], out = _timed(
+        lambda: tree.to_string(with_additional_info_nhx=True), repeat)
+    ret["output_nhx_bytes"] = len(out)
+    # compact NHX: without default distances and the parser's own keys
+    ret["to_string_compact_s"], out = _timed(
+        lambda: tree.to_string(with_additional_info_nhx=True,
+                               omit_default_distances=True,
+                               nhx_key_filter=PARSER_INFO_KEYS), repeat)
+    ret["output_compact_bytes"] = len(out)
+    ret["index_parents_s"], _ = _timed(tree.index_parents, repeat)
+    # collapsing unary chains: nodes and serialization time afterwards,
+    # to compare with "nodes" and "to_string_s"
+    def collapse():
+        t = tree.clone(copy_on_write=False)
+        start = time.perf_counter()
+        t.collapse_unary_chains()
+        return time.perf_counter() - start, t
+    ret["collapse_s"], collapsed = min((collapse() for _ in range(repeat)),
+                                       key=lambda r: r[0])
+    ret["collapsed_nodes"] = collapsed._root.get_subtree_size()
+    ret["to_string_collapsed_s"], out = _timed(collapsed.to_string, repeat)
+    ret["output_collapsed_bytes"] = len(out)
+    del collapsed
+    
+    if memory:
+        del tree
+        gc.collect()
+        tracemalloc.start()
+        tree = parse()
+        tree_bytes, ret["parse_peak_bytes"] = tracemalloc.get_traced_memory()
+        ret["tree_bytes"] = tree_bytes
+        # overhead of the parent index relative to the tree itself
+        tree.index_parents()
+        ret["parent_index_bytes"] = tracemalloc.get_traced_memory()[0] - tree_bytes
+        tracemalloc.reset_peak()
+        tree.to_string(with_additional_info_nhx=True)
+        ret["to_string_nhx_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return ret
+
+def run(shapes:list, sizes:list, repeat:int=3, memory:bool=False, 
+        log=sys.stderr) -> dict:
+    """
+    Benchmarks all combinations of `shapes` and `sizes`.
+
+    Returns:
+        dict: the results with some metadata on the environment.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], 
+                                capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__)).stdout.strip()
+    except OSError:
+        commit = None
+    results = []
+    for shape in shapes:
+        for size in sizes:
+            res = bench_case(shape, size, repeat, memory)
+            if log:
+                print(shape, size, {k: v for k, v in res.items() 
+                                    if k.endswith('_s')}, file=log)
+            results.append(res)
+    return {"meta": {"commit": commit,
+                     "python": platform.python_version(),
+                     "platform": platform.platform(),
+                     "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                     "repeat": repeat},
+            "results": results}
+
+def compare(old:dict, new:dict) -> list:
+    """
+    Compares two result sets case by case.
+
+    Returns:
+        list: lines of text, with the ratio new/old for each metric.
+    """
+    index = {(r["shape"], r["size"]): r for r in old["results"]}
+    ret = ["old: " + str(old["meta"].get("commit")) 
+           + "  new: " + str(new["meta"].get("commit"))]
+    for r in new["results"]:
+        o = index.get((r["shape"], r["size"]))
+        if o is None:
+            continue
+        for key, val in r.items():
+            if (key.endswith('_s') or key.endswith('_bytes')) \
+                    and key in o and o[key]:
+                ret.append(f"{r['shape']:>12} {r['size']:>9} {key:>26}: "
+                           f"{o[key]:.4g} -> {val:.4g} ({val / o[key]:.2f}x)")
+    return ret
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shapes", nargs="+", default=list(SHAPES), 
+                        choices=list(SHAPES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES,
+                        help="approximate node counts, up to 10^7")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--memory", action="store_true",
+                        help="also measure peak memory (slow)")
+    parser.add_argument("--output", default=None, 
+                        help="JSON file to write (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="compare two result files instead")
+    args = parser.parse_args(argv)
+    if args.compare:
+        with open(args.compare[0]) as f_old, open(args.compare[1]) as f_new:
+            print('\n'.join(compare(json.load(f_old), json.load(f_new))))
+        return
+    res = run(args.shapes, args.sizes, args.repeat, args.memory)
+    out = json.dumps(res, indent=1)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(out)
+    else:
+        print(out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Builds newick trees from paths.
+
+The public API is available right from this package, e.g. 
+`newick.parse(text, "root")` or `newick.Tree`. The names are resolved 
+on first use, so that `import newick` itself is cheap.
+"""
+
+# public name -> (module, attribute)
+_LAZY_NAMES = {
+    "parse":                ("newick.frontend.very_basic", "tree_parse_basic"),
+    "tree_parse_basic":     ("newick.frontend.very_basic", "tree_parse_basic"),
+    "BlacklistTokenStrat":  ("newick.frontend.very_basic", "BlacklistTokenStrat"),
+    "ParseCheckpoint":      ("newick.frontend.very_basic", "ParseCheckpoint"),
+    "tree_parse_file":      ("newick.frontend.very_basic", "tree_parse_file"),
+    "write_tree_file":      ("newick.frontend.compression", "write_tree_file"),
+    "parse_newick":         ("newick.frontend.forest", "parse_newick"),
+    "read_forest":          ("newick.frontend.forest", "read_forest"),
+    "write_forest":         ("newick.frontend.forest", "write_forest"),
+    "to_columns":           ("newick.frontend.table", "to_columns"),
+    "from_columns":         ("newick.frontend.table", "from_columns"),
+    "Tree":                 ("newick.backend.tree", "Tree"),
+    "Node":                 ("newick.backend.node", "Node"),
+    "HybridNode":           ("newick.backend.node", "HybridNode"),
+    "RootNode":             ("newick.backend.node", "RootNode"),
+    "Path":                 ("newick.backend.path", "Path"),
+    "make_float_formatter": ("newick.backend.util_funcs", "make_float_formatter"),
+    "BuildProfile":         ("newick.backend.profiling", "BuildProfile"),
+    "CancelToken":          ("newick.backend.progress", "CancelToken"),
+    "Cancelled":            ("newick.backend.progress", "Cancelled"),
+    "open_lazy":            ("newick.backend.lazy", "open_lazy"),
+    "consensus_tree":       ("newick.backend.consensus", "consensus_tree"),
+    "majority_consensus":   ("newick.backend.consensus", "majority_consensus"),
+    "strict_consensus":     ("newick.backend.consensus", "strict_consensus"),
+    "robinson_foulds":      ("newick.backend.distance", "robinson_foulds"),
+    "branch_score_distance": ("newick.backend.distance", "branch_score_distance"),
+    "distance_matrix":      ("newick.backend.distance", "distance_matrix"),
+}
+
+__all__ = list(_LAZY_NAMES)
+
+
+def __getattr__(name:str):
+    target = _LAZY_NAMES.get(name)
+    if target is None:
+        raise AttributeError(f"module 'newick' has no attribute '{name}'")
+    module = __import__(target[0], fromlist=[target[1]])
+    ret = getattr(module, target[1])
+    globals()[name] = ret  # resolve only once
+    return ret
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
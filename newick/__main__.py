@@ -0,0 +1,4 @@
+import sys
+from newick.frontend.cli import main
+
+sys.exit(main())
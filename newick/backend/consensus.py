@@ -0,0 +1,471 @@
+from collections.abc import Iterable, Iterator
+from .node import Node, RootNode
+from .tree import Tree
+
+
+# Splits are represented as leaf bitsets: Python ints in which bit `i`
+# is set iff the `i`-th taxon (in the order of `get_taxa()`) is part of
+# the cluster. Bitsets are hashable and cheap to compare, so they can
+# be counted in a plain dict.
+
+
+def get_taxa(tree:Tree) -> list:
+    """
+    Collects the labels of the leaves of the `tree`.
+
+    Args:
+        tree (Tree): the tree.
+
+    Raises:
+        ValueError: When two leaves have the same label.
+
+    Returns:
+        list: the leaf labels, sorted, so that trees on the same taxa
+        get the same order (and thus the same bit per taxon).
+    """
+    ret = []
+    stack = [tree._root]
+    while len(stack) > 0:
+        node = stack.pop()
+        if len(node._children_by_label) == 0:
+            ret.append(node._label)
+        else:
+            stack.extend(node._children)
+    ret.sort()
+    for i in range(1, len(ret)):
+        if ret[i] == ret[i - 1]:
+            msg = \
+                "Leaf labels have to be unique within the tree."
+            raise ValueError(ret[i], msg)
+    return ret
+
+def extract_splits(tree:Tree,
+                   taxa:dict,
+                   rooted:bool=True,
+                   labels:dict=None) -> dict:
+    """
+    Extracts the splits of the `tree` in a single iterative post-order
+    pass. In rooted trees, the split of a node is the set of leaves
+    below it (its cluster); in unrooted ones, it is the side of its
+    edge not containing the first taxon. The root itself has no split.
+    Leaves are included (as single bits), so that the pendant edges
+    keep their lengths.
+
+    Args:
+        tree (Tree): the tree.
+        taxa (dict): maps each leaf label to its bit, see `get_taxa()`.
+        rooted (bool, optional):
+            Whether to treat the tree as rooted. Defaults to True.
+        labels (dict, optional):
+            If given, the label of the node of each non-trivial split
+            is stored in it (the lowest one for unary chains).
+
+    Raises:
+        ValueError: When the leaves of the `tree` are not exactly the
+            `taxa`.
+
+    Returns:
+        dict: maps each split (int) to the length of its edge. Nodes
+        with the same split (unary chains, or the two children of the
+        root if unrooted) add up their distances.
+    """
+    ret = dict()
+    full = (1 << len(taxa)) - 1
+    n_leaves = 0
+    # (node, cluster of the children visited so far, parent's entry)
+    root_entry = [tree._root, 0, None]
+    stack = [(root_entry, False)]
+    while len(stack) > 0:
+        entry, visited = stack.pop()
+        node = entry[0]
+        children = node._children_by_label
+        if not visited and len(children) > 0:
+            stack.append((entry, True))
+            for child in children.values():
+                stack.append(([child, 0, entry], False))
+            continue
+        if len(children) == 0:
+            bit = taxa.get(node._label)
+            if bit is None:
+                msg = \
+                    "The leaf is not one of the taxa."
+                raise ValueError(node._label, msg)
+            entry[1] = 1 << bit
+            n_leaves += 1
+        split = entry[1]
+        parent = entry[2]
+        if parent is None:
+            continue
+        parent[1] |= split
+        if not rooted and split & 1:
+            split ^= full
+            if split == 0:
+                continue
+        ret[split] = ret.get(split, 0.0) + node._distance
+        if labels is not None and split & (split - 1):
+            labels.setdefault(split, node._label)
+    if n_leaves != len(taxa) or root_entry[1] != full:
+        msg = \
+            "The leaves of the tree are not exactly the taxa."
+        raise ValueError(tree, msg)
+    return ret
+
+def split_to_labels(split:int, taxa:list) -> list:
+    """
+    Returns:
+        list: the labels of the taxa in the `split`, in the order of
+        `taxa`.
+    """
+    ret = []
+    while split:
+        low = split & -split
+        ret.append(taxa[low.bit_length() - 1])
+        split ^= low
+    return ret
+
+def _is_compatible(a:int, b:int) -> bool:
+    """
+    Returns:
+        bool: whether the clusters `a` and `b` are nested or disjoint,
+        i.e. whether both can be part of the same tree.
+    """
+    common = a & b
+    return common == 0 or common == a or common == b
+
+
+class SplitTable:
+    """
+    Counts the splits of many trees on the same taxa in a hash table,
+    together with the sum of their edge lengths, and builds consensus
+    trees from them.
+    """
+
+
+    # class fields
+    #_taxa  # list of the leaf labels, by bit
+    #_bits  # dict, leaf label -> bit
+    #_rooted
+    #_root_label  # label of the root of the first tree
+    #_n_trees
+    #_counts  # dict, split -> number of trees containing it
+    #_lengths  # dict, split -> sum of its edge lengths
+    #_labels  # dict, split -> node label seen first
+
+
+    def __init__(self, taxa:list, rooted:bool=True, root_label:str=""):
+        """
+        Creates an empty table.
+
+        Args:
+            taxa (list): the leaf labels, see `get_taxa()`.
+            rooted (bool, optional):
+                Whether to treat the trees as rooted. Defaults to True.
+            root_label (str, optional):
+                label of the root of consensus trees. Defaults to "".
+        """
+        self._taxa = list(taxa)
+        self._bits = {label: i for i, label in enumerate(self._taxa)}
+        self._rooted = rooted
+        self._root_label = root_label
+        self._n_trees = 0
+        self._counts = dict()
+        self._lengths = dict()
+        self._labels = dict()
+
+
+    def get_taxa(self) -> list:
+        return self._taxa
+
+    def is_rooted(self) -> bool:
+        return self._rooted
+
+    def count_trees(self) -> int:
+        """
+        Returns:
+            int: the number of trees added so far.
+        """
+        return self._n_trees
+
+    def add_tree(self, tree:Tree):
+        """
+        Extracts the splits of the `tree` and counts them.
+
+        Raises:
+            ValueError: When the leaves of the `tree` are not exactly
+                the taxa of `self`.
+        """
+        labels = dict()
+        splits = extract_splits(tree, self._bits, self._rooted, labels)
+        self.add_splits(splits, labels)
+
+    def add_splits(self, splits:dict, labels:dict=None):
+        """
+        Counts the splits of one tree, e.g. as extracted by
+        `extract_splits()` in another process.
+
+        Args:
+            splits (dict): maps each split to its edge length.
+            labels (dict, optional): maps splits to node labels.
+        """
+        counts = self._counts
+        lengths = self._lengths
+        for split, length in splits.items():
+            counts[split] = counts.get(split, 0) + 1
+            lengths[split] = lengths.get(split, 0.0) + length
+        if labels:
+            for split, label in labels.items():
+                if split not in self._labels:
+                    self._labels[split] = label
+        self._n_trees += 1
+
+    def get_count(self, split:int) -> int:
+        """
+        Returns:
+            int: the number of trees containing the `split`.
+        """
+        return self._counts.get(split, 0)
+
+    def get_support(self, split:int) -> float:
+        """
+        Returns:
+            float: the fraction of the trees containing the `split`.
+        """
+        if self._n_trees == 0:
+            return 0.0
+        return self._counts.get(split, 0) / self._n_trees
+
+    def get_mean_length(self, split:int) -> float:
+        """
+        Returns:
+            float: the mean edge length of the `split` in the trees
+            containing it, or 0.0 if there is none.
+        """
+        count = self._counts.get(split, 0)
+        if count == 0:
+            return 0.0
+        return self._lengths[split] / count
+
+    def get_splits(self) -> dict:
+        """
+        Returns:
+            dict: the number of trees containing each split.
+        """
+        return self._counts
+
+    def select_splits(self, threshold:float=0.5) -> list:
+        """
+        Selects the splits of the consensus tree: all splits contained
+        in more than `threshold` of the trees (or in all of them, for a
+        `threshold` of 1.0), most frequent first. Splits that are
+        incompatible with a more frequent selected one are skipped,
+        which only happens for thresholds below 0.5.
+
+        Args:
+            threshold (float, optional):
+                minimum support, 0.5 for majority rule and 1.0 for
+                strict consensus. Defaults to 0.5.
+
+        Returns:
+            list: the selected non-trivial splits.
+        """
+        if threshold < 0 or threshold > 1:
+            msg = \
+                "The `threshold` has to be between 0 and 1."
+            raise ValueError(threshold, msg)
+        n = self._n_trees
+        candidates = [s for s, c in self._counts.items()
+                      if (c > threshold * n or c == n) and s & (s - 1)]
+        candidates.sort(key=lambda s: (-self._counts[s], s))
+        if threshold >= 0.5:
+            # two splits in more than half of the trees are always
+            # contained in a common tree, so they are compatible
+            return candidates
+        ret = []
+        for s in candidates:
+            if all(_is_compatible(s, t) for t in ret):
+                ret.append(s)
+        return ret
+
+    def build_consensus(self, threshold:float=0.5) -> Tree:
+        """
+        Builds the consensus tree of the counted trees from the splits
+        selected by `select_splits()`.
+        The support of each inner node is attached as "support"
+        (fraction of the trees) in the additional info, so that it is
+        written as NHX. Distances are the mean edge lengths of the
+        splits. Inner nodes are labelled like the first node seen with
+        the same split (with a numeric suffix if required to be unique
+        within their parent).
+
+        Args:
+            threshold (float, optional): see `select_splits()`.
+
+        Returns:
+            Tree: the consensus tree.
+        """
+        splits = self.select_splits(threshold)
+        # larger clusters first, so that each cluster's parent has
+        # been created before it
+        splits.sort(key=lambda s: (-bin(s).count("1"), s))
+        root = RootNode(self._root_label)
+        n = len(self._taxa)
+        full = (1 << n) - 1
+        # deepest node created so far containing each taxon
+        owner = [root] * n
+        for split in splits:
+            if not self._rooted and split == full ^ 1:
+                continue  # pendant edge of the first taxon, see below
+            low = split & -split
+            parent = owner[low.bit_length() - 1]
+            label = self._labels.get(split, "")
+            node = Node(self._unique_label(parent, label),
+                        distance=self.get_mean_length(split),
+                        additional_info={"support": self.get_support(split)})
+            parent.add_child(node)
+            rest = split
+            while rest:
+                low = rest & -rest
+                owner[low.bit_length() - 1] = node
+                rest ^= low
+        for i, label in enumerate(self._taxa):
+            split = 1 << i
+            if not self._rooted and i == 0:
+                split = full ^ 1
+            parent = owner[i]
+            parent.add_child(Node(self._unique_label(parent, label),
+                                  distance=self.get_mean_length(split)))
+        return Tree(root)
+
+    def _unique_label(self, parent:Node, label:str) -> str:
+        if not parent.contains_child_with_label(label):
+            return label
+        i = 2
+        while parent.contains_child_with_label(label + "_" + str(i)):
+            i += 1
+        return label + "_" + str(i)
+
+
+# state of worker processes, see `count_splits()`
+_worker_bits = None
+_worker_rooted = True
+
+def _init_worker(taxa:list, rooted:bool):
+    global _worker_bits, _worker_rooted
+    _worker_bits = {label: i for i, label in enumerate(taxa)}
+    _worker_rooted = rooted
+
+def _extract_worker(tree:Tree) -> tuple:
+    labels = dict()
+    splits = extract_splits(tree, _worker_bits, _worker_rooted, labels)
+    return (splits, labels)
+
+def count_splits(trees:Iterable[Tree],
+                 rooted:bool=True,
+                 processes:int=1,
+                 chunksize:int=8) -> SplitTable:
+    """
+    Counts the splits of all `trees` (see `SplitTable`).
+    The taxa are taken from the first tree; all trees need to have
+    exactly the same leaf labels.
+
+    Args:
+        trees (Iterable[Tree]): the trees, e.g. from `read_forest()`.
+        rooted (bool, optional):
+            Whether to treat the trees as rooted. Defaults to True.
+        processes (int, optional):
+            Number of worker processes to extract the splits in. The
+            trees are pickled to the workers, so this pays off for
+            large trees. Defaults to 1 (no workers).
+        chunksize (int, optional):
+            Number of trees sent to a worker at once.
+
+    Raises:
+        ValueError: When there are no trees, or when their leaves
+            differ.
+
+    Returns:
+        SplitTable: the counted splits.
+    """
+    trees = iter(trees)
+    first = next(trees, None)
+    if first is None:
+        msg = \
+            "At least one tree is required."
+        raise ValueError(trees, msg)
+    ret = SplitTable(get_taxa(first), rooted, first._root.get_label())
+    ret.add_tree(first)
+    for splits, labels in gen_splits(trees, ret.get_taxa(), rooted,
+                                     processes, chunksize):
+        ret.add_splits(splits, labels)
+    return ret
+
+def gen_splits(trees:Iterable[Tree],
+               taxa:list,
+               rooted:bool=True,
+               processes:int=1,
+               chunksize:int=8) -> Iterator[tuple]:
+    """
+    Extracts the splits of each of the `trees`, see `extract_splits()`,
+    optionally in worker processes (see `count_splits()`).
+
+    Args:
+        trees (Iterable[Tree]): the trees, all on the `taxa`.
+        taxa (list): the leaf labels, see `get_taxa()`.
+        rooted (bool, optional):
+            Whether to treat the trees as rooted. Defaults to True.
+        processes (int, optional): Number of worker processes.
+            Defaults to 1 (no workers).
+        chunksize (int, optional):
+            Number of trees sent to a worker at once.
+
+    Yields:
+        tuple: the splits (with their edge lengths) and the labels of
+        the non-trivial splits of each tree, in order.
+    """
+    if processes is None or processes <= 1:
+        bits = {label: i for i, label in enumerate(taxa)}
+        for tree in trees:
+            labels = dict()
+            yield (extract_splits(tree, bits, rooted, labels), labels)
+        return
+    from multiprocessing import Pool
+    with Pool(processes,
+              initializer=_init_worker,
+              initargs=(taxa, rooted)) as pool:
+        yield from pool.imap(_extract_worker, trees, chunksize=chunksize)
+
+def consensus_tree(trees:Iterable[Tree],
+                   threshold:float=0.5,
+                   rooted:bool=True,
+                   processes:int=1) -> Tree:
+    """
+    Builds the consensus tree of the `trees`, see `count_splits()` and
+    `SplitTable.build_consensus()`.
+
+    Args:
+        trees (Iterable[Tree]): the trees, all on the same taxa.
+        threshold (float, optional):
+            minimum support of the splits, 0.5 for majority rule and
+            1.0 for strict consensus. Defaults to 0.5.
+        rooted (bool, optional):
+            Whether to treat the trees as rooted. Defaults to True.
+        processes (int, optional): see `count_splits()`.
+
+    Returns:
+        Tree: the consensus tree, with the support values of its inner
+        nodes in the additional info.
+    """
+    table = count_splits(trees, rooted=rooted, processes=processes)
+    return table.build_consensus(threshold)
+
+def majority_consensus(trees:Iterable[Tree], **kwargs) -> Tree:
+    """
+    Builds the majority-rule consensus tree, see `consensus_tree()`.
+    """
+    return consensus_tree(trees, threshold=0.5, **kwargs)
+
+def strict_consensus(trees:Iterable[Tree], **kwargs) -> Tree:
+    """
+    Builds the strict consensus tree, see `consensus_tree()`.
+    """
+    return consensus_tree(trees, threshold=1.0, **kwargs)
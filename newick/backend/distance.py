@@ -0,0 +1,270 @@
+from collections.abc import Iterable
+from math import sqrt
+from .tree import Tree
+from .consensus import get_taxa, extract_splits, gen_splits
+
+
+# Distances between trees on the same taxa, computed from their splits
+# (see `consensus.extract_splits()`). The splits of each tree are
+# extracted once, so that comparing n trees pairwise costs n traversals
+# plus set operations on the split bitsets.
+
+METRICS = ("rf", "nrf", "branch_score")
+
+
+class TreeSplits:
+    """
+    The splits of a single tree, prepared for repeated comparisons.
+    """
+
+
+    # class fields
+    #_lengths  # dict, split (id) -> edge length (including trivial splits)
+    #_nontrivial  # frozenset of the splits (ids) with at least two taxa on each side
+    #_ids  # dict shared by comparable instances, split -> id; or None
+
+
+    def __init__(self,
+                 lengths:dict,
+                 n_taxa:int,
+                 rooted:bool=True,
+                 ids:dict=None):
+        """
+        Args:
+            lengths (dict):
+                the splits and their edge lengths, as extracted by
+                `consensus.extract_splits()`.
+            n_taxa (int): the number of taxa.
+            rooted (bool, optional):
+                Whether the splits are the ones of a rooted tree.
+                Defaults to True.
+            ids (dict, optional):
+                Table of split ids, shared by all instances that are to
+                be compared. The splits are replaced by small ints from
+                it, which are much cheaper to hash than the bitsets of
+                large trees. Defaults to None (keep the bitsets).
+        """
+        full = (1 << n_taxa) - 1
+        nontrivial = [s for s in lengths
+                      if s & (s - 1) and s != full and (rooted or s != full ^ 1)]
+        if ids is not None:
+            lengths = {ids.setdefault(s, len(ids)): length
+                       for s, length in lengths.items()}
+            nontrivial = [ids[s] for s in nontrivial]
+        self._lengths = lengths
+        self._nontrivial = frozenset(nontrivial)
+        self._ids = ids
+
+
+    def count_splits(self) -> int:
+        """
+        Returns:
+            int: the number of non-trivial splits.
+        """
+        return len(self._nontrivial)
+
+    def robinson_foulds(self, other:'TreeSplits', normalized:bool=False) -> float:
+        """
+        Determines the Robinson-Foulds distance to `other`: the number
+        of non-trivial splits contained in only one of the trees.
+
+        Args:
+            other (TreeSplits): the splits of the other tree.
+            normalized (bool, optional):
+                Whether to divide by the total number of non-trivial
+                splits of both trees, so that the distance is between
+                0 and 1. Defaults to False.
+
+        Returns:
+            float: the distance (an int if not normalized).
+        """
+        self._check_comparable(other)
+        a = self._nontrivial
+        b = other._nontrivial
+        total = len(a) + len(b)
+        ret = total - 2 * len(a & b)
+        if normalized:
+            return ret / total if total > 0 else 0.0
+        return ret
+
+    def branch_score(self, other:'TreeSplits') -> float:
+        """
+        Determines the branch score distance (Kuhner & Felsenstein) to
+        `other`: the Euclidean distance of the edge lengths of all
+        splits (including the pendant edges), where missing splits have
+        length 0.
+
+        Args:
+            other (TreeSplits): the splits of the other tree.
+
+        Returns:
+            float: the distance.
+        """
+        self._check_comparable(other)
+        a = self._lengths
+        b = other._lengths
+        ret = 0.0
+        for split, length in a.items():
+            diff = length - b.get(split, 0.0)
+            ret += diff * diff
+        for split, length in b.items():
+            if split not in a:
+                ret += length * length
+        return sqrt(ret)
+
+    def distance(self, other:'TreeSplits', metric:str="rf") -> float:
+        """
+        Args:
+            other (TreeSplits): the splits of the other tree.
+            metric (str, optional):
+                "rf" (Robinson-Foulds), "nrf" (normalized
+                Robinson-Foulds) or "branch_score". Defaults to "rf".
+
+        Returns:
+            float: the distance between the trees.
+        """
+        if metric == "rf":
+            return self.robinson_foulds(other)
+        if metric == "nrf":
+            return self.robinson_foulds(other, normalized=True)
+        _check_metric(metric)
+        return self.branch_score(other)
+
+    def _check_comparable(self, other:'TreeSplits'):
+        if self._ids is not other._ids:
+            msg = \
+                "The splits have to be prepared with the same id table."
+            raise ValueError(other, msg)
+
+
+def _check_metric(metric:str):
+    if metric not in METRICS:
+        msg = \
+            "Unknown metric. Use one of " + ", ".join(METRICS) + "."
+        raise ValueError(metric, msg)
+
+def prepare_splits(trees:Iterable[Tree],
+                   taxa:list=None,
+                   rooted:bool=True,
+                   processes:int=1) -> list:
+    """
+    Extracts the splits of all `trees` once, for comparisons. The
+    results share a table of split ids (see `TreeSplits`).
+
+    Args:
+        trees (Iterable[Tree]): the trees, all on the same taxa.
+        taxa (list, optional):
+            the leaf labels, see `consensus.get_taxa()`. Defaults to
+            None, which represents the ones of the first tree.
+        rooted (bool, optional):
+            Whether to treat the trees as rooted. Defaults to True.
+        processes (int, optional):
+            Number of worker processes to extract the splits in, see
+            `consensus.count_splits()`. Defaults to 1 (no workers).
+
+    Raises:
+        ValueError: When the leaves of the trees differ.
+
+    Returns:
+        list[TreeSplits]: the splits of each tree, in order.
+    """
+    trees = list(trees)
+    if len(trees) == 0:
+        return []
+    if taxa is None:
+        taxa = get_taxa(trees[0])
+    ids = dict()
+    return [TreeSplits(splits, len(taxa), rooted, ids)
+            for splits, _ in gen_splits(trees, taxa, rooted, processes)]
+
+def robinson_foulds(tree:Tree,
+                    other:Tree,
+                    rooted:bool=True,
+                    normalized:bool=False) -> float:
+    """
+    Determines the (normalized) Robinson-Foulds distance between two
+    trees on the same taxa, see `TreeSplits.robinson_foulds()`.
+
+    Raises:
+        ValueError: When the leaves of the trees differ.
+    """
+    a, b = prepare_splits((tree, other), rooted=rooted)
+    return a.robinson_foulds(b, normalized)
+
+def branch_score_distance(tree:Tree, other:Tree, rooted:bool=True) -> float:
+    """
+    Determines the branch score distance between two trees on the same
+    taxa, see `TreeSplits.branch_score()`.
+
+    Raises:
+        ValueError: When the leaves of the trees differ.
+    """
+    a, b = prepare_splits((tree, other), rooted=rooted)
+    return a.branch_score(b)
+
+def distance_matrix(trees:Iterable[Tree],
+                    metric:str="rf",
+                    rooted:bool=True,
+                    processes:int=1) -> list:
+    """
+    Determines the distances between all pairs of the `trees`. Each
+    tree is traversed once (see `prepare_splits()`).
+
+    Args:
+        trees (Iterable[Tree]): the trees, all on the same taxa.
+        metric (str, optional): see `TreeSplits.distance()`.
+            Defaults to "rf".
+        rooted (bool, optional):
+            Whether to treat the trees as rooted. Defaults to True.
+        processes (int, optional): see `prepare_splits()`.
+
+    Raises:
+        ValueError: When the leaves of the trees differ.
+
+    Returns:
+        list[list[float]]: the symmetric matrix of the distances, with
+        zeros on the diagonal.
+    """
+    _check_metric(metric)
+    splits = prepare_splits(trees, rooted=rooted, processes=processes)
+    n = len(splits)
+    ret = [[0] * n for _ in range(n)]
+    for i in range(n):
+        row = ret[i]
+        for j in range(i + 1, n):
+            d = splits[i].distance(splits[j], metric)
+            row[j] = d
+            ret[j][i] = d
+    return ret
+
+def distances_to(reference:Tree,
+                 trees:Iterable[Tree],
+                 metric:str="rf",
+                 rooted:bool=True) -> list:
+    """
+    Determines the distance of each of the `trees` to the `reference`
+    tree, e.g. to compare new builds against a known tree.
+
+    Args:
+        reference (Tree): the tree to compare to.
+        trees (Iterable[Tree]): the trees, on the taxa of `reference`.
+        metric (str, optional): see `TreeSplits.distance()`.
+            Defaults to "rf".
+        rooted (bool, optional):
+            Whether to treat the trees as rooted. Defaults to True.
+
+    Raises:
+        ValueError: When the leaves of a tree differ from the ones of
+            the `reference`.
+
+    Returns:
+        list[float]: the distances, in order.
+    """
+    _check_metric(metric)
+    taxa = get_taxa(reference)
+    # each tree is compared once only, so the bitsets are kept as they
+    # are, instead of growing a table of split ids
+    bits = {label: i for i, label in enumerate(taxa)}
+    ref = TreeSplits(extract_splits(reference, bits, rooted), len(taxa), rooted)
+    return [ref.distance(TreeSplits(splits, len(taxa), rooted), metric)
+            for splits, _ in gen_splits(trees, taxa, rooted)]
@@ -0,0 +1,450 @@
+from array import array
+from bisect import bisect_left
+import mmap
+import os
+import re
+from .node import Node, RootNode
+from .nhx_util import parse_nhx
+from .tree import Tree
+
+
+# Lazy trees read a Newick file through an offset index: the positions
+# of all opening parentheses (in order) and of their matching closing
+# ones. Using the index, the children of a node can be read without
+# scanning the subtrees below them, so only visited nodes are created.
+
+_INDEX_MAGIC = b"NWKIDX1\0"
+_INDEX_HEADER = 3  # source size, source mtime, number of entries (after the magic)
+
+_RE_SPECIAL = re.compile(rb"[()\[\]'\\;]")
+_RE_TAIL_END = re.compile(rb"[\[:,();]")
+_RE_NHX_END = re.compile(rb"\\.|\]", re.DOTALL)
+
+
+def build_index(source:str, index_file:str=None) -> str:
+    """
+    Scans the (first) tree of a Newick file once and writes the offset
+    index that is needed to open it lazily (see `open_lazy()`).
+    NHX comments (including escaped characters) and quoted labels are
+    skipped.
+
+    Args:
+        source (str): path of the Newick file.
+        index_file (str, optional):
+            path of the index file to write. Defaults to None, which
+            represents `source + ".idx"`.
+
+    Raises:
+        ValueError: When the parentheses are unbalanced.
+
+    Returns:
+        str: the path of the index file.
+    """
+    if index_file is None:
+        index_file = str(source) + ".idx"
+    opens = array('q')
+    closes = array('q')
+    stack = []
+    with open(source, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) \
+            if stat.st_size > 0 else b""
+        in_nhx = False
+        in_quote = False
+        skip = -1
+        for m in _RE_SPECIAL.finditer(buf):
+            pos = m.start()
+            if pos == skip:
+                continue
+            c = buf[pos:pos + 1]
+            if in_nhx:
+                if c == b'\\':
+                    skip = pos + 1
+                elif c == b']':
+                    in_nhx = False
+            elif in_quote:
+                if c == b"'":
+                    in_quote = False
+            elif c == b'(':
+                stack.append(len(opens))
+                opens.append(pos)
+                closes.append(-1)
+            elif c == b')':
+                if len(stack) == 0:
+                    stack.append(None)  # unbalanced
+                    break
+                closes[stack.pop()] = pos
+            elif c == b'[':
+                in_nhx = True
+            elif c == b"'":
+                in_quote = True
+            elif c == b';' and len(stack) == 0:
+                break
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+        if len(stack) > 0:
+            msg = \
+                "The parentheses in the Newick file are unbalanced."
+            raise ValueError(source, msg)
+    header = array('q', [stat.st_size, stat.st_mtime_ns, len(opens)])
+    with open(index_file, 'wb') as f:
+        f.write(_INDEX_MAGIC)
+        header.tofile(f)
+        opens.tofile(f)
+        closes.tofile(f)
+    return index_file
+
+
+class LazySource:
+    """
+    A memory-mapped Newick file together with its memory-mapped offset
+    index, shared by all lazy nodes of a tree.
+    Counts how many inner nodes have been materialized.
+    """
+
+    def __init__(self, source:str, index_file:str):
+        """
+        Args:
+            source (str): path of the Newick file.
+            index_file (str): path of its index (see `build_index()`).
+
+        Raises:
+            ValueError: When the index does not belong to the source.
+        """
+        self._file = open(source, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        mtime = os.fstat(self._file.fileno()).st_mtime_ns
+        self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if size > 0 else b""
+        self._index_file = open(index_file, 'rb')
+        self._index_buf = mmap.mmap(self._index_file.fileno(), 0,
+                                    access=mmap.ACCESS_READ)
+        self._opens = None
+        self._closes = None
+        if self._index_buf[:len(_INDEX_MAGIC)] != _INDEX_MAGIC:
+            self.close()
+            msg = \
+                "The file is not a Newick offset index."
+            raise ValueError(index_file, msg)
+        ints = memoryview(self._index_buf)[len(_INDEX_MAGIC):].cast('q')
+        isize, imtime, count = ints[0], ints[1], ints[2]
+        if (isize, imtime) != (size, mtime):
+            ints.release()
+            self.close()
+            msg = \
+                "The offset index is outdated, the source has changed."
+            raise ValueError(index_file, msg)
+        start = _INDEX_HEADER
+        self._opens = ints[start:start + count]
+        self._closes = ints[start + count:start + 2 * count]
+        self.materialized = 0
+
+    def close(self):
+        """
+        Releases the files. Nodes that have not been materialized yet
+        cannot be materialized afterwards. Closing twice does nothing.
+        """
+        if self._file.closed:
+            return
+        if self._opens is not None:
+            self._opens.release()
+            self._closes.release()
+        self._index_buf.close()
+        self._index_file.close()
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+        self._file.close()
+
+    def find_close(self, open_pos:int) -> int:
+        """
+        Returns:
+            int: the offset of the parenthesis closing the one at
+            `open_pos`.
+        """
+        i = bisect_left(self._opens, open_pos)
+        return self._closes[i]
+
+    def read_tail(self, pos:int, default_dist:float) -> tuple:
+        """
+        Reads the label, NHX comment and distance of a node, starting
+        at `pos` (behind its children, if any). Quoted labels are 
+        unquoted (with `''` read as a quote).
+
+        Raises:
+            ValueError: When a quoted label is not terminated.
+
+        Returns:
+            tuple: label, additional info, distance and the offset
+            behind them.
+        """
+        buf = self._buf
+        while buf[pos:pos + 1].isspace():
+            pos += 1
+        label = ""
+        if buf[pos:pos + 1] == b"'":
+            end = pos + 1
+            while True:
+                end = buf.find(b"'", end)
+                if end < 0:
+                    msg = \
+                        "Unterminated quoted label in the Newick file."
+                    raise ValueError(pos, msg)
+                if buf[end + 1:end + 2] != b"'":
+                    break
+                end += 2
+            label = buf[pos + 1:end].decode('utf-8').replace("''", "'")
+            pos = end + 1
+        m = _RE_TAIL_END.search(buf, pos)
+        end = m.start() if m else len(buf)
+        # the rest of an unquoted label, or e.g. the id of a quoted hybrid
+        label += buf[pos:end].strip().decode('utf-8')
+        info = None
+        dist = default_dist
+        pos = end
+        while pos < len(buf):
+            c = buf[pos:pos + 1]
+            if c == b'[':
+                nhx_end = pos + 1
+                while True:
+                    m = _RE_NHX_END.search(buf, nhx_end)
+                    if m is None:
+                        nhx_end = len(buf)
+                        break
+                    nhx_end = m.end()
+                    if m.group() == b']':
+                        break
+                info = parse_nhx(buf[pos:nhx_end].decode('utf-8'))
+                pos = nhx_end
+            elif c == b':':
+                m = _RE_TAIL_END.search(buf, pos + 1)
+                end = m.start() if m else len(buf)
+                dist = float(buf[pos + 1:end].strip())
+                pos = end
+            else:
+                break
+        return label, info, dist, pos
+
+    def read_children(self,
+                      open_pos:int,
+                      close_pos:int,
+                      default_dist:float) -> dict:
+        """
+        Reads the children between the parentheses at `open_pos` and
+        `close_pos`, creating lazy nodes for inner nodes and regular
+        nodes for leaves.
+
+        Returns:
+            dict: the children by label, in order.
+        """
+        self.materialized += 1
+        buf = self._buf
+        ret = dict()
+        pos = open_pos + 1
+        while pos < close_pos:
+            while buf[pos:pos + 1].isspace():
+                pos += 1
+            if buf[pos:pos + 1] == b'(':
+                child_open = pos
+                child_close = self.find_close(pos)
+                label, info, dist, pos = \
+                    self.read_tail(child_close + 1, default_dist)
+                child = LazyNode(self, child_open, child_close,
+                                 label, distance=dist,
+                                 additional_info=info,
+                                 default_dist=default_dist)
+            else:
+                label, info, dist, pos = self.read_tail(pos, default_dist)
+                child = Node(label, distance=dist, additional_info=info)
+            if label in ret:
+                ret[label].handle_duplicate(child)
+            else:
+                ret[label] = child
+            if buf[pos:pos + 1] == b',':
+                pos += 1
+            elif pos < close_pos:
+                msg = \
+                    "Unexpected symbol in the Newick file."
+                raise ValueError(pos, msg)
+        return ret
+
+
+class _LazyChildren:
+    """
+    Mixin that materializes the children of a node from its
+    `LazySource` on the first access.
+    """
+
+    #_lazy  # (source, open offset, close offset, default distance), or None
+    #_lazy_children  # dict, or None if not materialized yet
+
+    @property
+    def _children_by_label(self) -> dict:
+        if self._lazy_children is None:
+            source, open_pos, close_pos, default_dist = self._lazy
+            self._lazy_children = \
+                source.read_children(open_pos, close_pos, default_dist)
+            self._lazy = None
+        return self._lazy_children
+
+    @_children_by_label.setter
+    def _children_by_label(self, children:dict):
+        self._lazy_children = children
+        self._lazy = None
+
+    def is_materialized(self) -> bool:
+        """
+        Returns:
+            bool: whether the children of `self` have been read yet.
+        """
+        return self._lazy_children is not None
+
+    def _init_lazy(self, source, open_pos, close_pos, default_dist):
+        self._lazy = (source, open_pos, close_pos, default_dist)
+        self._lazy_children = None
+
+
+class LazyNode(_LazyChildren, Node):
+    """
+    A node whose children are read from a Newick file only when they
+    are accessed for the first time (by lookup, traversal, modification
+    or serialization). See `open_lazy()`.
+    """
+
+    def __init__(self,
+                 source:LazySource,
+                 open_pos:int,
+                 close_pos:int,
+                 label:str,
+                 distance:float=1.0,
+                 additional_info:dict=None,
+                 default_dist:float=1.0):
+        """
+        Args:
+            source (LazySource): the file to read the children from.
+            open_pos (int): offset of the parenthesis opening the
+                children.
+            close_pos (int): offset of the matching closing one.
+            label (str): see `Node`.
+            distance (float, optional): see `Node`.
+            additional_info (dict, optional): see `Node`.
+            default_dist (float, optional):
+                distance of children without a distance in the file.
+                Defaults to 1.0.
+        """
+        super(LazyNode, self).__init__(label,
+                                       distance=distance,
+                                       additional_info=additional_info)
+        self._init_lazy(source, open_pos, close_pos, default_dist)
+
+
+class LazyRootNode(_LazyChildren, RootNode):
+    """
+    The root of a lazily opened tree. See `LazyNode`.
+    """
+
+    def __init__(self,
+                 source:LazySource,
+                 open_pos:int,
+                 close_pos:int,
+                 label:str,
+                 additional_info:dict=None,
+                 default_dist:float=1.0):
+        super(LazyRootNode, self).__init__(label,
+                                           additional_info=additional_info)
+        self._init_lazy(source, open_pos, close_pos, default_dist)
+
+
+class LazyTree(Tree):
+    """
+    A tree opened by `open_lazy()`. It keeps its Newick file and offset
+    index open until `close()` is called, also when it is used as a 
+    context manager:
+    
+        with open_lazy("big.nwk") as tree:
+            ...
+    """
+    
+    
+    # class fields
+    #_source  # LazySource, or None once closed
+
+
+    def close(self):
+        """
+        Releases the Newick file and its offset index. The nodes that 
+        have been materialized stay usable, the others cannot be read
+        anymore (also in clones). Closing twice does nothing.
+        """
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+
+    def __enter__(self) -> 'LazyTree':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_lazy(source:str,
+              index_file:str=None,
+              default_dist:float=1.0,
+              rebuild_index:bool=False) -> LazyTree:
+    """
+    Opens the (first) tree of a Newick file lazily: nodes are created
+    only when they are visited, so opening is quick once the offset
+    index exists, and the memory used grows with the visited part of
+    the tree only. The files are memory-mapped and have to stay
+    unchanged while the tree is in use.
+
+    The tree can be used like any other, but note that
+     * NHX values are read back as strings,
+     * hybrid nodes are read as regular nodes (with "#id" labels),
+     * duplicates are not counted in Newick files, so all counts start
+       at zero,
+     * the files stay open until the tree is closed (see `LazyTree`).
+
+    Args:
+        source (str): path of the Newick file.
+        index_file (str, optional):
+            path of its offset index. It is built if it does not exist
+            yet (see `build_index()`). Defaults to None, which
+            represents `source + ".idx"`.
+        default_dist (float, optional):
+            distance of nodes without a distance in the file.
+            Defaults to 1.0.
+        rebuild_index (bool, optional):
+            Whether to rebuild the index even if it exists, e.g.
+            because the source has changed. Defaults to False.
+
+    Raises:
+        ValueError: When the index does not belong to the source.
+
+    Returns:
+        LazyTree: the lazily materialized tree.
+    """
+    if index_file is None:
+        index_file = str(source) + ".idx"
+    if rebuild_index or not os.path.exists(index_file):
+        build_index(source, index_file)
+    lsource = LazySource(source, index_file)
+    buf = lsource._buf
+    pos = 0
+    while buf[pos:pos + 1].isspace():
+        pos += 1
+    try:
+        if buf[pos:pos + 1] == b'(':
+            close_pos = lsource.find_close(pos)
+            label, info, _, _ = lsource.read_tail(close_pos + 1, default_dist)
+            root = LazyRootNode(lsource, pos, close_pos, label,
+                                additional_info=info,
+                                default_dist=default_dist)
+        else:
+            label, info, _, _ = lsource.read_tail(pos, default_dist)
+            root = RootNode(label, additional_info=info)
+    except ValueError:
+        lsource.close()
+        raise
+    ret = LazyTree(root, default_dist=default_dist)
+    ret._source = lsource
+    return ret
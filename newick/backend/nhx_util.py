@@ -1,13 +1,17 @@
-def generate_nhx(dict:dict, ext_head='&&NHX') -> str:
+def generate_nhx(dict:dict, ext_head='&&NHX', key_filter=None) -> str:
     if dict == None or len(dict) == 0:
         return ""
     else:
         ret_elements = []
         for key in dict.keys():
+            if key_filter is not None and not key_filter(key):
+                continue
             str_key = nhx_filter_str(str(key))
             str_val = nhx_filter_str(str(dict[key]))
             str_el = str_key + '=' + str_val
             ret_elements.append(str_el)
+        if len(ret_elements) == 0:
+            return ""
         str_elements = ':'.join(ret_elements)
         return "[" + ext_head + ':' + str_elements + "]"
     
@@ -28,3 +32,55 @@ def nhx_filter_str(string:str):
             mod_string = mod_string.replace(c, '\\'+c)
             skipset.add(c)
     return mod_string
+
+def parse_nhx(string:str, ext_head='&&NHX') -> dict:
+    """
+    Parses an NHX comment as written by `generate_nhx()` back into a 
+    dictionary. Escaped characters are unescaped. All keys and values
+    are strings.
+
+    Args:
+        string (str): the NHX comment, including the square brackets.
+        ext_head (str, optional): Expected head. Defaults to '&&NHX'.
+
+    Raises:
+        ValueError: When the string is not an NHX comment.
+
+    Returns:
+        dict: the key-value pairs.
+    """
+    if string == "":
+        return dict()
+    if not string.startswith('[' + ext_head) or not string.endswith(']'):
+        msg = \
+            "The string is not an NHX comment."
+        raise ValueError(string, msg)
+    ret = dict()
+    body = string[len(ext_head) + 1:-1]
+    key = None
+    cur = []
+    i = 0
+    # body starts with ':' unless empty
+    if body.startswith(':'):
+        i = 1
+    while i < len(body):
+        c = body[i]
+        if c == '\\' and i + 1 < len(body):
+            cur.append(body[i + 1])
+            i += 2
+            continue
+        if c == '=' and key is None:
+            key = ''.join(cur)
+            cur = []
+        elif c == ':':
+            ret[key if key is not None else ''.join(cur)] = \
+                ''.join(cur) if key is not None else ""
+            key = None
+            cur = []
+        else:
+            cur.append(c)
+        i += 1
+    if key is not None or len(cur) > 0:
+        ret[key if key is not None else ''.join(cur)] = \
+            ''.join(cur) if key is not None else ""
+    return ret
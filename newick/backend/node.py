@@ -1,6 +1,18 @@
-from collections.abc import Mapping
+from collections.abc import Callable, Mapping
 from .nhx_util import generate_nhx
-from .util_funcs import format_float, format_int
+from .util_funcs import format_float, format_int, canonical_repr
+
+
+# `hashlib` is only imported when the first hash is computed, since it
+# is slow to import and not needed for building and writing trees.
+_blake2b = None
+
+def _digest128(data:bytes) -> int:
+    global _blake2b
+    if _blake2b is None:
+        from hashlib import blake2b
+        _blake2b = blake2b
+    return int.from_bytes(_blake2b(data, digest_size=16).digest(), 'big')
 
 
 class Node:
@@ -16,17 +28,51 @@ class Node:
     # class fields
     #_label
     #_distance          = 1.0
-    #_children          = []
     #_dupcount          = 0
     #_additional_info   = None
-    #_children_by_label = dict()
+    #_children_by_label = dict()  # maps label to child, in order of insertion
+    
+    # Structural sharing (see `Tree.compress_shared_subtrees()`). 
+    # Frozen nodes may be referenced by several parents and must not be
+    # mutated; their modifying methods raise a ValueError. Shared nodes
+    # additionally memoize their string.
+    _frozen             = False
+    _shared             = False
+    _str_cache          = None
+    
+    # Copy-on-write between trees (see `Tree.clone()`): the token of the
+    # tree that created this node. Trees copy the nodes that are not 
+    # their own before modifying them.
+    _owner              = None
+    
+    # Structural hash of the subtree (see `get_structural_hash()`).
+    # `None` means it has to be (re-)computed.
+    _hash               = None
+    
+    # Cached subtree statistics (size, leaf count, height, total branch 
+    # length; see `get_subtree_stats()`) and child order (see 
+    # `get_ordered_children()`).
+    _stats              = None
+    _order_cache        = None
+    
+    _HASH_MASK          = (1 << 128) - 1
+    
+    
+    @property
+    def _children(self):
+        """
+        Live view of the children, in order of insertion. 
+        The children are stored in `_children_by_label` only, so that 
+        they can be removed in O(1).
+        """
+        return self._children_by_label.values()
     
     
     def __init__(self, 
                  label:str, 
                  distance:float         = 1.0, 
                  duplicates_count:int   = 0, 
-                 additional_info:dict   = dict(),
+                 additional_info:dict   = None,
                  children:list          = []):
         """Creates a new node with the given information.
 
@@ -44,7 +90,7 @@ class Node:
             additional_info (dict, optional): 
                 dictionary with all additional data you want to attach
                 to the node (see also `to_string()`). Defaults to 
-                dict().
+                None, which creates a new empty dict.
             children (list, optional): 
                 list of children nodes. Defaults to [].
                 Please avoid using this if possible.
@@ -63,7 +109,9 @@ class Node:
                 Distance from parent node must be positive.
                 """ 
             raise ValueError(distance, msg)
-        if not isinstance(additional_info, dict):
+        if additional_info is None:
+            additional_info = dict()
+        elif not isinstance(additional_info, dict):
             msg = \
                 """
                 The `additional_info` must be a dictionary to allow 
@@ -79,8 +127,7 @@ class Node:
         self._dupcount          = duplicates_count
         self._additional_info   = additional_info
         # handle children
-        self._children          = []
-        self._children_by_label = dict() # maps label to index of _children
+        self._children_by_label = dict()
         for c in children:
             self.add_child(c)
         
@@ -146,10 +193,7 @@ class Node:
                 The child node withe the given `label` iff it exists 
                 in `self`, otherwise `None`.
         """
-        if self.contains_child_with_label(label):
-            return self._children[self._children_by_label[label]]
-        else:
-            return None
+        return self._children_by_label.get(label)
     
     def add_child(self, 
                   child:'Node', 
@@ -175,10 +219,17 @@ class Node:
                 during a new node's insertion. 
                 You can define your own function or use one of the 
                 `Tree._DIST_ADJUST_STRAT_...`s.
+
+        Raises:
+            ValueError: When `self` (or the existing child to merge 
+                `child` into) is frozen.
         """
+        self._check_mutable()
+        self._hash = None
+        self._stats = None
+        self._order_cache = None
         if not self.contains_child_with_label(child.get_label()):
-            self._children_by_label[child.get_label()] = len(self._children)
-            self._children.append(child)
+            self._children_by_label[child.get_label()] = child
             return (True, child)
         else:
             ochild = self.get_child_by_label(child.get_label())
@@ -189,6 +240,106 @@ class Node:
             ochild.handle_duplicate(child, count=count_duplicate)
             return (False, ochild)
     
+    def replace_child(self, child:'Node'):
+        """
+        Replaces the child with the same label as `child` by `child`, 
+        keeping its position.
+
+        Args:
+            child (Node): the replacing node.
+
+        Raises:
+            ValueError: When `self` is frozen.
+        """
+        self._check_mutable()
+        self._children_by_label[child.get_label()] = child
+        self._hash = None
+        self._stats = None
+        self._order_cache = None
+    
+    def _check_mutable(self):
+        """
+        For internal use only.
+        Raises a ValueError if `self` is frozen.
+        """
+        if self._frozen:
+            msg = \
+                """
+                The node is shared by several subtrees (see 
+                `Tree.compress_shared_subtrees()`) and cannot be 
+                modified directly. Modify it through the methods of its
+                `Tree` (or a node returned by `Tree.get_node()`), which
+                copy shared nodes first.
+                """
+            raise ValueError(self._label, msg)
+    
+    def _drop_caches(self):
+        """
+        For internal use only.
+        Drops the cached structural hash, subtree size and child order
+        of `self`.
+        """
+        self._hash = None
+        self._stats = None
+        self._order_cache = None
+    
+    def remove_child(self, label:str) -> 'Node':
+        """
+        Removes the child with the given `label` (and thereby its 
+        subtree) from `self`'s children in O(1).
+        The order of the other children is retained.
+
+        Args:
+            label (str): label (identifier within parent) of the child.
+
+        Raises:
+            ValueError: When `self` is frozen.
+
+        Returns:
+            Node: the removed child, or `None` if there is no child 
+            with that `label`.
+        """
+        self._check_mutable()
+        child = self._children_by_label.pop(label, None)
+        if child is not None:
+            self._hash = None
+            self._stats = None
+            self._order_cache = None
+        return child
+    
+    def copy(self) -> 'Node':
+        """
+        Creates a shallow copy of `self`: the children are shared with 
+        `self`, while the additional info dictionary (and its lists, 
+        sets and dicts) and the children index are copied. 
+        The copy is never frozen and not owned by any tree.
+
+        Returns:
+            Node: a mutable copy of `self` of the same type.
+        """
+        ret = object.__new__(type(self))
+        ret.__dict__.update(self.__dict__)
+        ret.__dict__.pop('_frozen', None)
+        ret.__dict__.pop('_shared', None)
+        ret.__dict__.pop('_str_cache', None)
+        ret.__dict__.pop('_owner', None)
+        ret._children_by_label = dict(self._children_by_label)
+        ret._additional_info = \
+            {k: (v.copy() if isinstance(v, (list, set, dict)) else v)
+             for k, v in self._additional_info.items()}
+        return ret
+    
+    def __getstate__(self) -> dict:
+        # the cached child order and the memoized string are keyed by 
+        # the functions they were created with (e.g. lambdas), which 
+        # cannot be pickled
+        state = self.__dict__.copy()
+        if "_order_cache" in state:
+            state["_order_cache"] = None
+        if "_str_cache" in state:
+            state["_str_cache"] = (None, None)
+        return state
+    
     
     def handle_duplicate(self, other:'Node', count=True):
         """
@@ -210,12 +361,19 @@ class Node:
             other (Node): 
                 Node that was to be added but was declined because it 
                 has the same `label` as self.
-            count (bool, optional):
-                Whether or not to count this duplication.
+            count (bool | int, optional):
+                Whether or not to count this duplication, or the 
+                number of duplications to count at once (e.g. for 
+                identical insertions that have been aggregated).
+
+        Raises:
+            ValueError: When `self` is frozen.
         """
+        self._check_mutable()
+        self._hash = None
         # count duplicates
         if count:
-            self._dupcount += 1
+            self._dupcount += count
         # copy additional information
         s_ao = self.get_additional_info()
         o_ao = other.get_additional_info()
@@ -255,7 +413,12 @@ class Node:
     def set_distance(self, distance):
         """
         Sets the distanec of `self` to the given `val`.
+
+        Raises:
+            ValueError: When the distance is negative or `self` is 
+                frozen.
         """
+        self._check_mutable()
         if not isinstance(distance, float):
             distance = float(distance)
         if distance < 0:
@@ -265,6 +428,7 @@ class Node:
                 """ 
             raise ValueError(distance, msg)
         self._distance = distance
+        self._hash = None
 
     def get_duplication_count(self) -> int:
         """Retrieves the duplicate counter's value.
@@ -287,11 +451,196 @@ class Node:
         return self._additional_info
     
     
+    def gen_content_digest(self, children_hash:int) -> int:
+        """
+        Generates the structural hash of `self` from its own content 
+        (label, distance, duplication count and additional info) and 
+        the combined hash of its children.
+        Override this method if a subclass carries additional content.
+
+        Args:
+            children_hash (int): combined hash of all children.
+
+        Returns:
+            int: a 128 bit digest, stable across processes.
+        """
+        content = '\0'.join([repr(self._label),
+                              repr(self._distance),
+                              format_int(self._dupcount),
+                              canonical_repr(self._additional_info),
+                              format(children_hash, 'x')])
+        return _digest128(content.encode())
+    
+    def get_structural_hash(self) -> int:
+        """
+        Retrieves the structural hash (Merkle digest) of `self`'s 
+        subtree, which covers the label, distance, duplication count
+        and additional info of each node in it. 
+        The children are combined independently of their order.
+        Hashes are cached in the nodes and invalidated by the modifying
+        methods, so that only the invalidated parts are recomputed.
+        Note that the ancestors of a node are not invalidated when it 
+        is modified directly -- use `Tree.invalidate_hashes()` then.
+
+        Returns:
+            int: a 128 bit digest, stable across processes.
+        """
+        if self._hash is not None:
+            return self._hash
+        stack = [self]
+        while len(stack) > 0:
+            node = stack[-1]
+            if node._hash is not None:
+                stack.pop()
+                continue
+            pending = [c for c in node._children if c._hash is None]
+            if len(pending) > 0:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            children_hash = 0
+            for c in node._children:
+                children_hash += c._hash
+            node._hash = node.gen_content_digest(
+                children_hash & self._HASH_MASK)
+        return self._hash
+    
+    
+    def get_subtree_stats(self) -> tuple[int,int,int,float]:
+        """
+        Retrieves statistics of `self`'s subtree, which are computed 
+        for all nodes in the subtree in a single iterative pass.
+        The results are cached and invalidated like the structural 
+        hash (see `get_structural_hash()`), so that after the first 
+        call only modified parts are recomputed and queries are O(1).
+
+        Returns:
+            tuple[int,int,int,float]: 
+                The number of nodes (including `self`), the number of 
+                leaves, the height (number of edges on the longest path
+                down to a leaf) and the total branch length (sum of the
+                distances of all nodes below `self`) of the subtree.
+        """
+        if self._stats is not None:
+            return self._stats
+        stack = [self]
+        while len(stack) > 0:
+            node = stack[-1]
+            if node._stats is not None:
+                stack.pop()
+                continue
+            pending = [c for c in node._children if c._stats is None]
+            if len(pending) > 0:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            size, leaves, height, length = 1, 0, -1, 0.0
+            for c in node._children:
+                csize, cleaves, cheight, clength = c._stats
+                size += csize
+                leaves += cleaves
+                if cheight > height:
+                    height = cheight
+                length += c._distance + clength
+            node._stats = (size, max(leaves, 1), height + 1, length)
+        return self._stats
+    
+    def get_subtree_size(self) -> int:
+        """
+        Counts the nodes in `self`'s subtree, including `self`. 
+        See `get_subtree_stats()`.
+
+        Returns:
+            int: the number of nodes in the subtree.
+        """
+        return self.get_subtree_stats()[0]
+    
+    def get_leaf_count(self) -> int:
+        """
+        Counts the leaves in `self`'s subtree. 
+        See `get_subtree_stats()`.
+
+        Returns:
+            int: the number of leaves in the subtree.
+        """
+        return self.get_subtree_stats()[1]
+    
+    def get_height(self) -> int:
+        """
+        Determines the height of `self`'s subtree. 
+        See `get_subtree_stats()`.
+
+        Returns:
+            int: the number of edges on the longest path from `self` 
+            down to a leaf.
+        """
+        return self.get_subtree_stats()[2]
+    
+    def get_total_branch_length(self) -> float:
+        """
+        Sums up the distances of all nodes below `self`. 
+        See `get_subtree_stats()`.
+
+        Returns:
+            float: the total branch length of the subtree.
+        """
+        return self.get_subtree_stats()[3]
+    
+    def get_ordered_children(self, child_order=None) -> list:
+        """
+        Retrieves `self`'s children in the given order.
+        Sorted orders are cached until a child is added or replaced, so
+        that repeated serializations do not sort again.
+
+        Args:
+            child_order (str | Callable[[Node],Any], optional): 
+                One of
+                  * `None` or `"insertion"`: order of insertion.
+                  * `"label"`: ascending by label.
+                  * `"size"`: ascending by subtree size, then by label.
+                  * a key function that maps a `Node` to a sortable 
+                    value.
+                Defaults to None.
+
+        Returns:
+            list: the children of `self`.
+        """
+        if child_order is None or child_order == "insertion" \
+                or len(self._children) < 2:
+            return self._children
+        cache = self._order_cache
+        if cache is not None and cache[0] == child_order:
+            return cache[1]
+        if child_order == "label":
+            ret = sorted(self._children, key=Node.get_label)
+        elif child_order == "size":
+            ret = sorted(self._children, 
+                         key=lambda c: (c.get_subtree_size(), c.get_label()))
+        elif callable(child_order):
+            ret = sorted(self._children, key=child_order)
+        else:
+            msg = \
+                """
+                The `child_order` has to be None, "insertion", "label",
+                "size" or a key function.
+                """
+            raise ValueError(child_order, msg)
+        self._order_cache = (child_order, ret)
+        return ret
+    
+    
     def gen_children_strings(self,
                              with_labels:bool, 
                              with_distances:bool, 
                              with_additional_info_nhx:bool, 
-                             outputlabel_mapper:Mapping['Node',str]) -> list:
+                             outputlabel_mapper:Mapping['Node',str],
+                             hybrid_seen:set=None,
+                             child_order=None,
+                             distance_formatter:Callable[[float],str]=None,
+                             node_hook:Callable[['Node'],None]=None,
+                             omitted_distance:float=None,
+                             nhx_key_filter:Callable[[str],bool]=None,
+                             nhx_hook:Callable[[str],None]=None) -> list:
         """generate the strings for all the children.
 
         Args:
@@ -299,24 +648,45 @@ class Node:
             with_distances (bool): see `to_string()`.
             with_additional_info_nhx (bool): see `to_string()`.
             outputlabel_mapper (bool): see `to_string()`.
+            hybrid_seen (set, optional): see `to_string()`.
+            child_order (optional): see `to_string()`.
+            distance_formatter (optional): see `to_string()`.
+            node_hook (optional): see `to_string()`.
+            omitted_distance (optional): see `to_string()`.
+            nhx_key_filter (optional): see `to_string()`.
+            nhx_hook (optional): see `to_string()`.
 
         Returns:
             list: of all the children's string representations.
         """
         ret_ch = []
-        for child in self._children:
+        for child in self.get_ordered_children(child_order):
             ret_ch.append(
                 child.to_string(with_labels, 
                                 with_distances, 
                                 with_additional_info_nhx, 
-                                outputlabel_mapper))
+                                outputlabel_mapper,
+                                hybrid_seen=hybrid_seen,
+                                child_order=child_order,
+                                distance_formatter=distance_formatter,
+                                node_hook=node_hook,
+                                omitted_distance=omitted_distance,
+                                nhx_key_filter=nhx_key_filter,
+                                nhx_hook=nhx_hook))
         return ret_ch
     
     def to_string(self,
                   with_labels:bool=True,
                   with_distances:bool=True,
                   with_additional_info_nhx:bool=False,
-                  outputlabel_mapper:Mapping['Node',str]=None) -> str:
+                  outputlabel_mapper:Mapping['Node',str]=None,
+                  hybrid_seen:set=None,
+                  child_order=None,
+                  distance_formatter:Callable[[float],str]=None,
+                  node_hook:Callable[['Node'],None]=None,
+                  omitted_distance:float=None,
+                  nhx_key_filter:Callable[[str],bool]=None,
+                  nhx_hook:Callable[[str],None]=None) -> str:
         """
         Generates a string representation of `self` and its 
         children in newick format.
@@ -349,16 +719,80 @@ class Node:
                 Defaults to `lambda n: n.get_label()`, so that a 
                 `Node` is mapped to its `Node._label`, which is the 
                 identification `label` (unique in its parent). 
+                Shared subtrees memoize their string, so the mapper 
+                should not depend on state that changes between two 
+                calls.
+            hybrid_seen (set, optional):
+                Set of the ids of all `HybridNode`s that have already 
+                been written during the current serialization. Hybrids
+                are written in full only on their first appearance 
+                (see Extended Newick format). 
+                Pass a fresh `set()` per serialization, as 
+                `Tree.to_string()` does. Defaults to None, in which 
+                case every appearance is written in full.
+            child_order (str | Callable[[Node],Any], optional):
+                Order in which the children are written: `None` for 
+                the order of insertion, `"label"`, `"size"` or a key 
+                function. See `get_ordered_children()`. Use a sorted 
+                order for canonical output. Defaults to None.
+            distance_formatter (Callable[[float],str], optional):
+                Function that converts distances to strings, e.g. one
+                created by `util_funcs.make_float_formatter()` for a 
+                different precision or for exact output. 
+                Defaults to None, which represents `format_float` (6 
+                decimal places, trailing zeros stripped).
+            node_hook (Callable[[Node],None], optional):
+                Function that is called with each node before it is 
+                written, e.g. to report progress or to cancel the 
+                serialization by raising an exception. It is not 
+                called for the nodes below a shared subtree whose 
+                string is memoized. Defaults to None.
+            omitted_distance (float, optional):
+                Distance that is left out of the output (together with
+                its ':'), e.g. the default distance of the tree, which
+                a parser assumes anyway. Defaults to None (write all
+                distances).
+            nhx_key_filter (Callable[[str],bool], optional):
+                Function that decides for each key of the additional
+                info whether it is written (True) or left out (False)
+                in NHX. Defaults to None (write all keys).
+            nhx_hook (Callable[[str],None], optional):
+                Function that is called with each NHX annotation that
+                is written, e.g. to count the bytes written. While it
+                is given, the memoized strings of shared subtrees are 
+                not reused, so that it is called for all their 
+                annotations as well. Defaults to None.
 
         Returns:
             str: A string representation of `self` and its subtree.
         """
+        if node_hook is not None:
+            node_hook(self)
+        if self._shared:
+            cache_key = (with_labels, 
+                         with_distances, 
+                         with_additional_info_nhx, 
+                         outputlabel_mapper,
+                         child_order,
+                         distance_formatter,
+                         omitted_distance,
+                         nhx_key_filter)
+            # the hook has to see every annotation, also the memoized
+            if self._str_cache[0] == cache_key and nhx_hook is None:
+                return self._str_cache[1]
         ret = []
         # append children info
         ret_ch = self.gen_children_strings(with_labels, 
                                            with_distances, 
                                            with_additional_info_nhx, 
-                                           outputlabel_mapper)
+                                           outputlabel_mapper,
+                                           hybrid_seen=hybrid_seen,
+                                           child_order=child_order,
+                                           distance_formatter=distance_formatter,
+                                           node_hook=node_hook,
+                                           omitted_distance=omitted_distance,
+                                           nhx_key_filter=nhx_key_filter,
+                                           nhx_hook=nhx_hook)
         if len(ret_ch) > 0:
             ret.append('(' + ','.join(ret_ch) + ')')
         # append own info
@@ -368,11 +802,21 @@ class Node:
             else:
                 ret.append(self._DEFAULT_OUTPUTLABEL_MAPPER())
         if with_additional_info_nhx:
-            ret.append(generate_nhx(self.get_additional_info()))
-        if with_distances:
-            ret.append(':' + format_float(self.get_distance()))
+            nhx = generate_nhx(self.get_additional_info(), 
+                               key_filter=nhx_key_filter)
+            if nhx_hook is not None:
+                nhx_hook(nhx)
+            ret.append(nhx)
+        if with_distances and self._distance != omitted_distance:
+            if distance_formatter:
+                ret.append(':' + distance_formatter(self.get_distance()))
+            else:
+                ret.append(':' + format_float(self.get_distance()))
         # convert to string and return
-        return ''.join(ret)
+        ret = ''.join(ret)
+        if self._shared:
+            self._str_cache = (cache_key, ret)
+        return ret
     
     
     def __repr__(self) -> str:
@@ -390,11 +834,14 @@ class HybridNode(Node):
     """
     Represents a single hybrid node in the tree 
     (see Extended Newick format).
+    The same instance is attached to several parents. It is written in 
+    full (children, additional info and distance) only on its first 
+    appearance during a serialization, every further appearance only 
+    writes its label with the hybrid id.
     """
     
     
     # class fields:
-    #_hybrid_ignore_pool
     #_hybrid_id
     
     
@@ -405,10 +852,9 @@ class HybridNode(Node):
     def __init__(self, 
                  label:str, 
                  hybrid_id:int,
-                 hybrid_ignore_pool:set,
                  distance:float         = 1.0, 
                  duplicates_count:int   = 0, 
-                 additional_info:dict   = dict(),
+                 additional_info:dict   = None,
                  children:list          = []):
         """Creates a new node with the given information.
 
@@ -418,62 +864,50 @@ class HybridNode(Node):
                 of the node. 
                 Has to be unique in its parent (see also 
                 `to_string()`)! 
-            distance (float, optional): 
-                distance from the parent node. Defaults to 1.0.
             hybrid_id (int):
                 the identifier number of this hybrid.
-            hybrid_ignore_pool (set):
-                This mechanism is supposed to prevent duplicate 
-                declarations on hybrids. 
-                If the hybrid node finds a representation of itself in
-                this pool, it will not append its children and 
-                additional info to its label during `to_string`.
-                This is supposed to be a reference to a set inside the 
-                managing `Tree`, which is being flushed by said `Tree` 
-                every time a new `to_string` process is being started. 
-                When this hybrid node's `to_string` is called, it adds 
-                itself to the pool automatically. If you want to 
-                prevent that, pass `None` for this arg or override the 
-                `handle_to_string()` function.   
+            distance (float, optional): 
+                distance from the parent node. Defaults to 1.0.
             duplicates_count (int, optional): 
                 duplicate counter -- counts how many other nodes 
                 there exist with the same label. Defaults to 0.
             additional_info (dict, optional): 
                 dictionary with all additional data you want to attach
                 to the node (see also `to_string()`). Defaults to 
-                dict().
+                None, which creates a new empty dict.
             children (list, optional): 
                 list of children nodes. Defaults to [].
                 Please avoid using this if possible.
         """
         
-        # instantiate via super constructor
-        super(HybridNode, self).__init__( \
-                         label=label, 
-                         distance=distance, 
-                         duplicates_count=duplicates_count,
-                         additional_info=additional_info,
-                         children=children)
-        
         # argument validation
-        if not isinstance(hybrid_id, int):
+        if not isinstance(hybrid_id, int) or isinstance(hybrid_id, bool):
             msg = \
                 """
                 Please pass a valid integer for the `hybrid_id`.
                 If you don't wish to instantiate a hybrid, use
                 the `Node` 
                 """
-        if not (isinstance(hybrid_ignore_pool, set) 
-                or hybrid_ignore_pool == None):
-            msg = \
-                """
-                The `hybrid_ignore_pool` has to be a `set` or `None`.
-                """
-            raise ValueError(hybrid_ignore_pool, msg)
+            raise ValueError(hybrid_id, msg)
+        
+        # instantiate via super constructor
+        super(HybridNode, self).__init__( \
+                         label=label, 
+                         distance=distance, 
+                         duplicates_count=duplicates_count,
+                         additional_info=additional_info,
+                         children=children)
         
         # write to class fields
         self._hybrid_id = hybrid_id
-        self._hybrid_ignore_pool = hybrid_ignore_pool
+        
+    def get_hybrid_id(self) -> int:
+        """Retrieves the hybrid id of `self`.
+
+        Returns:
+            int: the identifier number of this hybrid.
+        """
+        return self._hybrid_id
     
     def gen_hybrid_id_string(self) -> str:
         """
@@ -486,51 +920,54 @@ class HybridNode(Node):
         """
         return "#" + format_int(self._hybrid_id)
     
-    def gen_children_strings(self,
-                             with_labels, 
-                             with_distances, 
-                             with_additional_info_nhx, 
-                             outputlabel_mapper) -> list:
+    def gen_content_digest(self, children_hash:int) -> int:
         """
-        Generate the strings for all the children.
-        Modified so that it returns an empty list if this hybrid is in 
-        the `_hybrid_ignore_pool`.
-
-        Args:
-            with_labels (bool): see `to_string()`.
-            with_distances (bool): see `to_string()`.
-            with_additional_info_nhx (bool): see `to_string()`.
-            outputlabel_mapper (bool): see `to_string()`.
-
-        Returns:
-            list: of all the children's string representations.
+        Generates the structural hash of `self`, including its 
+        `hybrid_id`. See `Node.gen_content_digest()`.
         """
-        hid_str = self.gen_hybrid_id_string()
-        if hid_str in self._hybrid_ignore_pool:
-            return [] # on empty list, children will not be included 
-                      # in the output string
-        else:
-            return super(HybridNode, self) \
-                .gen_children_strings(with_labels,
-                                      with_distances,
-                                      with_additional_info_nhx,
-                                      outputlabel_mapper)
-                
+        return super(HybridNode, self).gen_content_digest(
+            children_hash ^ self._hybrid_id)
     
     def to_string(self,
                   with_labels:bool=True,
                   with_distances:bool=True,
                   with_additional_info_nhx:bool=False,
-                  outputlabel_mapper:Mapping['Node',str]=None) -> str:
-        # only print distance when first appearance
-        hid_str = self.gen_hybrid_id_string()
-        m_with_distances = with_distances and \
-                hid_str in self._hybrid_ignore_pool
+                  outputlabel_mapper:Mapping['Node',str]=None,
+                  hybrid_seen:set=None,
+                  child_order=None,
+                  distance_formatter:Callable[[float],str]=None,
+                  node_hook:Callable[['Node'],None]=None,
+                  omitted_distance:float=None,
+                  nhx_key_filter:Callable[[str],bool]=None,
+                  nhx_hook:Callable[[str],None]=None) -> str:
+        """
+        Generates a string representation of `self` in newick format.
+        If `self` is already contained in `hybrid_seen`, only the label
+        is written. Otherwise `self` is added to `hybrid_seen` and 
+        written in full, including its children.
+        See `Node.to_string()` for the args.
+        """
+        if hybrid_seen is not None:
+            if id(self) in hybrid_seen:
+                # repeated appearance: only refer to the hybrid
+                if not with_labels:
+                    return ""
+                if outputlabel_mapper:
+                    return outputlabel_mapper(self)
+                return self._DEFAULT_OUTPUTLABEL_MAPPER()
+            hybrid_seen.add(id(self))
         return super(HybridNode, self) \
                     .to_string(with_labels,
-                               m_with_distances,
+                               with_distances,
                                with_additional_info_nhx,
-                               outputlabel_mapper)
+                               outputlabel_mapper,
+                               hybrid_seen=hybrid_seen,
+                               child_order=child_order,
+                               distance_formatter=distance_formatter,
+                               node_hook=node_hook,
+                               omitted_distance=omitted_distance,
+                               nhx_key_filter=nhx_key_filter,
+                               nhx_hook=nhx_hook)
 
 
 class RootNode(Node):
@@ -541,7 +978,7 @@ class RootNode(Node):
     
     def __init__(self, 
                  label:str, 
-                 additional_info:dict   = dict(),
+                 additional_info:dict   = None,
                  children:list          = []):
         """Creates a new node with the given information.
 
@@ -554,7 +991,7 @@ class RootNode(Node):
             additional_info (dict, optional): 
                 dictionary with all additional data you want to attach
                 to the node (see also `to_string()`). Defaults to 
-                dict().
+                None, which creates a new empty dict.
             children (list, optional): 
                 list of children nodes. Defaults to [].
                 Please avoid using this if possible.
@@ -575,6 +1012,9 @@ class RootNode(Node):
          * additional info dictionary
          * children nodes
         Other data in `node` may be lost.
+        The children are shared with `node`, not copied, so changes 
+        below the first level show in both (see `Tree.subtree()` for 
+        an independent copy).
 
         Args:
             node (Node): original node
@@ -584,8 +1024,7 @@ class RootNode(Node):
         """
         ret = RootNode(label=node._label,
                        additional_info=node._additional_info)
-        ret._children = node._children
-        ret._children_by_label = node._children_by_label
+        ret._children_by_label = dict(node._children_by_label)
         return ret
 
 
@@ -605,7 +1044,14 @@ class RootNode(Node):
                   with_labels:bool=True,
                   with_distances:bool=True,
                   with_additional_info_nhx:bool=False,
-                  outputlabel_mapper:Mapping['Node',str]=None) -> str:
+                  outputlabel_mapper:Mapping['Node',str]=None,
+                  hybrid_seen:set=None,
+                  child_order=None,
+                  distance_formatter:Callable[[float],str]=None,
+                  node_hook:Callable[['Node'],None]=None,
+                  omitted_distance:float=None,
+                  nhx_key_filter:Callable[[str],bool]=None,
+                  nhx_hook:Callable[[str],None]=None) -> str:
         """
         Generates a string representation of `self` and its 
         children in newick format.
@@ -638,27 +1084,103 @@ class RootNode(Node):
                 Defaults to `lambda n: n.get_label()`, so that a 
                 `Node` is mapped to its `Node._label`, which is the 
                 identification `label` (unique in its parent). 
+            hybrid_seen (set, optional):
+                Set of the ids of all `HybridNode`s that have already 
+                been written during the current serialization. Hybrids
+                are written in full only on their first appearance 
+                (see Extended Newick format). 
+                Pass a fresh `set()` per serialization, as 
+                `Tree.to_string()` does. Defaults to None, in which 
+                case every appearance is written in full.
+            child_order (str | Callable[[Node],Any], optional):
+                Order in which the children are written: `None` for 
+                the order of insertion, `"label"`, `"size"` or a key 
+                function. See `get_ordered_children()`. Use a sorted 
+                order for canonical output. Defaults to None.
+            distance_formatter (Callable[[float],str], optional):
+                Function that converts distances to strings, e.g. one
+                created by `util_funcs.make_float_formatter()` for a 
+                different precision or for exact output. 
+                Defaults to None, which represents `format_float` (6 
+                decimal places, trailing zeros stripped).
+            node_hook (Callable[[Node],None], optional):
+                Function that is called with each node before it is 
+                written. See `Node.to_string()`. Defaults to None.
+            omitted_distance (float, optional):
+                Distance that is left out of the output. See 
+                `Node.to_string()`. Defaults to None.
+            nhx_key_filter (Callable[[str],bool], optional):
+                Function that decides which keys of the additional info
+                are written. See `Node.to_string()`. Defaults to None.
+            nhx_hook (Callable[[str],None], optional):
+                Function that is called with each NHX annotation that
+                is written. See `Node.to_string()`. Defaults to None.
 
         Returns:
             str: A string representation of `self` and its subtree.
         """
-        
-        ret = []
-        # append children info
-        ret_ch = self.gen_children_strings(with_labels, 
-                                           with_distances, 
-                                           with_additional_info_nhx, 
-                                           outputlabel_mapper)
-        if len(ret_ch) > 0:
-            ret.append('(' + ','.join(ret_ch) + ')')
-        # append own info
+        return ''.join(self.gen_string_parts(with_labels, 
+                                             with_distances, 
+                                             with_additional_info_nhx, 
+                                             outputlabel_mapper,
+                                             hybrid_seen=hybrid_seen,
+                                             child_order=child_order,
+                                             distance_formatter=distance_formatter,
+                                             node_hook=node_hook,
+                                             omitted_distance=omitted_distance,
+                                             nhx_key_filter=nhx_key_filter,
+                                             nhx_hook=nhx_hook))
+    
+    def gen_string_parts(self,
+                         with_labels:bool=True,
+                         with_distances:bool=True,
+                         with_additional_info_nhx:bool=False,
+                         outputlabel_mapper:Mapping['Node',str]=None,
+                         hybrid_seen:set=None,
+                         child_order=None,
+                         distance_formatter:Callable[[float],str]=None,
+                         node_hook:Callable[['Node'],None]=None,
+                         omitted_distance:float=None,
+                         nhx_key_filter:Callable[[str],bool]=None,
+                         nhx_hook:Callable[[str],None]=None):
+        """
+        Generates the string representation of `self` (see 
+        `to_string()`) piece by piece, one top-level subtree at a time,
+        so that it can be written out while it is being generated.
+        Takes the same arguments as `to_string()`.
+
+        Yields:
+            str: the consecutive parts of the string representation.
+        """
+        if node_hook is not None:
+            node_hook(self)
+        # children info
+        sep = '('
+        for child in self.get_ordered_children(child_order):
+            yield sep + child.to_string(with_labels, 
+                                        with_distances, 
+                                        with_additional_info_nhx, 
+                                        outputlabel_mapper,
+                                        hybrid_seen=hybrid_seen,
+                                        child_order=child_order,
+                                        distance_formatter=distance_formatter,
+                                        node_hook=node_hook,
+                                        omitted_distance=omitted_distance,
+                                        nhx_key_filter=nhx_key_filter,
+                                        nhx_hook=nhx_hook)
+            sep = ','
+        if sep == ',':
+            yield ')'
+        # own info
         if with_labels:
             if outputlabel_mapper:
-                ret.append(outputlabel_mapper(self))
+                yield outputlabel_mapper(self)
             else:
-                ret.append(self._DEFAULT_OUTPUTLABEL_MAPPER())
+                yield self._DEFAULT_OUTPUTLABEL_MAPPER()
         if with_additional_info_nhx:
-            ret.append(generate_nhx(self.get_additional_info()))
-        # convert to string and return
-        return ''.join(ret)
+            nhx = generate_nhx(self.get_additional_info(), 
+                               key_filter=nhx_key_filter)
+            if nhx_hook is not None:
+                nhx_hook(nhx)
+            yield nhx
     
\ No newline at end of file
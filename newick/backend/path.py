@@ -1,3 +1,4 @@
+from collections.abc import Callable
 from .util_funcs import format_float
 
 
@@ -46,9 +47,26 @@ class Path:
         
         
     def __repr__(self):
+        return self.to_string()
+    
+    def to_string(self, distance_formatter:Callable[[float],str]=None) -> str:
+        """
+        Generates a string representation of the path.
+
+        Args:
+            distance_formatter (Callable[[float],str], optional): 
+                Function that converts distances to strings (see 
+                `util_funcs.make_float_formatter()`). 
+                Defaults to None, which represents `format_float`.
+
+        Returns:
+            str: e.g. `Path(R:0 -> A:1)`
+        """
+        if distance_formatter is None:
+            distance_formatter = format_float
         ret_strs = []
-        for w,d in self:
-            ret_strs.append(w + ":" + format_float(d))
+        for w, d in zip(self._waypoints, self._distances):
+            ret_strs.append(w + ":" + distance_formatter(d))
         return type(self).__name__ + "(" + " -> ".join(ret_strs) + ")"
     
     
@@ -0,0 +1,136 @@
+from time import perf_counter
+
+
+class _Span:
+    """
+    Context manager that adds the time spent in its body to a phase of
+    a `BuildProfile` (see `BuildProfile.span()`).
+    """
+
+    __slots__ = ("_profile", "_phase", "_start")
+
+    def __init__(self, profile:'BuildProfile', phase:str):
+        self._profile = profile
+        self._phase = phase
+
+    def __enter__(self):
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._profile.add_time(self._phase, perf_counter() - self._start)
+        return False
+
+
+class _NoSpan:
+    """
+    Context manager that does nothing, for disabled timings.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+
+class BuildProfile:
+    """
+    Collects counters (and optionally timings) while a tree is being
+    built and serialized.
+
+    Profiling is opt-in: attach an instance to a tree using
+    `Tree.enable_profiling()` or pass one to `tree_parse_basic()`.
+    Trees without a profile only pay for a single `None` check per
+    insertion or serialization.
+
+    Counters:
+        lines_parsed: non-empty lines seen by the parser.
+        lines_dropped: lines dropped entirely by the parser (e.g. due
+            to the blacklist, or because they are too short).
+        paths_inserted: calls of `Tree.add_new_node()` and paths
+            passed to `Tree.add_new_hybrid_node()`.
+        nodes_created: nodes that were newly added to the tree.
+        duplicates_merged: end points of paths that were merged into
+            an already present node.
+        dist_adjustments: calls of the distance adjustment strategy.
+        nhx_bytes: length of all NHX annotations written (including
+            the escape characters), counted while they are generated.
+            Shared subtrees (see `Tree.compress_shared_subtrees()`)
+            count once per appearance; their memoized strings are not
+            reused while this is counted.
+        max_depth: maximum depth of any inserted node.
+
+    Timings (only if enabled), in seconds, summed up per phase:
+        "tokenize" and "insert" by the parser, "serialize" by
+        `Tree.to_string()`.
+    """
+
+    COUNTERS = ("lines_parsed", "lines_dropped", "paths_inserted",
+                "nodes_created", "duplicates_merged", "dist_adjustments",
+                "nhx_bytes", "max_depth")
+
+    __slots__ = COUNTERS + ("timings", "_timed")
+
+
+    def __init__(self, timings:bool=False):
+        """
+        Creates a new profile with all counters set to zero.
+
+        Args:
+            timings (bool, optional):
+                Whether or not to also measure the time spent in each
+                phase. Defaults to False.
+        """
+        self._timed = timings
+        self.reset()
+
+    def reset(self):
+        """
+        Sets all counters and timings back to zero.
+        """
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.timings = dict()
+
+    def is_timed(self) -> bool:
+        return self._timed
+
+    def add_time(self, phase:str, seconds:float):
+        """
+        Adds `seconds` to the time spent in `phase`, if timings are
+        enabled.
+        """
+        if self._timed:
+            self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+    def span(self, phase:str):
+        """
+        Returns a context manager that measures the time spent in its
+        body as part of `phase`. It does nothing if timings are
+        disabled.
+
+        Args:
+            phase (str): name of the phase.
+        """
+        if not self._timed:
+            return _NO_SPAN
+        return _Span(self, phase)
+
+    def as_dict(self) -> dict:
+        """
+        Returns:
+            dict: the counters by name, and the timings by phase under
+            the key "timings" (if enabled).
+        """
+        ret = {name: getattr(self, name) for name in self.COUNTERS}
+        if self._timed:
+            ret["timings"] = dict(self.timings)
+        return ret
+
+    def __repr__(self) -> str:
+        return "BuildProfile(" + repr(self.as_dict()) + ")"
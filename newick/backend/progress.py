@@ -0,0 +1,65 @@
+from time import monotonic
+
+
+class Cancelled(Exception):
+    """
+    Raised by a long-running operation when its `CancelToken` has been
+    cancelled.
+
+    The `checkpoint` attribute holds whatever is needed to resume the
+    operation (see e.g. `tree_parse_basic()`), or `None` if it cannot
+    be resumed.
+    """
+
+    def __init__(self, checkpoint=None):
+        super().__init__("The operation has been cancelled.")
+        self.checkpoint = checkpoint
+
+
+class CancelToken:
+    """
+    Cooperative cancellation token for long-running operations, such
+    as parsing or serializing a large tree.
+
+    The operation checks the token every now and then and raises
+    `Cancelled` once it is cancelled, either explicitly using
+    `cancel()` (which is safe to call from another thread or a signal
+    handler) or because its deadline has passed.
+    """
+
+    def __init__(self, timeout:float=None):
+        """
+        Creates a new token that is not cancelled yet.
+
+        Args:
+            timeout (float, optional):
+                Number of seconds after which the token counts as
+                cancelled. Defaults to None (no deadline).
+        """
+        self._cancelled = False
+        self._deadline = None if timeout is None else monotonic() + timeout
+
+    def cancel(self):
+        """
+        Requests the cancellation of the operations using this token.
+        """
+        self._cancelled = True
+
+    def is_cancelled(self) -> bool:
+        """
+        Returns:
+            bool: whether cancellation has been requested or the
+            deadline has passed.
+        """
+        if not self._cancelled and self._deadline is not None \
+                and monotonic() >= self._deadline:
+            self._cancelled = True
+        return self._cancelled
+
+    def check(self, checkpoint=None):
+        """
+        Raises `Cancelled` (with the given `checkpoint`) if the token
+        has been cancelled.
+        """
+        if self.is_cancelled():
+            raise Cancelled(checkpoint)
@@ -0,0 +1,68 @@
+from newick.backend.consensus import get_taxa, extract_splits, split_to_labels, \
+    SplitTable, count_splits, consensus_tree, majority_consensus, strict_consensus
+from newick.frontend.forest import parse_newick
+import pytest
+
+
+TREES = ["((a,b)x,(c,d)y)r;",
+         "((a,b)x,(c,d)y)r;",
+         "((a,c)x,(b,d)y)r;",
+         "(((a,b)x,c)z:2,d)r;"]
+
+
+def test_extract_splits():
+    t = parse_newick("((a:2,b)x:3,(c,d)y)r;")
+    taxa = get_taxa(t)
+    assert taxa == ["a", "b", "c", "d"]
+    bits = {label: i for i, label in enumerate(taxa)}
+    labels = dict()
+    splits = extract_splits(t, bits, labels=labels)
+    assert splits == {0b0001: 2.0, 0b0010: 1.0, 0b0100: 1.0, 0b1000: 1.0,
+                      0b0011: 3.0, 0b1100: 1.0}
+    assert labels == {0b0011: "x", 0b1100: "y"}
+    assert split_to_labels(0b1100, taxa) == ["c", "d"]
+    # unrooted, the two edges at the root are the same split
+    splits = extract_splits(t, bits, rooted=False)
+    assert splits[0b1100] == 4.0
+    assert 0b0011 not in splits
+    with pytest.raises(ValueError):
+        extract_splits(parse_newick("(a,b,c)r;"), bits)
+    with pytest.raises(ValueError):
+        get_taxa(parse_newick("((a,b)x,(a)y)r;"))
+
+def test_majority_consensus():
+    t = majority_consensus(parse_newick(s) for s in TREES)
+    assert t.to_string(with_distances=False, with_additional_info_nhx=True,
+                       child_order="label") \
+        == "(c,d,(a,b)x[&&NHX:support=0.75])r;"
+
+def test_strict_and_greedy_consensus():
+    trees = [parse_newick(s) for s in TREES]
+    assert strict_consensus(trees).to_string(with_distances=False) == "(a,b,c,d)r;"
+    # splits below half of the trees are added if compatible
+    t = consensus_tree(trees, threshold=0.2)
+    assert t.to_string(with_distances=False, child_order="label") \
+        == "((a,b)x,(c,d)y)r;"
+    table = count_splits(trees)
+    assert table.count_trees() == 4
+    assert table.get_count(0b0011) == 3
+    assert table.get_support(0b1100) == 0.5
+    assert table.get_mean_length(0b0111) == 2.0
+    with pytest.raises(ValueError):
+        table.select_splits(1.5)
+
+def test_unrooted_consensus():
+    trees = [parse_newick("((a,b)x,(c,d)y);"), parse_newick("(((a,b)x,c)z,d);")]
+    t = strict_consensus(trees, rooted=False)
+    assert t.to_string(with_distances=False, child_order="size") \
+        == "(a,b,(c,d)y);"
+
+def test_parallel_count():
+    trees = [parse_newick(s) for s in TREES * 4]
+    serial = count_splits(trees)
+    parallel = count_splits(trees, processes=2, chunksize=2)
+    assert parallel.get_splits() == serial.get_splits()
+    assert parallel.build_consensus().to_string(with_additional_info_nhx=True) \
+        == serial.build_consensus().to_string(with_additional_info_nhx=True)
+    with pytest.raises(ValueError):
+        count_splits([])
@@ -0,0 +1,46 @@
+from newick.backend.distance import TreeSplits, prepare_splits, robinson_foulds, \
+    branch_score_distance, distance_matrix, distances_to
+from newick.frontend.forest import parse_newick
+from math import sqrt
+import pytest
+
+
+TREES = ["((a,b)x,(c,d)y)r;",
+         "((a,c)x,(b,d)y)r;",
+         "(((a,b)x,c)z:2,d)r;"]
+
+
+def test_robinson_foulds():
+    t1, t2, t3 = (parse_newick(s) for s in TREES)
+    assert robinson_foulds(t1, t1) == 0
+    assert robinson_foulds(t1, t2) == 4
+    assert robinson_foulds(t1, t3) == 2
+    assert robinson_foulds(t1, t3, normalized=True) == 0.5
+    # unrooted, ab|cd is the only non-trivial split of both
+    assert robinson_foulds(t1, t3, rooted=False) == 0
+    with pytest.raises(ValueError):
+        robinson_foulds(t1, parse_newick("((a,b)x,(c,e)y)r;"))
+
+def test_branch_score_distance():
+    t1 = parse_newick("((a:1,b:2)x:3,c:1)r;")
+    t2 = parse_newick("((a:1,c:2)x:1,b:1)r;")
+    assert branch_score_distance(t1, t1) == 0.0
+    # b: 2 vs 1, c: 1 vs 2, ab: 3 vs 0, ac: 0 vs 1
+    assert branch_score_distance(t1, t2) == pytest.approx(sqrt(1 + 1 + 9 + 1))
+
+def test_distance_matrix():
+    trees = [parse_newick(s) for s in TREES]
+    assert distance_matrix(trees) == [[0, 4, 2], [4, 0, 4], [2, 4, 0]]
+    nrf = distance_matrix(trees, metric="nrf")
+    assert nrf[0][2] == 0.5 and nrf[2][0] == 0.5
+    assert distances_to(trees[0], trees, metric="nrf") == [0.0, 1.0, 0.5]
+    assert distance_matrix(trees, processes=2) == distance_matrix(trees)
+    assert distance_matrix([]) == []
+    with pytest.raises(ValueError):
+        distance_matrix(trees, metric="x")
+
+def test_tree_splits():
+    s1, s3 = prepare_splits(parse_newick(TREES[i]) for i in (0, 2))
+    assert isinstance(s1, TreeSplits)
+    assert s1.count_splits() == 2 and s3.count_splits() == 2
+    assert s1.distance(s3, "branch_score") == pytest.approx(sqrt(1 + 4))
@@ -0,0 +1,70 @@
+from newick.backend.lazy import open_lazy, build_index, LazyNode, LazyTree
+from newick.backend.tree import Tree
+from newick.backend.path import Path
+from newick.frontend.very_basic import tree_parse_basic
+import pytest
+
+
+def write_tree(tmp_path, text:str):
+    filename = tmp_path / "t.nwk"
+    filename.write_text(text)
+    return filename
+
+def test_open_lazy_roundtrip(tmp_path):
+    t = tree_parse_basic("a0,b0:2,c0;a0,b1,c1:0.5;a1;a0,b0,c0;", "r")
+    out = t.to_string(with_additional_info_nhx=True)
+    filename = write_tree(tmp_path, out + "\n")
+    with open_lazy(filename) as lt:
+        assert isinstance(lt, LazyTree)
+        assert lt._root.get_label() == "r"
+        assert not lt._root.is_materialized()
+        assert lt.to_string(with_additional_info_nhx=True) == out
+        assert lt.to_string() == t.to_string()
+
+def test_open_lazy_quoted_labels(tmp_path):
+    text = "(('c:d':2,'it''s' ,'h x'#1)a:1)'r (1)';"
+    with open_lazy(write_tree(tmp_path, text)) as lt:
+        assert lt._root.get_label() == "r (1)"
+        a = lt._root.get_child_by_label("a")
+        assert [c.get_label() for c in a._children] == ["c:d", "it's", "h x#1"]
+        assert lt.to_string(quote_labels=True) \
+            == "(('c:d':2,'it''s':1,'h x#1':1)a:1)'r (1)';"
+    with pytest.raises(ValueError):
+        with open_lazy(write_tree(tmp_path, "(a,'b)r;"), rebuild_index=True) as lt:
+            lt.to_string()
+
+def test_open_lazy_on_demand(tmp_path):
+    filename = write_tree(tmp_path, "((x,y)a:2,((z)c)b[&&NHX:k=v\\)]:3)r;")
+    lt = open_lazy(filename)
+    source = lt._root._lazy[0]
+    assert source.materialized == 0
+    a = lt._root.get_child_by_label("a")
+    assert isinstance(a, LazyNode) and not a.is_materialized()
+    assert a.get_distance() == 2.0
+    assert source.materialized == 1
+    assert a.count_children() == 2
+    assert source.materialized == 2
+    b = lt._root.get_child_by_label("b")
+    assert b.get_additional_info() == {"k": "v)"}
+    assert not b.is_materialized()
+    # modifications work as usual
+    lt.add_new_node(Path("r", [("b", 3.0), ("c", 1.0), ("w", 1.0)]))
+    assert lt.to_string() == "((x:1,y:1)a:2,((z:1,w:1)c:1)b:3)r;"
+    lt.close()
+    lt.close()
+    assert lt.to_string() == "((x:1,y:1)a:2,((z:1,w:1)c:1)b:3)r;"
+
+def test_index_outdated(tmp_path):
+    filename = write_tree(tmp_path, "(a,b)r;")
+    build_index(filename)
+    filename.write_text("(a,b,c)r;")
+    with pytest.raises(ValueError):
+        open_lazy(filename)
+    with open_lazy(filename, rebuild_index=True) as lt:
+        assert lt.to_string() == "(a:1,b:1,c:1)r;"
+
+def test_index_unbalanced(tmp_path):
+    with pytest.raises(ValueError):
+        build_index(write_tree(tmp_path, "((a,b)r;"))
+    with pytest.raises(ValueError):
+        build_index(write_tree(tmp_path, "(a,b))r;"))
@@ -10,10 +10,19 @@ def test_generate_nhx_alphanum():
     dct = {"A":1, "Bonn": None, 52: True}
     assert generate_nhx(dct) == "[&&NHX:A=1:Bonn=None:52=True]"
 
+def test_generate_nhx_key_filter():
+    dct = {"A":1, "_b": 2}
+    assert generate_nhx(dct, key_filter=lambda k: k != "_b") == "[&&NHX:A=1]"
+    assert generate_nhx(dct, key_filter=lambda k: False) == ""
+
 def test_generate_nhx_othersym():
     dct = {"A=C":1, "B:nn": "B(er)lin", "new\n-line": "s p a c e"}
     assert generate_nhx(dct) == "[&&NHX:A\\=C=1:B\\:nn=B\\(er\\)lin:new\\\n-line=s p a c e]"
     
 def test_nhx_filter_str_0():
     assert nhx_filter_str("A=C") == "A\\=C"
-    
\ No newline at end of file
+    
+def test_parse_nhx():
+    assert parse_nhx("") == {}
+    dct = {"A=C": "1", "B:nn": "B(er)lin", "new\n-line": "s p a c e", "e": ""}
+    assert parse_nhx(generate_nhx(dct)) == dct
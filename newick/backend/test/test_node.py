@@ -1,4 +1,5 @@
-from newick.backend.node import Node
+from newick.backend.node import Node, HybridNode
+import pytest
 
 
 # BASIC TESTS
@@ -117,5 +118,72 @@ def test_duplicates():
     assert node1.get_duplication_count() == 1
     
     
-# TODO: HYBRID NODE TESTS
+def test_remove_child():
+    a = Node("A")
+    for label in ["B", "C", "D"]:
+        a.add_child(Node(label))
+    h = a.get_structural_hash()
+    assert a.remove_child("C").get_label() == "C"
+    assert a.remove_child("C") is None
+    assert a.count_children() == 2
+    assert str(a) == "(B:1,D:1)A:1"
+    assert a.get_structural_hash() != h
+    a.add_child(Node("C"))
+    assert str(a) == "(B:1,D:1,C:1)A:1"
+
+def test_subtree_stats():
+    a = Node("A")
+    b = Node("B", distance=2)
+    b.add_child(Node("C", distance=0.5))
+    b.add_child(Node("D"))
+    a.add_child(b)
+    a.add_child(Node("E", distance=3))
+    assert a.get_subtree_stats() == (5, 3, 2, 6.5)
+    assert b.get_subtree_stats() == (3, 2, 1, 1.5)
+    assert a.get_leaf_count() == 3
+    assert Node("X").get_subtree_stats() == (1, 1, 0, 0.0)
+    a.add_child(Node("F"))
+    assert a.get_subtree_size() == 6
+    assert a.get_total_branch_length() == 7.5
+
+def test_structural_hash_order_independent():
+    a = Node("A")
+    a.add_child(Node("B", distance=2))
+    a.add_child(Node("C", additional_info={"k": {"x", "y"}}))
+    b = Node("A")
+    b.add_child(Node("C", additional_info={"k": {"y", "x"}}))
+    b.add_child(Node("B", distance=2))
+    assert a.get_structural_hash() == b.get_structural_hash()
+
+def test_structural_hash_invalidation():
+    a = Node("A")
+    a.add_child(Node("B"))
+    h0 = a.get_structural_hash()
+    a.add_child(Node("B"))  # duplicate
+    h1 = a.get_structural_hash()
+    assert h1 != h0
+    a.add_child(Node("C"))
+    assert a.get_structural_hash() not in (h0, h1)
+    
+    
+# HYBRID NODE TESTS
+
+
+def test_hybrid_first_appearance():
+    root = Node("R")
+    a = Node("A")
+    b = Node("B")
+    h = HybridNode("H", 1, distance=2)
+    h.add_child(Node("C"))
+    root.add_child(a)
+    root.add_child(b)
+    a.add_child(h)
+    b.add_child(h)
+    assert root.to_string(hybrid_seen=set()) == "(((C:1)H#1:2)A:1,(H#1)B:1)R:1"
+    # without tracking, every appearance is written in full
+    assert root.to_string() == "(((C:1)H#1:2)A:1,((C:1)H#1:2)B:1)R:1"
+
+def test_hybrid_invalid_id():
+    with pytest.raises(ValueError):
+        HybridNode("H", "1")
 
@@ -29,4 +29,9 @@ def test_iter():
         assert len(c) == 2
         assert isinstance(c[0], str)
         assert isinstance(c[1], float)
-        
\ No newline at end of file
+
+def test_to_string_formatter():
+    from newick.backend.util_funcs import make_float_formatter
+    b = Path("R", [("B", 1e-8)])
+    assert str(b) == "Path(R:0 -> B:0)"
+    assert b.to_string(make_float_formatter("shortest")) == "Path(R:0 -> B:1e-08)"
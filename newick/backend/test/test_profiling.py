@@ -0,0 +1,21 @@
+from newick.backend.profiling import BuildProfile
+
+
+def test_counters():
+    prof = BuildProfile()
+    assert prof.as_dict() == {name: 0 for name in BuildProfile.COUNTERS}
+    prof.nodes_created += 2
+    with prof.span("x"):
+        pass
+    assert prof.timings == {}
+    prof.reset()
+    assert prof.nodes_created == 0
+
+def test_timings():
+    prof = BuildProfile(timings=True)
+    with prof.span("x"):
+        pass
+    prof.add_time("x", 1.0)
+    prof.add_time("y", 2.0)
+    assert prof.timings["x"] >= 1.0
+    assert prof.as_dict()["timings"]["y"] == 2.0
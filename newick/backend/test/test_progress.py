@@ -0,0 +1,17 @@
+from newick.backend.progress import CancelToken, Cancelled
+import pytest
+
+
+def test_cancel_token():
+    token = CancelToken()
+    assert not token.is_cancelled()
+    token.check()
+    token.cancel()
+    assert token.is_cancelled()
+    with pytest.raises(Cancelled) as exc:
+        token.check("state")
+    assert exc.value.checkpoint == "state"
+
+def test_cancel_token_timeout():
+    assert CancelToken(timeout=0).is_cancelled()
+    assert not CancelToken(timeout=3600).is_cancelled()
@@ -1,5 +1,7 @@
 from newick.backend.tree import Tree
 from newick.backend.path import Path
+from newick.backend.node import Node
+import pytest
 
 
 def test_basic():
@@ -42,5 +44,533 @@ def test_exact_duplicate():
     assert t.to_string() == "(A:1,(C-c:2.2)B:3)R;"
     assert t._root.get_child_by_label("B").get_duplication_count() == 0
     assert t._root.get_child_by_label("B").get_child_by_label("C-c").get_duplication_count() == 1
-    
-    
\ No newline at end of file
+
+def test_hybrid():
+    t = Tree(Tree.RootNode("R"))
+    t.add_new_node(Path("R", [("A", 1.0)]))
+    t.add_new_node(Path("R", [("B", 1.0)]))
+    assert t.add_new_hybrid_node([Path("R", [("A", 1.0), ("H", 2.0)]),
+                                  Path("R", [("B", 1.0), ("H", 2.0)])])
+    assert t.count_hybrids() == 1
+    assert t.get_hybrid("H", 1) is not None
+    assert t.to_string() == "((H#1:2)A:1,(H#1)B:1)R;"
+    # serialization state is not kept between calls
+    assert t.to_string() == "((H#1:2)A:1,(H#1)B:1)R;"
+
+def test_hybrid_duplicate():
+    t = Tree(Tree.RootNode("R"))
+    paths = [Path("R", [("A", 1.0), ("H", 2.0)]),
+             Path("R", [("B", 1.0), ("H", 4.0)])]
+    assert t.add_new_hybrid_node(paths, hybrid_id=3)
+    assert not t.add_new_hybrid_node(paths, hybrid_id=3)
+    assert t.get_hybrid("H", 3).get_duplication_count() == 1
+    assert t.to_string(with_distances=False) == "((H#3)A,(H#3)B)R;"
+
+def test_hybrid_many():
+    t = Tree(Tree.RootNode("R"))
+    for i in range(2000):
+        t.add_new_hybrid_node([Path("R", [("A" + str(i), 1.0), ("H" + str(i), 1.0)]),
+                               Path("R", [("B", 1.0), ("H" + str(i), 1.0)])])
+    assert t.count_hybrids() == 2000
+    assert t.get_hybrid("H1999", 2000) is not None
+    assert t.to_string().count("H5#6") == 2
+
+def _build_repeated_tree():
+    t = Tree(Tree.RootNode("R"))
+    for p in ["A", "B", "C"]:
+        t.add_new_node(Path("R", [(p, 1.0), ("x", 2.0), ("y", 1.0)]), additional_info=dict())
+        t.add_new_node(Path("R", [(p, 1.0), ("x", 2.0), ("z", 1.5)]), additional_info=dict())
+    return t
+
+def test_compress_shared_subtrees():
+    t = _build_repeated_tree()
+    expected = t.to_string()
+    expected_nodist = t.to_string(with_distances=False)
+    assert t.compress_shared_subtrees() == 6
+    a = t._root.get_child_by_label("A")
+    c = t._root.get_child_by_label("C")
+    assert a.get_child_by_label("x") is c.get_child_by_label("x")
+    assert t.to_string() == expected
+    assert t.to_string(with_distances=False) == expected_nodist
+    assert t.to_string() == expected
+
+def test_compress_shared_subtrees_copy_on_insert():
+    t = _build_repeated_tree()
+    t.compress_shared_subtrees()
+    t.add_new_node(Path("R", [("B", 1.0), ("x", 2.0), ("y", 1.0)]))
+    t.add_new_node(Path("R", [("B", 1.0), ("x", 2.0), ("w", 1.0)]))
+    assert t.to_string() == \
+        "(((y:1,z:1.5)x:2)A:1,((y:1,z:1.5,w:1)x:2)B:1,((y:1,z:1.5)x:2)C:1)R;"
+    b_x = t._root.get_child_by_label("B").get_child_by_label("x")
+    a_x = t._root.get_child_by_label("A").get_child_by_label("x")
+    assert b_x.get_child_by_label("y").get_duplication_count() == 1
+    assert a_x.get_child_by_label("y").get_duplication_count() == 0
+    assert t.compress_shared_subtrees() == 0
+
+def test_compress_shared_subtrees_distinct_children():
+    t = Tree(Tree.RootNode("R"))
+    t.add_new_node(Path("R", [("A", 1.0), ("x", 1.0), ("y", 1.0)]))
+    t.add_new_node(Path("R", [("B", 1.0), ("x", 1.0), ("y", 2.0)]))
+    assert t.compress_shared_subtrees() == 0
+    assert t.to_string() == "(((y:1)x:1)A:1,((y:2)x:1)B:1)R;"
+
+def test_compress_shared_subtrees_nhx_key_filter():
+    t = _build_repeated_tree()
+    t.compress_shared_subtrees()
+    expected = t.to_string(with_additional_info_nhx=True, nhx_key_filter=["k"])
+    x = t._root.get_child_by_label("A").get_child_by_label("x")
+    # an equal collection of keys reuses the memoized string
+    x._str_cache = (x._str_cache[0], "cached")
+    assert "cached" in t.to_string(with_additional_info_nhx=True, 
+                                   nhx_key_filter=("k",))
+    assert t.to_string(with_additional_info_nhx=True, 
+                       nhx_key_filter=["k", "j"]) == expected
+
+def test_diff():
+    def build():
+        t = Tree(Tree.RootNode("R"))
+        t.add_new_node(Path("R", [("A", 1.0), ("B", 2.0)]))
+        t.add_new_node(Path("R", [("C", 1.0)]))
+        return t
+    a = build()
+    b = build()
+    assert a.get_structural_hash() == b.get_structural_hash()
+    assert a.diff(b) == ([], [], [])
+    b.add_new_node(Path("R", [("A", 1.0), ("X", 1.0), ("Y", 1.0)]))
+    b.add_new_node(Path("R", [("C", 3.0)]))
+    added, removed, changed = a.diff(b)
+    assert [str(p) for p in added] == ["Path(R:0 -> A:1 -> X:1)"]
+    assert removed == []
+    assert [str(p) for p in changed] == ["Path(R:0 -> C:2)"]
+    added, removed, changed = b.diff(a)
+    assert added == []
+    assert [str(p) for p in removed] == ["Path(R:0 -> A:1 -> X:1)"]
+
+@pytest.mark.parametrize("copy_on_write", [True, False])
+def test_clone(copy_on_write):
+    base = _build_repeated_tree()
+    expected = base.to_string()
+    fork = base.clone(copy_on_write=copy_on_write)
+    assert fork.to_string() == expected
+    fork.add_new_node(Path("R", [("A", 1.0), ("x", 2.0), ("w", 1.0)]))
+    fork.add_new_node(Path("R", [("B", 3.0)]))
+    assert base.to_string() == expected
+    assert fork.to_string() == \
+        "(((y:1,z:1.5,w:1)x:2)A:1,((y:1,z:1.5)x:2)B:2,((y:1,z:1.5)x:2)C:1)R;"
+    base.add_new_node(Path("R", [("C", 1.0), ("v", 1.0)]))
+    assert "v:1" not in fork.to_string()
+    assert fork._root.get_child_by_label("C").get_child_by_label("x") \
+        .get_child_by_label("y").get_duplication_count() == 0
+
+def test_clone_direct_modification():
+    t = Tree(Tree.RootNode("r"))
+    for label in ("b", "c"):
+        t.add_new_node(Path("r", [("a", 1.0), (label, 1.0)]))
+    c = t.clone()
+    # get_node() copies the shared path, so the node belongs to one tree
+    c.get_node(Path("r", [("a", 1.0)])).add_child(Node("z"))
+    c.get_node(Path("r", [("a", 1.0), ("b", 1.0)])).set_distance(2.0)
+    t.get_node(Path("r", [("a", 1.0), ("c", 1.0)])).set_distance(3.0)
+    assert t.to_string() == "((b:1,c:3)a:1)r;"
+    assert c.to_string() == "((b:2,c:1,z:1)a:1)r;"
+    assert t.clone(copy_on_write=False).get_node(Path("r", [("a", 1.0)])) \
+        .add_child(Node("y"))[0]
+
+def test_shared_subtree_nodes_are_frozen():
+    t = _build_repeated_tree()
+    t.compress_shared_subtrees()
+    x = t._root.get_child_by_label("A").get_child_by_label("x")
+    # shared by A, B and C: only modifiable through the tree
+    for modify in (lambda: x.add_child(Node("w")), 
+                   lambda: x.remove_child("y"),
+                   lambda: x.set_distance(3.0),
+                   lambda: x.handle_duplicate(Node("x")),
+                   lambda: x.get_child_by_label("y").set_distance(3.0)):
+        with pytest.raises(ValueError):
+            modify()
+    t.get_node(Path("R", [("A", 1.0), ("x", 2.0)])).set_distance(3.0)
+    assert t.to_string() == \
+        "(((y:1,z:1.5)x:3)A:1,((y:1,z:1.5)x:2)B:1,((y:1,z:1.5)x:2)C:1)R;"
+
+def test_clone_hybrid():
+    t = Tree(Tree.RootNode("R"))
+    t.add_new_hybrid_node([Path("R", [("A", 1.0), ("H", 2.0)]),
+                           Path("R", [("B", 1.0), ("H", 2.0)])])
+    c = t.clone()
+    assert c.to_string() == t.to_string()
+    assert c.get_hybrid("H", 1) is not t.get_hybrid("H", 1)
+    assert c._root.get_child_by_label("A").get_child_by_label("H") \
+        is c._root.get_child_by_label("B").get_child_by_label("H")
+
+def test_tree_from_node_does_not_modify_node():
+    n = Node("R", distance=0)
+    n.add_child(Node("A"))
+    t = Tree(n)
+    t.add_new_node(Path("R", [("A", 1.0), ("B", 1.0)]))
+    assert t.to_string() == "((B:1)A:1)R;"
+    assert n.to_string() == "(A:1)R:0"
+    # the nodes of `n` stay modifiable
+    n.get_child_by_label("A").add_child(Node("C"))
+    t.add_new_node(Path("R", [("A", 1.0), ("D", 1.0)]))
+    assert n.to_string() == "((C:1)A:1)R:0"
+    assert t.to_string() == "((B:1,D:1)A:1)R;"
+
+def test_child_order():
+    paths = [Path("R", [("B", 1.0), ("x", 1.0)]),
+             Path("R", [("A", 1.0)]),
+             Path("R", [("B", 1.0), ("a", 1.0), ("b", 1.0)]),
+             Path("R", [("C", 1.0)])]
+    t0 = Tree(Tree.RootNode("R"))
+    t1 = Tree(Tree.RootNode("R"))
+    for p in paths:
+        t0.add_new_node(p)
+    for p in reversed(paths):
+        t1.add_new_node(p)
+    assert t0.to_string() != t1.to_string()
+    assert t0.to_string(child_order="label") == t1.to_string(child_order="label")
+    assert t0.to_string(child_order="label") == "(A:1,((b:1)a:1,x:1)B:1,C:1)R;"
+    assert t0.to_string(child_order="size") == "(A:1,C:1,(x:1,(b:1)a:1)B:1)R;"
+    by_label_desc = lambda n: [-ord(c) for c in n.get_label()]
+    assert t0.to_string(child_order=by_label_desc, with_distances=False) == "(C,(x,(b)a)B,A)R;"
+    # cached orders are invalidated on insertion
+    t0.add_new_node(Path("R", [("0", 1.0)]))
+    assert t0.to_string(child_order="label") == "(0:1,A:1,((b:1)a:1,x:1)B:1,C:1)R;"
+    with pytest.raises(ValueError):
+        t0.to_string(child_order="random")
+
+def _build_prune_tree():
+    t = Tree(Tree.RootNode("R"))
+    t.add_new_node(Path("R", [("A", 1.0), ("a1", 1.0)]))
+    t.add_new_node(Path("R", [("A", 1.0), ("a2", 1.0)]))
+    t.add_new_node(Path("R", [("A", 1.0), ("a2", 1.0)]))
+    t.add_new_node(Path("R", [("B", 1.0), ("b1", 1.0), ("c", 1.0)]))
+    return t
+
+def test_remove_node():
+    t = _build_prune_tree()
+    assert t.remove_node(Path("R", [("A", 1.0), ("a1", 1.0)])).get_label() == "a1"
+    assert t.remove_node(Path("R", [("A", 1.0), ("zz", 1.0)])) is None
+    assert t.to_string() == "((a2:1)A:1,((c:1)b1:1)B:1)R;"
+
+def test_prune():
+    t = _build_prune_tree()
+    fork = t.clone()
+    low_count_leaf = lambda n: n.is_leaf() and n.get_duplication_count() == 0
+    assert fork.prune(low_count_leaf) == 2
+    assert fork.to_string() == "((a2:1)A:1,(b1:1)B:1)R;"
+    assert t.to_string() == "((a1:1,a2:1)A:1,((c:1)b1:1)B:1)R;"
+    assert t.prune(lambda n: n.get_label() == "B") == 1
+    assert t.to_string() == "((a1:1,a2:1)A:1)R;"
+
+def test_subtree():
+    t = _build_prune_tree()
+    sub = t.subtree(Path("R", [("B", 1.0)]))
+    assert sub.to_string() == "((c:1)b1:1)B;"
+    sub.add_new_node(Path("B", [("b1", 1.0), ("d", 1.0)]))
+    assert sub.to_string() == "((c:1,d:1)b1:1)B;"
+    assert t.to_string() == "((a1:1,a2:1)A:1,((c:1)b1:1)B:1)R;"
+    with pytest.raises(ValueError):
+        t.subtree(Path("R", [("X", 1.0)]))
+
+def test_additional_info_not_shared():
+    t = Tree(Tree.RootNode("R"))
+    t.add_new_node(Path("R", [("A", 1.0)]))
+    t.add_new_node(Path("R", [("B", 1.0)]))
+    t.add_new_node(Path("R", [("A", 1.0)]), additional_info={"k": 1})
+    assert t.to_string(with_additional_info_nhx=True) == "(A[&&NHX:k=1]:1,B:1)R;"
+
+def _build_chain_tree():
+    t = Tree(Tree.RootNode("R"))
+    t.add_new_node(Path("R", [("A", 1.0), ("B", 2.0), ("C", 3.0)]), additional_info={"i": [0]})
+    t.add_new_node(Path("R", [("A", 1.0), ("B", 2.0), ("D", 1.0), ("E", 1.0)]))
+    t.add_new_node(Path("R", [("X", 1.0), ("Y", 1.0)]), additional_info={"i": [1]})
+    t._root.get_child_by_label("X").get_additional_info()["x"] = True
+    return t
+
+def test_collapse_unary_chains():
+    t = _build_chain_tree()
+    assert t.collapse_unary_chains() == 3
+    assert t.to_string() == "((C:3,E:2)B:3,Y:2)R;"
+    y = t._root.get_child_by_label("Y")
+    assert y.get_additional_info() == {"i": [1], "x": True}
+    assert t.collapse_unary_chains() == 0
+
+def test_collapse_unary_chains_joined_cow():
+    t = _build_chain_tree()
+    expected = t.to_string()
+    c = t.clone()
+    assert c.collapse_unary_chains(label_joiner="/") == 3
+    assert c.to_string() == "((C:3,D/E:2)A/B:3,X/Y:2)R;"
+    assert t.to_string() == expected
+
+def test_collapse_unary_chains_label_clash():
+    t = Tree(Tree.RootNode("R"))
+    t.add_new_node(Path("R", [("A", 1.0), ("B", 1.0)]))
+    t.add_new_node(Path("R", [("B", 1.0), ("C", 1.0), ("D", 1.0)]))
+    assert t.collapse_unary_chains() == 2
+    assert t.to_string() == "((B:1)A:1,D:3)R;"
+
+def test_annotate():
+    t = _build_prune_tree()
+    t.annotate()
+    b = t._root.get_child_by_label("B")
+    assert t.get_depth(t._root) == 0
+    assert t.get_depth(b) == 1
+    assert t._root.get_subtree_stats() == (7, 3, 3, 6.0)
+    t.add_new_node(Path("R", [("B", 1.0), ("b1", 1.0), ("c", 1.0), ("d", 2.0)]))
+    d = t.get_node(Path("R", [("B", 1.0), ("b1", 1.0), ("c", 1.0), ("d", 2.0)]))
+    assert t._depths[id(d)] == 4
+    assert t.get_depth(d) == 4
+    assert t._root.get_subtree_stats() == (8, 3, 4, 8.0)
+    assert t.get_depth(Tree.RootNode("X")) is None
+
+def test_get_depth_annotates_once_per_change():
+    t = _build_prune_tree()
+    annotations = []
+    annotate = t.annotate
+    t.annotate = lambda: annotations.append(1) or annotate()
+    for _ in range(3):
+        assert t.get_depth(Node("X")) is None
+    assert len(annotations) == 1
+    # insertions keep the depths up to date
+    t.add_new_node(Path("R", [("B", 1.0), ("x", 1.0)]))
+    assert t.get_depth(t._root.get_child_by_label("B").get_child_by_label("x")) == 2
+    assert len(annotations) == 1
+    t.remove_node(Path("R", [("B", 1.0), ("x", 1.0)]))
+    assert t.get_depth(Node("X")) is None and t.get_depth(Node("Y")) is None
+    assert len(annotations) == 2
+
+def test_outputlabel_table():
+    t = Tree(Tree.RootNode("R"))
+    t.add_new_node(Path("R", [("1", 1.0), ("2", 1.0)]))
+    t.add_new_node(Path("R", [("3", 1.0)]))
+    names = {"1": "Bacteria", "2": "Firmicutes"}
+    assert t.to_string(outputlabel_table=names) == "((Firmicutes:1)Bacteria:1,3:1)R;"
+    mapper = t.resolve_output_labels(names)
+    assert t.resolve_output_labels(names) is mapper
+    t.add_new_node(Path("R", [("1", 1.0), ("4", 1.0)]))
+    assert t.resolve_output_labels(names) is not mapper
+    assert t.to_string(outputlabel_table=names) == "((Firmicutes:1,4:1)Bacteria:1,3:1)R;"
+    with pytest.raises(ValueError):
+        t.to_string(outputlabel_table=names, outputlabel_mapper=lambda n: "")
+
+def test_outputlabel_batch_mapper():
+    t = Tree(Tree.RootNode("R"))
+    t.add_new_node(Path("R", [("A", 1.0), ("B", 1.0)]))
+    t.add_new_node(Path("R", [("C", 1.0)]))
+    calls = []
+    def leaves_only(nodes):
+        calls.append(len(nodes))
+        return [n.get_label() if n.is_leaf() else "" for n in nodes]
+    assert t.to_string(outputlabel_batch_mapper=leaves_only) == "((B:1):1,C:1);"
+    assert t.to_string(outputlabel_batch_mapper=leaves_only, 
+                       with_distances=False) == "((B),C);"
+    assert calls == [4]
+    with pytest.raises(ValueError):
+        t.to_string(outputlabel_batch_mapper=lambda nodes: [])
+
+def test_distance_formatter():
+    from newick.backend.util_funcs import make_float_formatter
+    t = Tree(Tree.RootNode("R"))
+    t.add_new_node(Path("R", [("A", 1e-8), ("B", 1/3)]))
+    assert t.to_string() == "((B:0.333333)A:0)R;"
+    exact = make_float_formatter("shortest")
+    assert t.to_string(distance_formatter=exact) == "((B:0.3333333333333333)A:1e-08)R;"
+
+def test_profiling():
+    t = Tree(Tree.RootNode("R"))
+    assert t.get_profile() is None
+    t.add_new_node(Path("R", [("A", 1.0)]))
+    prof = t.enable_profiling()
+    t.add_new_node(Path("R", [("A", 2.0), ("B", 1.0)]))
+    t.add_new_node(Path("R", [("A", float("-inf")), ("B", 3.0)]))
+    t.add_new_node(Path("R", [("C", 1.0), ("D", 1.0), ("E", 1.0)]), 
+                   additional_info={"k": "v"})
+    assert prof.paths_inserted == 3
+    assert prof.nodes_created == 4
+    assert prof.duplicates_merged == 1
+    assert prof.dist_adjustments == 2
+    assert prof.max_depth == 3
+    assert prof.timings == {}
+    t.to_string(with_additional_info_nhx=True)
+    assert prof.nhx_bytes == len("[&&NHX:k=v]")
+    t.to_string(with_additional_info_nhx=True, nhx_key_filter=["k"])
+    assert prof.nhx_bytes == len("[&&NHX:k=v]")
+    assert t.disable_profiling() is prof
+    t.add_new_node(Path("R", [("F", 1.0)]))
+    assert prof.nodes_created == 4
+
+def test_pickle_after_to_string():
+    import pickle
+    t = _build_repeated_tree()
+    t.compress_shared_subtrees()
+    expected = t.to_string()
+    t.to_string(child_order=lambda n: n.get_label(), 
+                outputlabel_mapper=lambda n: n.get_label().upper(),
+                distance_formatter=lambda d: str(d))
+    t2 = pickle.loads(pickle.dumps(t))
+    x = t2._root.get_child_by_label("A").get_child_by_label("x")
+    assert x._str_cache == (None, None) and x._order_cache is None
+    assert t2.to_string() == expected
+
+def test_profiling_compressed_nhx():
+    t = _build_repeated_tree()
+    for label in ("A", "B", "C"):
+        t.get_node(Path("R", [(label, 1.0), ("x", 2.0)])) \
+            ._additional_info["k"] = "v"
+    t.compress_shared_subtrees()
+    prof = t.enable_profiling()
+    out = t.to_string(with_additional_info_nhx=True)
+    per_call = out.count("[&&NHX:k=v]") * len("[&&NHX:k=v]")
+    assert per_call > 0 and prof.nhx_bytes == per_call
+    assert t.to_string(with_additional_info_nhx=True) == out
+    assert prof.nhx_bytes == 2 * per_call
+
+def test_to_string_progress_cancel():
+    from newick.backend.progress import CancelToken, Cancelled
+    t = Tree(Tree.RootNode("R"))
+    for i in range(20):
+        t.add_new_node(Path("R", [(str(i), 1.0), ("x", 1.0)]))
+    reports = []
+    out = t.to_string(progress=reports.append, progress_interval=5)
+    assert out == t.to_string()
+    assert [r["nodes"] for r in reports] == [5, 10, 15, 20, 25, 30, 35, 40]
+    assert reports[0]["total_nodes"] == 41
+    assert t.to_string(cancel_token=CancelToken()) == out
+    with pytest.raises(Cancelled):
+        t.to_string(cancel_token=CancelToken(timeout=0), progress_interval=1)
+
+def test_write():
+    import io
+    t = Tree(Tree.RootNode("R", additional_info={"k": 1}))
+    for i in range(5000):
+        t.add_new_node(Path("R", [(str(i % 100), 1.0), (str(i), 2.0)]))
+    stream = io.StringIO()
+    assert t.write(stream, with_additional_info_nhx=True, child_order="label") \
+        == len(stream.getvalue())
+    assert stream.getvalue() == t.to_string(with_additional_info_nhx=True, 
+                                            child_order="label", 
+                                            append_newline=True)
+    stream = io.StringIO()
+    Tree(Tree.RootNode("R")).write(stream, append_newline=False)
+    assert stream.getvalue() == "R;"
+
+def test_add_new_node_count():
+    paths = [Path("R", [("A", 1.0), ("B", 2.0)]), Path("R", [("A", 4.0)]),
+             Path("R", [("A", float("-inf")), ("C", float("-inf"))])]
+    for strat in (Tree._DIST_ADJUST_STRAT_AVERAGE, Tree._DIST_ADJUST_STRAT_ROLL2):
+        t1 = Tree(Tree.RootNode("R"), dist_adjust_strategy=strat)
+        t2 = Tree(Tree.RootNode("R"), dist_adjust_strategy=strat)
+        for path in paths:
+            for _ in range(3):
+                t1.add_new_node(path, additional_info={"k": {1}})
+            t2.add_new_node(path, additional_info={"k": {1}}, count=3)
+        assert t2.to_string(with_additional_info_nhx=True) \
+            == t1.to_string(with_additional_info_nhx=True)
+        assert t2.get_node(paths[1]).get_duplication_count() == 3
+    with pytest.raises(ValueError):
+        t2.add_new_node(paths[0], count=0)
+
+def test_compact_output():
+    from newick.frontend.forest import parse_newick
+    t = Tree(Tree.RootNode("R", additional_info={"_parse_index": 0, "k": 1}),
+             default_dist=1.0)
+    t.add_new_node(Path("R", [("A b", 1.0), ("c's", 2.0)]))
+    t.add_new_node(Path("R", [("D", 1.0)]))
+    assert t.to_string(omit_default_distances=True) == "((c's:2)A b,D)R;"
+    assert t.to_string(quote_labels=True) == "(('c''s':2)'A b':1,D:1)R;"
+    compact = t.to_string(omit_default_distances=True, quote_labels=True)
+    assert parse_newick(compact).to_string() == t.to_string()
+    # the keys to leave out, or a function selecting the keys to write
+    assert t.to_string(with_additional_info_nhx=True, 
+                       nhx_key_filter=["_parse_index"]) \
+        .endswith(")R[&&NHX:k=1];")
+    assert t.to_string(with_additional_info_nhx=True, 
+                       nhx_key_filter=lambda k: k == "x").endswith(")R;")
+    # custom labels are quoted as well, hybrid ids are not
+    assert t.to_string(outputlabel_mapper=lambda n: n.get_label() + ",", 
+                       quote_labels=True, with_distances=False) \
+        == "(('c''s,')'A b,','D,')'R,';"
+    t.add_new_hybrid_node([Path("R", [("D", 1.0), ("H x", 2.0)]),
+                           Path("R", [("A b", 1.0), ("H x", 2.0)])])
+    assert t.to_string(quote_labels=True, omit_default_distances=True) \
+        == "(('c''s':2,'H x'#1:2)'A b',('H x'#1)D)R;"
+
+
+def test_reroot():
+    from newick.frontend.forest import parse_newick
+    text = "((a:1,b:2)x:3,(c:1,d:1)y:4)r;"
+    t = parse_newick(text)
+    t.reroot(Path("r", [("x", 3.0)]))
+    assert t.to_string() == "(a:1,b:2,(c:1,d:1)y:7)x;"
+    assert t.get_structural_hash() == parse_newick(t.to_string()).get_structural_hash()
+    assert t._root.get_subtree_size() == 6
+    t = parse_newick(text)
+    t.reroot(Path("r", [("x", 3.0)]), keep_old_root=True)
+    assert t.to_string() == "(a:1,b:2,((c:1,d:1)y:4)r:3)x;"
+    assert type(t.get_node(Path("x", [("r", 3.0)]))) is Node
+    # on the edge above a leaf, copy-on-write
+    t = parse_newick(text)
+    t2 = t.clone()
+    t2.reroot(Path("r", [("x", 3.0), ("a", 1.0)]), distance=0.5, root_label="m")
+    assert t2.to_string() == "(a:0.5,(b:2,(c:1,d:1)y:7)x:0.5)m;"
+    assert t.to_string() == text[:-1] + ";"
+    with pytest.raises(ValueError):
+        t.reroot(Path("r", [("x", 3.0)]), distance=4.0)
+    with pytest.raises(ValueError):
+        t.reroot(Path("r", [("z", 3.0)]))
+
+def test_reroot_label_clash():
+    from newick.frontend.forest import parse_newick
+    t = parse_newick("((a,b)x,(x)y)r;")
+    before = t.to_string()
+    with pytest.raises(ValueError):
+        t.reroot(Path("r", [("y", 1.0)]))
+    assert t.to_string() == before
+
+def test_midpoint_root():
+    from newick.frontend.forest import parse_newick
+    t = parse_newick("((a:1,b:1)x:1,c:6)r;")
+    t.midpoint_root()
+    assert t.to_string() == "(c:4,(a:1,b:1)x:3)r;"
+    # already rooted at the midpoint
+    t = parse_newick("((a:1,b:2)x:3,(c:1,d:1)y:4)r;")
+    t.midpoint_root()
+    assert t.to_string() == "((a:1,b:2)x:3,(c:1,d:1)y:4)r;"
+    t = parse_newick("(a:1,(b:1,(c:1,d:5)z:1)y:1)r;")
+    t.midpoint_root()
+    assert t.to_string() == "(d:4,(c:1,(b:1,a:2)y:1)z:1)r;"
+
+
+def test_parent_index():
+    t = Tree(Tree.RootNode("R"))
+    t.add_new_node(Path("R", [("A", 1.0), ("B", 2.0)]))
+    t.add_new_node(Path("R", [("A", 1.0), ("C", 3.0)]))
+    a = t.get_node(Path("R", [("A", 1.0)]))
+    b = t.get_node(Path("R", [("A", 1.0), ("B", 2.0)]))
+    assert t.get_parent(t._root) is None
+    assert t.get_parent(b) is a
+    assert t.ancestors(b) == [a, t._root]
+    assert [n.get_label() for n in t.siblings(b)] == ["C"]
+    assert t.siblings(t._root) == []
+    assert t.path_from_root(b).to_string() == "Path(R:0 -> A:1 -> B:2)"
+    # maintained while the tree grows
+    t.add_new_node(Path("R", [("A", 1.0), ("B", 2.0), ("D", 1.0)]))
+    d = t.get_node(Path("R", [("A", 1.0), ("B", 2.0), ("D", 1.0)]))
+    assert t._parents is not None and t.get_parent(d) is b
+    assert t.get_node(t.path_from_root(d)) is d
+    # dropped by other modifications and on copy-on-write
+    t.remove_node(Path("R", [("A", 1.0), ("C", 3.0)]))
+    assert t._parents is None
+    assert t.siblings(b) == []
+    t2 = t.clone()
+    t2.add_new_node(Path("R", [("A", 1.0), ("E", 1.0)]))
+    b2 = t2.get_node(Path("R", [("A", 1.0), ("B", 2.0)]))
+    assert t2.get_parent(b2) is t2.get_node(Path("R", [("A", 1.0)]))
+    with pytest.raises(ValueError):
+        t.get_parent(Node("X"))
+    # nodes that are not in the tree do not rebuild the index again
+    index = t._parents
+    with pytest.raises(ValueError):
+        t.get_parent(Node("Y"))
+    assert t._parents is index
@@ -0,0 +1,69 @@
+from newick.backend.util_funcs import format_float, make_float_formatter, \
+    quote_label
+import random
+import pytest
+
+
+def test_format_float_default():
+    assert format_float(1.0) == "1"
+    assert format_float(4.2) == "4.2"
+    assert format_float(0.0) == "0"
+    assert format_float(10.0) == "10"
+    assert format_float(1/3) == "0.333333"
+    assert format_float(1e-8) == "0"
+
+def test_fixed_precision():
+    f = make_float_formatter("fixed", 2)
+    assert f(1/3) == "0.33"
+    assert f(10.0) == "10"
+    assert f(2.005) == "2"
+    f0 = make_float_formatter("fixed", 0)
+    assert f0(10.0) == "10"
+    assert f0(100.4) == "100"
+
+def test_significant():
+    f = make_float_formatter("significant", 3)
+    assert f(1.0) == "1"
+    assert f(1/3) == "0.333"
+    assert f(1e-8) == "1e-08"
+    assert f(123456.0) == "1.23e+05"
+
+def test_shortest_round_trip():
+    f = make_float_formatter("shortest")
+    assert f(1.0) == "1"
+    assert f(1e-8) == "1e-08"
+    assert f(2.5e-300) == "2.5e-300"
+    assert f(1e22) == "1e+22"
+    assert f(float("inf")) == "inf"
+    rnd = random.Random(0)
+    for _ in range(1000):
+        x = rnd.random() * 10 ** rnd.randint(-20, 20)
+        assert float(f(x)) == x
+
+def test_cache_is_bounded():
+    f = make_float_formatter("shortest", cache_size=2)
+    assert [f(x) for x in (1.0, 2.0, 3.0, 1.0, 3.0)] == ["1", "2", "3", "1", "3"]
+    # least recently used values are evicted, later hot values get in
+    for x in range(100):
+        f(x + 0.5)
+    assert [f(2.5) for _ in range(3)] == ["2.5"] * 3
+    assert f.cache_info().hits >= 2 and f.cache_info().currsize == 2
+
+def test_cache_keeps_sign_of_zero():
+    f = make_float_formatter("shortest")
+    assert [f(0.0), f(-0.0), f(0.0)] == ["0", "-0", "0"]
+    assert f(float("nan")) == "nan"
+    assert float(f(-0.0)) == 0.0 and f(-0.0).startswith("-")
+    assert f.cache_info().currsize == 0
+
+def test_invalid_mode():
+    with pytest.raises(ValueError):
+        make_float_formatter("exact")
+
+def test_quote_label():
+    assert quote_label("abc-1.x") == "abc-1.x"
+    assert quote_label("") == ""
+    assert quote_label("a b") == "'a b'"
+    assert quote_label("a\u2003b") == "'a\u2003b'"
+    assert quote_label("a(1)") == "'a(1)'"
+    assert quote_label("it's") == "'it''s'"
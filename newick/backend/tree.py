@@ -1,8 +1,11 @@
-from collections.abc import Mapping
-from typing import Callable, Iterable
+from collections.abc import Callable, Iterable, Mapping
 from os import linesep
+from time import perf_counter
 from .node import Node, HybridNode, RootNode
 from .path import Path
+from .util_funcs import quote_label
+from .profiling import BuildProfile
+from .progress import CancelToken
 
 class Tree:
     """
@@ -14,8 +17,15 @@ class Tree:
     
     # class fields
     #_root
-    #_hybrids  # dict[(str, int), HybridNode] # TODO:
-    #_hybrid_ignore_set
+    #_hybrids  # dict[(str, int), HybridNode]
+    #_next_hybrid_id
+    #_depths  # dict[int, int] (id of node -> depth), or None if outdated
+    #_depths_version  # the `_version` the depths are valid for
+    #_parents  # dict[int, Node] (id of node -> parent), or None if outdated
+    #_parents_version  # the `_version` the parent index is valid for
+    #_version  # counts modifications, to validate cached results
+    #_label_cache  # (version, label source, resolved outputlabel mapper)
+    #_profile  # BuildProfile, or None if profiling is disabled
     #_default_dist
     #_dist_adjust_strat
   
@@ -65,9 +75,11 @@ class Tree:
         """
         
         # validation
+        shares_nodes = False
         if not isinstance(root_node, RootNode):
             if isinstance(root_node, Node):
                 root_node = RootNode.from_node(root_node)
+                shares_nodes = True
             else:
                 msg = \
                 """
@@ -81,7 +93,22 @@ class Tree:
         self._root = root_node
         self._default_dist = default_dist
         self._hybrids = dict()
-        self._hybrid_ignore_set = set()
+        self._next_hybrid_id = 1
+        self._depths = None
+        self._depths_version = None
+        self._parents = None
+        self._parents_version = None
+        self._version = 0
+        self._label_cache = None
+        self._profile = None
+        # Copy-on-write (see `clone()`): the nodes whose `_owner` is not
+        # this token may be shared with other trees, so they are copied
+        # before they are modified. 
+        self._owner_token = None
+        if shares_nodes:
+            # the children are shared with the original node
+            self._owner_token = object()
+            root_node._owner = self._owner_token
         self.set_dist_adjust_strat(dist_adjust_strategy)
 
     
@@ -125,18 +152,39 @@ class Tree:
                 that is already present in the tree, or a newly created
                 one if it is not registered yet.
         """
-        if (label, hybrid_id) in self._hybrids.keys:
-            return self._hybrids[(label, hybrid_id)]
-        else:
+        key = (label, hybrid_id)
+        wchild = self._hybrids.get(key)
+        if wchild is None:
             wchild = HybridNode(label,
                                 hybrid_id,
-                                distance, 
-                                additional_info)
-            self._hybrids[(label, hybrid_id)] = wchild
-            return wchild
+                                distance=distance, 
+                                additional_info=additional_info)
+            wchild._owner = self._owner_token
+            self._hybrids[key] = wchild
+            if hybrid_id >= self._next_hybrid_id:
+                self._next_hybrid_id = hybrid_id + 1
+        return wchild
+    
+    def get_hybrid(self, label:str, hybrid_id:int) -> HybridNode:
+        """
+        Looks up a registered hybrid node by its label and id.
+
+        Returns:
+            HybridNode: the registered hybrid, or `None` if there is 
+            no such hybrid in this tree.
+        """
+        return self._hybrids.get((label, hybrid_id))
+    
+    def count_hybrids(self) -> int:
+        """Counts the hybrid nodes registered in this tree.
+
+        Returns:
+            int: the number of registered hybrid nodes.
+        """
+        return len(self._hybrids)
      
     
-    def add_new_node(self, path:Path, additional_info:dict=dict()) -> bool:
+    def add_new_node(self, path:Path, additional_info:dict=None, count:int=1) -> bool:
         """
         Adds a new node to the tree if it does not exist yet in the 
         location determined by the `path`.
@@ -152,17 +200,31 @@ class Tree:
                 Path where to place the node.
             additional_info (dict, optional): 
                 Additional info dict to attach
+            count (int, optional):
+                Number of identical insertions this call stands for, 
+                e.g. for repeated input lines that have been aggregated.
+                The result is the same as of `count` calls in a row, 
+                except that the `additional_info` is merged only once 
+                (which makes no difference unless it contains lists).
+                The distance adjustment strategy is still applied 
+                `count` times, but without creating nodes or looking 
+                up the path again. Defaults to 1.
 
         Raises:
-            ValueError: When the given path is too short or the root does 
-            not match.
+            ValueError: When the given path is too short, the root does 
+            not match or the `count` is less than 1.
 
         Returns:
             bool: 
                 True iff the node has been created, False if it had to be 
                 merged.
         """
-        cparent = self._root
+        if count < 1:
+            msg = \
+                "The count of insertions has to be at least 1."
+            raise ValueError(count, msg)
+        self._version += 1
+        cparent = self._thaw_root()
         cret = False
         # check root
         if (len(path) <= 1):
@@ -175,54 +237,92 @@ class Tree:
             raise ValueError(path, msg)
         # insert rest
         cpath = path[1:]
-        while len(cpath) > 0:
-            is_end_of_path = (len(cpath) == 1)
-            wlabel, wdist = cpath[0]
+        depths = self._depths
+        if depths is not None:
+            # kept up to date below
+            self._depths_version = self._version
+        parents = self._parents
+        if parents is not None:
+            self._parents_version = self._version
+        prof = self._profile
+        if prof is not None:
+            prof.paths_inserted += count
+            if len(cpath) > prof.max_depth:
+                prof.max_depth = len(cpath)
+        for level in range(1, len(path)):
+            is_end_of_path = (level == len(cpath))
+            wlabel, wdist = cpath[level - 1]
             w_dist_adjust_strat = self.dist_adjust_strat_or_def(wdist)
             wdist = self.node_dist_or_def(wdist)    
-            waddinfo = additional_info if is_end_of_path else dict()
+            waddinfo = additional_info if is_end_of_path else None
             wchild = Node(wlabel, 
                           distance=wdist, 
                           additional_info=waddinfo)
+            wchild._owner = self._owner_token
+            self._thaw_child(cparent, wlabel)
             cret, achild = cparent.add_child(wchild, 
                                      w_dist_adjust_strat,
                                      count_duplicate=is_end_of_path)
-            cpath = cpath[1:]
+            if depths is not None:
+                depths[id(achild)] = level
+            if parents is not None:
+                parents[id(achild)] = cparent
+            repeats = count - 1
+            if repeats > 0:
+                # the further insertions only find the node again
+                if w_dist_adjust_strat:
+                    for _ in range(repeats):
+                        achild.set_distance(w_dist_adjust_strat(achild, wdist))
+                        achild.handle_duplicate(wchild, count=is_end_of_path)
+                elif is_end_of_path:
+                    achild.handle_duplicate(wchild, count=repeats)
+            if prof is not None:
+                if cret:
+                    prof.nodes_created += 1
+                merged = repeats if cret else count
+                if w_dist_adjust_strat:
+                    prof.dist_adjustments += merged
+                if is_end_of_path:
+                    prof.duplicates_merged += merged
             cparent = achild
         return cret
     
-    def add_new_hybrid_node(self, paths:Iterable[str], hybrid_id=-1, additional_info:dict=dict()) -> bool:
+    def add_new_hybrid_node(self, paths:Iterable[Path], hybrid_id:int=-1, additional_info:dict=None) -> bool:
         """
         Adds a new hybrid node to the tree if it does not exist yet in the 
-        locations determined by the `path`.
+        locations determined by the `paths`.
+        All paths have to end with the same label, which is the label 
+        of the hybrid. All other waypoints are regular nodes.
         Also attaches the given additional info.
-        If the node is already present, by default
-         * duplication is counted
+        If the node is already present in a location, by default
+         * duplication is counted (once per call)
          * distance is adjusted by the tree's strategy, if a distance
            is given
          * additional info is being copied over (lists and sets are merged)
 
         Args:
-            path (Iterable[Path]): 
+            paths (Iterable[Path]): 
                 Collection of paths where to place the node.
+            hybrid_id (int, optional):
+                Identifier number of the hybrid. Pass a negative number
+                to have the tree assign the next free one.
+                Defaults to -1.
             additional_info (dict, optional): 
                 Additional info dict to attach
 
         Raises:
-            ValueError: When the given path is too short or the root does 
-            not match.
+            ValueError: When a given path is too short, the root does 
+            not match or the paths end in different labels.
 
         Returns:
             bool: 
                 True iff the node was inserted in at least one location, 
                 otherwise False.
         """
-        ret = False
-        is_first_path = True
+        self._version += 1
+        paths = list(paths)
         for path in paths:
-            cparent = self._root
-            cret = False
-            # check root
+            # check roots
             if (len(path) <= 1):
                 msg = \
                     "Cannot insert a node with a path shorter than 2 waypoints."
@@ -231,30 +331,1049 @@ class Tree:
                 msg = \
                     "The start waypoint of the path differs from the tree's root."
                 raise ValueError(path, msg)
-            # insert rest
-            cpath = path[1:]
-            while len(cpath) > 0:
-                is_end_of_path = (len(cpath) == 1)
-                wlabel, wdist = cpath[0]
+        if len(paths) == 0:
+            return False
+        hlabel = paths[0][-1][0]
+        if any(path[-1][0] != hlabel for path in paths):
+            msg = \
+                "All paths of a hybrid have to end with the same label."
+            raise ValueError(paths, msg)
+        if hybrid_id < 0:
+            hybrid_id = self._next_hybrid_id
+        ret = False
+        is_first_path = True
+        prof = self._profile
+        for path in paths:
+            cparent = self._thaw_root()
+            if prof is not None:
+                prof.paths_inserted += 1
+                if len(path) - 1 > prof.max_depth:
+                    prof.max_depth = len(path) - 1
+            # insert the regular waypoints
+            for wlabel, wdist in path[1:-1]:
                 w_dist_adjust_strat = self.dist_adjust_strat_or_def(wdist)
-                wdist = self.node_dist_or_def(wdist)    
-                if is_end_of_path and is_first_path:
-                    waddinfo = additional_info
-                else:
-                    waddinfo = dict()
-                wchild = self.reg_hybrid_id(wlabel, 
-                                            hybrid_id,
-                                            distance=wdist, 
-                                            additional_info=waddinfo)
-                cret, achild = cparent.add_child(wchild, 
-                                         w_dist_adjust_strat,
-                                         count_duplicate=is_end_of_path)
-                cpath = cpath[1:]
-                cparent = achild
-            ret |= cret
+                wchild = Node(wlabel, 
+                              distance=self.node_dist_or_def(wdist), 
+                              additional_info=dict())
+                wchild._owner = self._owner_token
+                self._thaw_child(cparent, wlabel)
+                created, cparent = cparent.add_child(wchild, 
+                                                     w_dist_adjust_strat,
+                                                     count_duplicate=False)
+                if prof is not None:
+                    if created:
+                        prof.nodes_created += 1
+                    elif w_dist_adjust_strat:
+                        prof.dist_adjustments += 1
+            # attach the hybrid itself
+            _, wdist = path[-1]
+            w_dist_adjust_strat = self.dist_adjust_strat_or_def(wdist)
+            wdist = self.node_dist_or_def(wdist)
+            waddinfo = additional_info if is_first_path else None
+            if cparent.contains_child_with_label(hlabel):
+                # merge into the present node like any other duplicate
+                self._thaw_child(cparent, hlabel)
+                wchild = Node(hlabel, 
+                              distance=wdist, 
+                              additional_info=waddinfo)
+                cparent.add_child(wchild, 
+                                  w_dist_adjust_strat,
+                                  count_duplicate=is_first_path)
+                if prof is not None:
+                    prof.duplicates_merged += 1
+                    if w_dist_adjust_strat:
+                        prof.dist_adjustments += 1
+            else:
+                hnode = self.reg_hybrid_id(hlabel,
+                                           hybrid_id,
+                                           distance=wdist, 
+                                           additional_info=waddinfo)
+                cparent.add_child(hnode)
+                ret = True
+                if prof is not None:
+                    prof.nodes_created += 1
             is_first_path = False
+        self._depths = None
+        self._parents = None
+        return ret
+    
+    
+    def get_node(self, path:Path) -> Node:
+        """
+        Looks up the node at the location determined by the `path`.
+        Only the labels of the waypoints are considered.
+        If the node is shared with a clone or another subtree (see 
+        `clone()` and `compress_shared_subtrees()`), it is copied along
+        its path first (O(depth)), so that the returned node can be 
+        modified directly without affecting the other places. 
+
+        Args:
+            path (Path): path to the node, starting at the root.
+
+        Returns:
+            Node: the node, or `None` if there is no such node.
+        """
+        if self._find_node(path) is None:
+            return None
+        node = self._thaw_root()
+        for wlabel, _ in path[1:]:
+            self._thaw_child(node, wlabel)
+            node = node.get_child_by_label(wlabel)
+        return node
+    
+    def _find_node(self, path:Path) -> Node:
+        """
+        For internal use only.
+        `get_node()` without copying shared nodes, for read access.
+        """
+        if len(path) < 1 or path[0][0] != self._root.get_label():
+            return None
+        node = self._root
+        for wlabel, _ in path[1:]:
+            node = node.get_child_by_label(wlabel)
+            if node is None:
+                return None
+        return node
+    
+    def remove_node(self, path:Path) -> Node:
+        """
+        Removes the node at the location determined by the `path`, 
+        together with its subtree. 
+        Only the labels of the waypoints are considered.
+
+        Args:
+            path (Path): path to the node, starting at the root.
+
+        Raises:
+            ValueError: When the path is too short or the root does 
+            not match.
+
+        Returns:
+            Node: the removed node, or `None` if there is no such node.
+        """
+        if (len(path) <= 1):
+            msg = \
+                "Cannot remove a node with a path shorter than 2 waypoints."
+            raise ValueError(path, msg)
+        if path[0][0] != self._root.get_label():
+            msg = \
+                "The start waypoint of the path differs from the tree's root."
+            raise ValueError(path, msg)
+        if self._find_node(path) is None:
+            return None
+        self._version += 1
+        cparent = self._thaw_root()
+        for wlabel, _ in path[1:-1]:
+            self._thaw_child(cparent, wlabel)
+            cparent = cparent.get_child_by_label(wlabel)
+        ret = cparent.remove_child(path[-1][0])
+        self._depths = None
+        self._parents = None
+        if len(self._hybrids) > 0:
+            self._rebuild_hybrid_registry()
+        return ret
+    
+    def prune(self, predicate:Callable[[Node],bool]) -> int:
+        """
+        Removes every node for which the `predicate` holds, together 
+        with its subtree, in a single iterative pass over the tree.
+        Nodes are tested top-down, so descendants of a removed node 
+        are not tested anymore. The root is never removed.
+
+        Args:
+            predicate (Callable[[Node],bool]): 
+                function that returns True for nodes to be removed.
+
+        Returns:
+            int: the number of removed subtrees.
+        """
+        self._version += 1
+        removed = 0
+        # current path of [node, labels of children still to visit, 
+        # whether node is frozen or below a frozen node]
+        root = self._thaw_root()
+        path = [[root, list(root._children_by_label), False]]
+        while len(path) > 0:
+            node, pending, frozen = path[-1]
+            if len(pending) == 0:
+                path.pop()
+                continue
+            label = pending.pop()
+            child = node.get_child_by_label(label)
+            if predicate(child):
+                if frozen:
+                    # copy the shared part of the current path first
+                    for i in range(1, len(path)):
+                        if path[i][2]:
+                            path[i][0] = self._thaw(path[i][0])
+                            path[i][2] = False
+                            path[i - 1][0].replace_child(path[i][0])
+                    node = path[-1][0]
+                node.remove_child(label)
+                removed += 1
+            else:
+                path.append([child, 
+                             list(child._children_by_label), 
+                             frozen or self._is_shared(child)])
+        if removed > 0:
+            self._depths = None
+            self._parents = None
+            if len(self._hybrids) > 0:
+                self._rebuild_hybrid_registry()
+        return removed
+    
+    def collapse_unary_chains(self, label_joiner:str=None) -> int:
+        """
+        Merges each chain of nodes with exactly one child each into a 
+        single node, in place and in one iterative pass. 
+        The merged node is the lowest node of the chain. It gets the sum
+        of the distances of the chain, and the additional info of the 
+        upper nodes is merged into it like on duplication (see 
+        `Node.handle_duplicate()`), without counting duplicates.
+        The root and hybrid nodes are never merged. A chain is left 
+        as it is if its new label would clash with a sibling.
+
+        Args:
+            label_joiner (str, optional): 
+                If given, the merged node is labelled with the labels of
+                the whole chain (top-down), joined by this string. 
+                Defaults to None, which keeps the lowest label.
+
+        Returns:
+            int: the number of nodes that were merged away.
+        """
+        self._version += 1
+        removed = 0
+        root = self._thaw_root()
+        # current path of [node, children still to visit, whether node 
+        # is frozen or below a frozen node, whether its subtree changed]
+        path = [[root, None, False, False]]
+        while len(path) > 0:
+            entry = path[-1]
+            node, pending, frozen, changed = entry
+            if pending is None:
+                # collapse the chains starting at the children of node
+                new_children = dict()
+                for label, child in node._children_by_label.items():
+                    chain = [child]
+                    while not isinstance(chain[-1], HybridNode) \
+                            and chain[-1].count_children() == 1:
+                        chain.append(next(iter(chain[-1]._children)))
+                    if isinstance(chain[-1], HybridNode):
+                        chain.pop()
+                    if len(chain) < 2 or isinstance(child, HybridNode):
+                        new_children[label] = child
+                        continue
+                    if label_joiner is not None:
+                        nlabel = label_joiner.join(n.get_label() for n in chain)
+                    else:
+                        nlabel = chain[-1].get_label()
+                    if nlabel != label \
+                            and (nlabel in node._children_by_label \
+                                 or nlabel in new_children):
+                        new_children[label] = child
+                        continue
+                    merged = chain[-1]
+                    if frozen or any(self._is_shared(n) for n in chain):
+                        merged = self._thaw(merged)
+                    merged._label = nlabel
+                    merged._distance = sum(n._distance for n in chain)
+                    for upper in reversed(chain[:-1]):
+                        merged.handle_duplicate(upper, count=False)
+                    merged._drop_caches()
+                    new_children[nlabel] = merged
+                    removed += len(chain) - 1
+                    changed = True
+                if changed:
+                    if frozen:
+                        # copy the shared part of the current path first
+                        for i in range(1, len(path)):
+                            if path[i][2]:
+                                path[i][0] = self._thaw(path[i][0])
+                                path[i][2] = False
+                                path[i - 1][0].replace_child(path[i][0])
+                        node = entry[0]
+                        frozen = False
+                    node._children_by_label = new_children
+                    entry[2] = False
+                    entry[3] = True
+                entry[1] = pending = list(node._children)
+            if len(pending) == 0:
+                path.pop()
+                if entry[3]:
+                    entry[0]._drop_caches()
+                    if len(path) > 0:
+                        path[-1][3] = True
+                continue
+            child = pending.pop()
+            path.append([child, None, frozen or self._is_shared(child), False])
+        if removed > 0:
+            self._depths = None
+            self._parents = None
+        return removed
+    
+    def subtree(self, path:Path) -> 'Tree':
+        """
+        Extracts the subtree below the node at the location determined
+        by the `path` as a new `Tree` with the same settings, rooted at
+        (a copy of) that node. 
+        The nodes are shared copy-on-write, so that this takes O(depth)
+        and neither tree is affected by later changes of the other.
+
+        Args:
+            path (Path): path to the new root, starting at the root.
+
+        Raises:
+            ValueError: When there is no node at the `path`.
+
+        Returns:
+            Tree: the subtree.
+        """
+        node = self._find_node(path)
+        if node is None:
+            msg = \
+                "There is no node at the given path."
+            raise ValueError(path, msg)
+        ret = Tree(RootNode.from_node(node),
+                   default_dist=self._default_dist,
+                   dist_adjust_strategy=self._dist_adjust_strat)
+        if len(self._hybrids) > 0:
+            # hybrids cannot be shared copy-on-write
+            ret = ret.clone(copy_on_write=False)
+            ret._rebuild_hybrid_registry()
+        else:
+            # the nodes below are shared with `ret` now
+            self._owner_token = object()
+            ret._owner_token = object()
+            ret._root._owner = ret._owner_token
+        return ret
+    
+    def reroot(self, 
+               path:Path, 
+               distance:float=None,
+               root_label:str=None,
+               keep_old_root:bool=False):
+        """
+        Reroots the tree in place at the node at the location 
+        determined by the `path`, or on the edge above it. 
+        Only the nodes on the path are modified: the edges between 
+        them are flipped (each one keeping its length), so that this 
+        takes O(length of the path) and all other subtrees (as well as
+        their cached statistics) are kept as they are.
+        The new root is a `RootNode` and the old root becomes a regular
+        `Node`. 
+        Only the labels of the waypoints are considered.
+
+        Args:
+            path (Path): path to the new root, starting at the root.
+            distance (float, optional): 
+                If given, a new root node is inserted on the edge above
+                the node at the `path`, at this distance from that 
+                node. Defaults to None, which makes the node itself the
+                new root.
+            root_label (str, optional): 
+                label of the inserted root node (see `distance`). 
+                Defaults to None, which represents the label of the 
+                old root.
+            keep_old_root (bool, optional): 
+                Whether to keep the old root if it has less than two 
+                children afterwards. Otherwise, it is removed and its 
+                child (if any) is attached to its new parent, with the
+                sum of both distances. Defaults to False.
+
+        Raises:
+            ValueError: When there is no node at the `path`, when the 
+            `distance` is not within the edge above it, when the path
+            contains a hybrid node or when flipping an edge would give
+            a node two children with the same label.
+        """
+        if len(path) < 1 or path[0][0] != self._root.get_label():
+            msg = \
+                "The start waypoint of the path differs from the tree's root."
+            raise ValueError(path, msg)
+        nodes = [self._root]
+        for wlabel, _ in path[1:]:
+            node = nodes[-1].get_child_by_label(wlabel)
+            if node is None:
+                msg = \
+                    "There is no node at the given path."
+                raise ValueError(path, msg)
+            nodes.append(node)
+        k = len(nodes) - 1
+        if distance is not None:
+            if k == 0 or distance < 0 or distance > nodes[k].get_distance():
+                msg = \
+                    "The distance has to be within the edge above the node."
+                raise ValueError(distance, msg)
+        elif k == 0:
+            return
+        for node in nodes:
+            if isinstance(node, HybridNode):
+                msg = \
+                    "Cannot reroot at or below a hybrid node."
+                raise ValueError(path, msg)
+        if root_label is None:
+            root_label = self._root.get_label()
+        # the old root hangs below `nodes[1]` afterwards, unless it 
+        # is removed (then its only other child takes its place)
+        rest = [label for label in nodes[0]._children_by_label 
+                if label != nodes[1].get_label()]
+        keep = keep_old_root or len(rest) >= 2
+        if keep:
+            first_label = nodes[0].get_label()
+        else:
+            first_label = rest[0] if len(rest) == 1 else None
+        # check for label collisions before anything is changed
+        for i in range(1, k + 1):
+            label = nodes[i - 1].get_label() if i > 1 else first_label
+            if label is None:
+                continue
+            if i < k:
+                taken = label != nodes[i + 1].get_label() \
+                    and nodes[i].contains_child_with_label(label)
+            elif distance is None:
+                taken = nodes[k].contains_child_with_label(label)
+            else:
+                taken = label == nodes[k].get_label()
+            if taken:
+                msg = \
+                    "Flipping the edges would give a node two children " \
+                    "with the same label."
+                raise ValueError(label, msg)
+        self._version += 1
+        # copy shared nodes along the path first
+        nodes[0] = self._thaw_root()
+        for i in range(1, k + 1):
+            self._thaw_child(nodes[i - 1], nodes[i].get_label())
+            nodes[i] = nodes[i - 1].get_child_by_label(nodes[i].get_label())
+        # `lengths[i]` is the length of the edge between `nodes[i]` 
+        # and the node hanging below it afterwards, `below[i]`
+        lengths = [None] + [n.get_distance() for n in nodes[1:]]
+        if distance is not None:
+            lengths[k] -= distance
+        below = [None, None] + nodes[1:k]
+        old_root = nodes[0]
+        old_root.remove_child(nodes[1].get_label())
+        if first_label is None:
+            pass
+        elif keep:
+            below[1] = Node(old_root.get_label(), 
+                            distance=lengths[1],
+                            additional_info=old_root._additional_info)
+            below[1]._owner = self._owner_token
+            below[1]._children_by_label = old_root._children_by_label
+        else:
+            self._thaw_child(old_root, first_label)
+            below[1] = old_root.get_child_by_label(first_label)
+            below[1].set_distance(below[1].get_distance() + lengths[1])
+        for i in range(2, k + 1):
+            below[i].set_distance(lengths[i])
+        for i in range(1, k):
+            nodes[i].remove_child(nodes[i + 1].get_label())
+            if below[i] is not None:
+                nodes[i].add_child(below[i])
+        if distance is None:
+            new_root = RootNode(nodes[k].get_label(),
+                                additional_info=nodes[k]._additional_info)
+            new_root._children_by_label = nodes[k]._children_by_label
+        else:
+            new_root = RootNode(root_label)
+            nodes[k].set_distance(distance)
+            new_root.add_child(nodes[k])
+        new_root._owner = self._owner_token
+        if below[k] is not None:
+            new_root.add_child(below[k])
+        self._root = new_root
+        self._depths = None
+        self._parents = None
+        if len(self._hybrids) > 0:
+            self._rebuild_hybrid_registry()
+    
+    def midpoint_root(self, 
+                      root_label:str=None,
+                      keep_old_root:bool=False):
+        """
+        Reroots the tree in place at the midpoint of its longest path 
+        between two leaves (with respect to the distances), see 
+        `reroot()`. The longest path is found in a single iterative 
+        pass, so that this takes O(n).
+
+        Args:
+            root_label (str, optional): see `reroot()`.
+            keep_old_root (bool, optional): see `reroot()`.
+
+        Raises:
+            ValueError: When the tree contains hybrid nodes.
+        """
+        if len(self._hybrids) > 0:
+            msg = \
+                "Cannot midpoint root a tree with hybrid nodes."
+            raise ValueError(self, msg)
+        # entries: [node, parent entry, length of the longest path 
+        # down to a leaf, entry of that leaf]
+        best = (0.0, None, None)  # length, entries of both leaves
+        root_entry = [self._root, None, 0.0, None]
+        stack = [(root_entry, False)]
+        while len(stack) > 0:
+            entry, visited = stack.pop()
+            node = entry[0]
+            if not visited and len(node._children_by_label) > 0:
+                stack.append((entry, True))
+                for child in node._children:
+                    stack.append(([child, entry, 0.0, None], False))
+                continue
+            if len(node._children_by_label) == 0:
+                entry[3] = entry
+            parent = entry[1]
+            if parent is None:
+                continue
+            down = entry[2] + node._distance
+            if parent[3] is not None and parent[2] + down > best[0]:
+                best = (parent[2] + down, parent[3], entry[3])
+            if parent[3] is None or down > parent[2]:
+                parent[2] = down
+                parent[3] = entry[3]
+        length, a, b = best
+        if a is None:
+            return
+        # the midpoint is on the path up from the leaf farther away 
+        # from the lowest common ancestor
+        half = length / 2
+        ancestors = set()
+        entry = b
+        while entry is not None:
+            ancestors.add(id(entry))
+            entry = entry[1]
+        up = 0.0
+        entry = a
+        while id(entry) not in ancestors:
+            up += entry[0]._distance
+            entry = entry[1]
+        if up < half:
+            a = b
+        entry = a
+        up = 0.0
+        while up + entry[0]._distance < half:
+            up += entry[0]._distance
+            entry = entry[1]
+        distance = half - up
+        if distance == entry[0]._distance:
+            # exactly at the parent, which becomes the root itself
+            entry = entry[1]
+            distance = None
+        # path to the node at or below the midpoint
+        points = []
+        target = entry
+        while target[1] is not None:
+            points.append((target[0].get_label(), target[0]._distance))
+            target = target[1]
+        points.reverse()
+        self.reroot(Path(self._root.get_label(), points), 
+                    distance=distance, 
+                    root_label=root_label, 
+                    keep_old_root=keep_old_root)
+    
+    def _rebuild_hybrid_registry(self):
+        """
+        For internal use only.
+        Re-registers exactly the hybrid nodes that are reachable.
+        """
+        self._hybrids = dict()
+        seen = set()
+        stack = [self._root]
+        while len(stack) > 0:
+            node = stack.pop()
+            if isinstance(node, HybridNode):
+                if id(node) in seen:
+                    continue
+                seen.add(id(node))
+                self._hybrids[(node.get_label(), node.get_hybrid_id())] = node
+            stack.extend(node._children)
+    
+    def _thaw_child(self, parent:Node, label:str):
+        """
+        For internal use only.
+        Replaces the child of `parent` with the given `label` by a 
+        mutable copy if it is frozen, so that it can be modified 
+        without affecting the other places that share it.
+        """
+        child = parent.get_child_by_label(label)
+        if child is not None and self._is_shared(child):
+            parent.replace_child(self._thaw(child))
+    
+    def _is_shared(self, node:Node) -> bool:
+        """
+        For internal use only.
+        Whether `node` may be referenced from elsewhere (another tree or
+        several parents, see `clone()` and `compress_shared_subtrees()`)
+        and has to be copied before it is modified.
+        """
+        return node._frozen or node._owner is not self._owner_token
+    
+    def _thaw_root(self) -> RootNode:
+        """
+        For internal use only.
+        Replaces the root by a mutable copy if it is shared with a 
+        clone and returns it.
+        """
+        if self._is_shared(self._root):
+            self._root = self._thaw(self._root)
+        return self._root
+    
+    def _thaw(self, node:Node) -> Node:
+        """
+        For internal use only.
+        Creates a mutable copy of the shared `node`, owned by this 
+        tree. Its children are shared by the copy and the original, 
+        which `_is_shared()` tells, as they are not owned by this tree.
+        """
+        ret = node.copy()
+        ret._owner = self._owner_token
+        # the copy (and its children) are not indexed yet
+        self._depths = None
+        self._parents = None
         return ret
     
+    def clone(self, copy_on_write:bool=True) -> 'Tree':
+        """
+        Creates an independent copy of this tree, with the same 
+        settings. Modifications of the clone do not affect `self` and
+        vice versa.
+
+        Args:
+            copy_on_write (bool, optional): 
+                If True, the clone shares all nodes with `self`, which 
+                makes cloning O(1). Insertions into either tree then 
+                copy the shared nodes along their path only, costing 
+                O(depth) extra each. 
+                If False, all nodes are copied right away, which takes
+                O(n). 
+                Trees with hybrid nodes are always copied right away.
+                Defaults to True.
+
+        Note:
+            With copy-on-write, both trees share their `Node` objects 
+            until a tree copies them (see `Node._owner`). Modify them 
+            through the methods of the trees, or through the nodes 
+            returned by `get_node()` afterwards, which are copied along
+            their path first. Changing a `Node` obtained before the 
+            clone (or through the getters of another node) directly 
+            changes both trees. Clone with `copy_on_write=False` to 
+            keep using such nodes.
+
+        Returns:
+            Tree: the clone.
+        """
+        if copy_on_write and len(self._hybrids) == 0:
+            ret = Tree(self._root,
+                       default_dist=self._default_dist,
+                       dist_adjust_strategy=self._dist_adjust_strat)
+            ret._next_hybrid_id = self._next_hybrid_id
+            # all nodes are shared now, so both trees copy them first
+            self._owner_token = object()
+            ret._owner_token = object()
+            return ret
+        memo = dict()  # id(original) -> copy
+        # only the subtrees shared within the tree stay frozen in the 
+        # copy, the copy shares nothing with self
+        stack = [(self._root, False)]
+        while len(stack) > 0:
+            node, frozen = stack.pop()
+            ncopy = node.copy()
+            if node._shared:
+                frozen = True
+                ncopy._shared = True
+                ncopy._str_cache = (None, None)
+            if frozen:
+                ncopy._frozen = True
+            memo[id(node)] = ncopy
+            for child in node._children:
+                if id(child) not in memo:
+                    memo[id(child)] = None  # reserved
+                    stack.append((child, frozen))
+        for ncopy in memo.values():
+            children = ncopy._children_by_label
+            for label in children:
+                children[label] = memo[id(children[label])]
+        ret = Tree(memo[id(self._root)],
+                   default_dist=self._default_dist,
+                   dist_adjust_strategy=self._dist_adjust_strat)
+        ret._root._frozen = False
+        ret._hybrids = {k: memo[id(h)] for k, h in self._hybrids.items() 
+                        if id(h) in memo}
+        ret._next_hybrid_id = self._next_hybrid_id
+        return ret
+    
+    def __getstate__(self) -> dict:
+        # the depths are keyed by node id and the label cache may hold
+        # closures, so neither can be pickled
+        state = self.__dict__.copy()
+        state["_depths"] = None
+        state["_parents"] = None
+        state["_label_cache"] = None
+        return state
+    
+    def __deepcopy__(self, memo) -> 'Tree':
+        return self.clone(copy_on_write=False)
+    
+    def compress_shared_subtrees(self) -> int:
+        """
+        Enables structural sharing: identical subtrees (same labels, 
+        distances, duplication counts, additional info and children) 
+        are stored only once and referenced from all their parents.
+        Shared subtrees are frozen. They are expanded again on output,
+        reusing their memoized string on every repetition, and they are
+        copied on demand along the path of later insertions. 
+        Subtrees containing hybrid nodes are never shared.
+        
+        Structural keys are computed bottom-up in a single iterative 
+        pass, so this runs in time linear in the size of the tree.
+        Nodes must not be modified directly (i.e. not through the 
+        `Tree`) after calling this.
+
+        Returns:
+            int: the number of nodes that were merged away.
+        """
+        self._version += 1
+        table = dict()  # structural key -> canonical node
+        canon = dict()  # id(node) -> canonical node, or None if unshareable
+        refs = dict()   # id(canonical node) -> number of referencing parents
+        seen = set()
+        stack = [(self._root, False)]
+        while len(stack) > 0:
+            node, visited = stack.pop()
+            if not visited:
+                if id(node) in seen:
+                    continue  # already shared before
+                seen.add(id(node))
+                stack.append((node, True))
+                for child in node._children:
+                    stack.append((child, False))
+                continue
+            shareable = not isinstance(node, HybridNode)
+            children = node._children_by_label
+            for label in children:
+                cchild = canon[id(children[label])]
+                if cchild is None:
+                    shareable = False
+                    continue
+                children[label] = cchild
+                refs[id(cchild)] = refs.get(id(cchild), 0) + 1
+            if not shareable or node is self._root:
+                canon[id(node)] = None
+                continue
+            info = node._additional_info
+            key = (type(node), 
+                   node._label, 
+                   node._distance, 
+                   node._dupcount,
+                   tuple((k, repr(info[k])) for k in info),
+                   tuple(id(c) for c in children.values()))
+            canon[id(node)] = table.setdefault(key, node)
+        # freeze everything that is reachable via more than one parent
+        n_after = 0
+        stack = [(self._root, False)]
+        done = set()
+        while len(stack) > 0:
+            node, frozen = stack.pop()
+            if id(node) in done:
+                continue
+            done.add(id(node))
+            n_after += 1
+            if refs.get(id(node), 0) > 1:
+                frozen = True
+                node._shared = True
+                node._str_cache = (None, None)
+            if frozen:
+                node._frozen = True
+            for child in node._children:
+                stack.append((child, frozen))
+        self._depths = None
+        self._parents = None
+        return len(seen) - n_after
+    
+    
+    def annotate(self):
+        """
+        Precomputes the statistics of all nodes in a single iterative 
+        pass each: the subtree statistics (size, leaf count, height and
+        total branch length, see `Node.get_subtree_stats()`) as well as
+        the depth of each node (see `get_depth()`).
+        Afterwards, `add_new_node()` records the depths of new nodes 
+        and invalidates the subtree statistics only along the insertion
+        path, so that they are recomputed for that path only and 
+        queries stay O(1).
+        """
+        self._root.get_subtree_stats()
+        depths = dict()
+        level = [self._root]
+        depth = 0
+        while len(level) > 0:
+            next_level = []
+            for node in level:
+                if id(node) not in depths:
+                    depths[id(node)] = depth
+                    next_level.extend(node._children)
+            level = next_level
+            depth += 1
+        self._depths = depths
+        self._depths_version = self._version
+    
+    def get_depth(self, node:Node) -> int:
+        """
+        Determines the depth of the `node` in this tree, i.e. the 
+        number of edges between the root and the `node`. 
+        For nodes that appear in several places (hybrids and shared 
+        subtrees), the smallest depth is returned.
+        Annotates the tree first if it has been modified since (see 
+        `annotate()`), at most once per modification, so that looking 
+        up nodes that are not in the tree stays O(1). Modifications 
+        made through the methods of a `Node` directly are not noticed,
+        call `annotate()` after them.
+
+        Args:
+            node (Node): a node of this tree.
+
+        Returns:
+            int: the depth, or `None` if `node` is not in this tree.
+        """
+        if self._depths is None or self._depths_version != self._version:
+            self.annotate()
+        return self._depths.get(id(node))
+    
+    def index_parents(self):
+        """
+        Builds the parent index of the tree in a single iterative pass:
+        a table from (the id of) each node to its parent, kept by the 
+        `Tree` rather than by the nodes, since nodes can be shared 
+        between trees (see `clone()`). 
+        Afterwards, `add_new_node()` records the parents of new nodes, 
+        so that the index stays valid while the tree grows; other 
+        modifications drop it. Upward queries (see `get_parent()`) 
+        build it on first use.
+        """
+        parents = dict()
+        stack = [self._root]
+        while len(stack) > 0:
+            node = stack.pop()
+            for child in node._children:
+                if id(child) not in parents:
+                    parents[id(child)] = node
+                    stack.append(child)
+        self._parents = parents
+        self._parents_version = self._version
+    
+    def get_parent(self, node:Node) -> Node:
+        """
+        Looks up the parent of the `node` in this tree in O(1), 
+        indexing the parents first if the tree has been modified since
+        (see `index_parents()`), at most once per modification. For 
+        nodes that appear in several places (hybrids and shared 
+        subtrees), one of their parents is returned. Modifications made
+        through the methods of a `Node` directly are not noticed, call 
+        `index_parents()` after them.
+
+        Args:
+            node (Node): a node of this tree.
+
+        Raises:
+            ValueError: When the `node` is not in this tree.
+
+        Returns:
+            Node: the parent, or `None` if `node` is the root.
+        """
+        if node is self._root:
+            return None
+        if self._parents is None or self._parents_version != self._version:
+            self.index_parents()
+        ret = self._parents.get(id(node))
+        if ret is None:
+            msg = \
+                "The node is not part of this tree."
+            raise ValueError(node, msg)
+        return ret
+    
+    def ancestors(self, node:Node) -> list:
+        """
+        Collects the ancestors of the `node` in O(depth), see 
+        `get_parent()`.
+
+        Args:
+            node (Node): a node of this tree.
+
+        Raises:
+            ValueError: When the `node` is not in this tree.
+
+        Returns:
+            list: the ancestors, from the parent of `node` up to the 
+            root.
+        """
+        ret = []
+        parent = self.get_parent(node)
+        while parent is not None:
+            ret.append(parent)
+            parent = self._parents.get(id(parent))
+        return ret
+    
+    def path_from_root(self, node:Node) -> Path:
+        """
+        Determines the path from the root to the `node` in O(depth), 
+        see `get_parent()`. It can be passed to `get_node()` and the 
+        other methods that take a `Path`.
+
+        Args:
+            node (Node): a node of this tree.
+
+        Raises:
+            ValueError: When the `node` is not in this tree.
+
+        Returns:
+            Path: the path, with the distances of the nodes.
+        """
+        chain = [node] + self.ancestors(node)
+        chain.pop()  # the root
+        chain.reverse()
+        return Path(self._root.get_label(), 
+                    [(n.get_label(), n.get_distance()) for n in chain])
+    
+    def siblings(self, node:Node) -> list:
+        """
+        Collects the siblings of the `node`, i.e. the other children of
+        its parent, see `get_parent()`.
+
+        Args:
+            node (Node): a node of this tree.
+
+        Raises:
+            ValueError: When the `node` is not in this tree.
+
+        Returns:
+            list: the siblings, in order of insertion (empty for the 
+            root).
+        """
+        parent = self.get_parent(node)
+        if parent is None:
+            return []
+        return [c for c in parent._children if c is not node]
+    
+    def get_structural_hash(self) -> int:
+        """
+        Retrieves the structural hash (Merkle digest) of the entire 
+        tree. See `Node.get_structural_hash()`.
+
+        Returns:
+            int: a 128 bit digest, stable across processes.
+        """
+        return self._root.get_structural_hash()
+    
+    def invalidate_hashes(self):
+        """
+        Drops all cached structural hashes (as well as the other cached
+        per-node data, such as subtree sizes and child orders), so that
+        they are recomputed on next use. Only required after nodes have
+        been modified directly instead of through the `Tree`.
+        """
+        stack = [self._root]
+        while len(stack) > 0:
+            node = stack.pop()
+            node._drop_caches()
+            stack.extend(node._children)
+    
+    def diff(self, other:'Tree') -> tuple[list[Path],list[Path],list[Path]]:
+        """
+        Determines the differences between `self` and the `other` tree.
+        Children are matched by their labels and subtrees with equal 
+        structural hashes are skipped, so that the running time is 
+        proportional to the size of the change (and its depth), apart
+        from the hashes that have to be computed once.
+
+        Args:
+            other (Tree): the tree to compare `self` to.
+
+        Returns:
+            tuple[list[Path],list[Path],list[Path]]: 
+                The paths of the `added` nodes (roots of subtrees only 
+                present in `other`), the `removed` nodes (roots of 
+                subtrees only present in `self`) and the `changed` 
+                nodes (present in both, but with a different distance, 
+                duplication count, additional info or kind).
+                Added and changed paths carry the distances of `other`,
+                removed paths the ones of `self`.
+        """
+        added, removed, changed = [], [], []
+        root_label = other._root.get_label()
+        if self._root.get_label() != root_label:
+            changed.append(Path(root_label))
+        stack = [(self._root, other._root, [])]
+        while len(stack) > 0:
+            snode, onode, prefix = stack.pop()
+            if snode.get_structural_hash() == onode.get_structural_hash():
+                continue
+            if len(prefix) > 0 and \
+                    (type(snode) is not type(onode) \
+                     or snode._distance != onode._distance \
+                     or snode._dupcount != onode._dupcount \
+                     or snode._additional_info != onode._additional_info):
+                changed.append(Path(root_label, prefix))
+            for label, ochild in onode._children_by_label.items():
+                schild = snode.get_child_by_label(label)
+                cprefix = prefix + [(label, ochild.get_distance())]
+                if schild is None:
+                    added.append(Path(root_label, cprefix))
+                else:
+                    stack.append((schild, ochild, cprefix))
+            for label in snode._children_by_label.keys():
+                if not onode.contains_child_with_label(label):
+                    schild = snode.get_child_by_label(label)
+                    removed.append(Path(root_label, 
+                                        prefix + [(label, schild.get_distance())]))
+        return (added, removed, changed)
+    
+    
+    def enable_profiling(self, 
+                         profile:BuildProfile=None, 
+                         timings:bool=False) -> BuildProfile:
+        """
+        Starts collecting counters (and optionally timings) on 
+        insertions and serializations of this tree. 
+        See `profiling.BuildProfile` for what is being counted.
+
+        Args:
+            profile (BuildProfile, optional): 
+                Profile to add the counts to, e.g. to share one between
+                several trees. Defaults to None, which creates a new 
+                one.
+            timings (bool, optional): 
+                Whether or not to measure timings, if a new profile is
+                created. Defaults to False.
+
+        Returns:
+            BuildProfile: the profile in use.
+        """
+        if profile is None:
+            profile = BuildProfile(timings=timings)
+        self._profile = profile
+        return profile
+    
+    def disable_profiling(self) -> BuildProfile:
+        """
+        Stops collecting counters.
+
+        Returns:
+            BuildProfile: the profile that was in use, or `None`.
+        """
+        ret = self._profile
+        self._profile = None
+        return ret
+    
+    def get_profile(self) -> BuildProfile:
+        """
+        Returns:
+            BuildProfile: the profile in use, or `None` if profiling is
+            disabled.
+        """
+        return self._profile
+    
     
     def set_dist_adjust_strat(self, dist_adjust_strat:Callable[[Node,float],float]):
         """
@@ -271,12 +1390,71 @@ class Tree:
             pass  # maybe throw error?
     
     
+    def resolve_output_labels(self, 
+                              outputlabel_table:Mapping[str,str]=None,
+                              outputlabel_batch_mapper:Callable[[list[Node]],Iterable[str]]=None) -> Callable[[Node],str]:
+        """
+        Resolves the output labels of all nodes from the given table or
+        batch mapper (see `to_string()`) at once.
+        The result is cached until the tree is modified.
+
+        Returns:
+            Callable[[Node],str]: 
+                An `outputlabel_mapper` that looks up the resolved 
+                labels.
+        """
+        source = outputlabel_table if outputlabel_table is not None \
+            else outputlabel_batch_mapper
+        cache = self._label_cache
+        if cache is not None and cache[0] == self._version \
+                and cache[1] is source:
+            return cache[2]
+        nodes = []
+        seen = set()
+        stack = [self._root]
+        while len(stack) > 0:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            nodes.append(node)
+            stack.extend(node._children)
+        if outputlabel_table is not None:
+            labels = []
+            for node in nodes:
+                label = node._label
+                label = outputlabel_table.get(label, label)
+                if isinstance(node, HybridNode):
+                    label += node.gen_hybrid_id_string()
+                labels.append(label)
+        else:
+            labels = list(outputlabel_batch_mapper(nodes))
+            if len(labels) != len(nodes):
+                msg = \
+                    "The batch mapper has to return one label per node."
+                raise ValueError(len(labels), msg)
+        table = dict(zip(map(id, nodes), labels))
+        mapper = lambda n: table[id(n)]
+        self._label_cache = (self._version, source, mapper)
+        return mapper
+    
+    
     def to_string(self,
                   with_labels:bool=True,
                   with_distances:bool=True,
                   with_additional_info_nhx:bool=False,
                   append_newline:bool=False,
-                  outputlabel_mapper:Mapping[Node,str]=None) -> str:
+                  outputlabel_mapper:Mapping[Node,str]=None,
+                  child_order=None,
+                  outputlabel_table:Mapping[str,str]=None,
+                  outputlabel_batch_mapper:Callable[[list[Node]],Iterable[str]]=None,
+                  distance_formatter:Callable[[float],str]=None,
+                  progress:Callable[[dict],None]=None,
+                  cancel_token:CancelToken=None,
+                  progress_interval:int=10000,
+                  omit_default_distances:bool=False,
+                  nhx_key_filter=None,
+                  quote_labels:bool=False) -> str:
         """
         Generates a string representation of this tree in newick 
         format.
@@ -320,18 +1498,258 @@ class Tree:
                 Please note that your custom implementation might 
                 have to take the differences between the different 
                 kinds of nodes into account.
+            child_order (str | Callable[[Node],Any], optional):
+                Order in which the children of each node are written: 
+                `None` for the order of insertion, `"label"`, `"size"`
+                or a key function (see `Node.get_ordered_children()`).
+                Use a sorted order to get the same output regardless 
+                of the order of insertion. The sorted orders are 
+                cached in the nodes. Defaults to None.
+            outputlabel_table (Mapping[str,str], optional):
+                Alternative to the `outputlabel_mapper`: a table that 
+                maps the label of a node to the label string that is to
+                be written for it. Nodes whose label is not in the 
+                table are written with their own label. Hybrids get 
+                their hybrid id appended.
+                Defaults to None.
+            outputlabel_batch_mapper (Callable[[list[Node]],Iterable[str]], optional):
+                Alternative to the `outputlabel_mapper`: a function 
+                that maps the list of all nodes of the tree to the 
+                label strings that are to be written for them, in the 
+                same order. It is called once, instead of once per 
+                node. Defaults to None.
+                The labels resolved from a table or a batch mapper are 
+                cached until the tree is modified through its methods,
+                so they are only resolved again if a different table 
+                or batch mapper (object) is passed. Do not modify a 
+                table in place between two calls.
+            distance_formatter (Callable[[float],str], optional):
+                Function that converts distances to strings, e.g. one
+                created by `util_funcs.make_float_formatter()` for a 
+                different precision or for exact (shortest round-trip)
+                output. Defaults to None, which represents 
+                `format_float` (6 decimal places, trailing zeros 
+                stripped).
+            progress (Callable[[dict],None], optional):
+                Function that is called every `progress_interval` 
+                nodes with a dict of the number of "nodes" written so 
+                far, the "total_nodes", the "elapsed" seconds and the 
+                throughput in "nodes_per_s". Defaults to None.
+            cancel_token (CancelToken, optional):
+                Token that is checked every `progress_interval` nodes.
+                Once it is cancelled, `progress.Cancelled` is raised.
+                Defaults to None.
+            progress_interval (int, optional):
+                Number of nodes between two progress reports or 
+                cancellation checks. Defaults to 10000.
+            omit_default_distances (bool, optional):
+                Whether to leave out the distances that are equal to 
+                the default distance of this tree (see `__init__()`), 
+                which parsers assume for missing distances anyway 
+                (e.g. `forest.parse_newick()` with the same 
+                `default_dist`). Defaults to False.
+            nhx_key_filter (Callable[[str],bool] | Iterable[str], optional):
+                The keys of the additional info to write in NHX: a 
+                function that returns True for the keys to write, or a 
+                collection of the keys to leave out, e.g. 
+                `very_basic.PARSER_INFO_KEYS`. Defaults to None (write 
+                all keys).
+            quote_labels (bool, optional):
+                Whether to quote the labels that contain whitespace or
+                characters with a meaning in Newick (see 
+                `util_funcs.quote_label()`), so that they are read 
+                back correctly. All other labels are written unquoted.
+                Defaults to False (write all labels as they are).
+
+        Raises:
+            ValueError: When more than one label source is given.
+            Cancelled: When the `cancel_token` has been cancelled.
 
         Returns:
             str: A string representation of this tree.
         """
-        ret = []
-        ret.append( \
-            self._root.to_string(with_labels=with_labels,
-                                 with_distances=with_distances,
-                                 with_additional_info_nhx=with_additional_info_nhx,
-                                 outputlabel_mapper=outputlabel_mapper))
-        ret.append(';')
+        return ''.join(self._gen_string_parts(with_labels,
+                                              with_distances,
+                                              with_additional_info_nhx,
+                                              append_newline,
+                                              outputlabel_mapper,
+                                              child_order,
+                                              outputlabel_table,
+                                              outputlabel_batch_mapper,
+                                              distance_formatter,
+                                              progress,
+                                              cancel_token,
+                                              progress_interval,
+                                              omit_default_distances,
+                                              nhx_key_filter,
+                                              quote_labels))
+    
+    def write(self, stream, append_newline:bool=True, **kwargs) -> int:
+        """
+        Writes the string representation of this tree (see 
+        `to_string()`) to a text stream while it is being generated, 
+        one top-level subtree at a time, instead of building the 
+        entire string in memory first.
+
+        Args:
+            stream: 
+                Any object with a `write(str)` method, e.g. a file 
+                opened in text mode or a compressing writer.
+            append_newline (bool, optional): 
+                Whether or not to append a newline character after
+                the tree's string representation. Defaults to True.
+            **kwargs: the other arguments of `to_string()`.
+
+        Returns:
+            int: the number of characters written.
+        """
+        ret = 0
+        buf = []
+        buf_len = 0
+        for part in self._gen_string_parts(append_newline=append_newline, 
+                                           **kwargs):
+            buf.append(part)
+            buf_len += len(part)
+            if buf_len >= 65536:
+                stream.write(''.join(buf))
+                ret += buf_len
+                buf = []
+                buf_len = 0
+        stream.write(''.join(buf))
+        return ret + buf_len
+    
+    def _gen_string_parts(self,
+                          with_labels:bool=True,
+                          with_distances:bool=True,
+                          with_additional_info_nhx:bool=False,
+                          append_newline:bool=False,
+                          outputlabel_mapper:Mapping[Node,str]=None,
+                          child_order=None,
+                          outputlabel_table:Mapping[str,str]=None,
+                          outputlabel_batch_mapper:Callable[[list[Node]],Iterable[str]]=None,
+                          distance_formatter:Callable[[float],str]=None,
+                          progress:Callable[[dict],None]=None,
+                          cancel_token:CancelToken=None,
+                          progress_interval:int=10000,
+                          omit_default_distances:bool=False,
+                          nhx_key_filter=None,
+                          quote_labels:bool=False):
+        """
+        For internal use only.
+        Generates the string representation for `to_string()` and 
+        `write()` piece by piece.
+        """
+        if sum(m is not None for m in (outputlabel_mapper, 
+                                       outputlabel_table, 
+                                       outputlabel_batch_mapper)) > 1:
+            msg = \
+                """
+                Pass at most one of `outputlabel_mapper`, 
+                `outputlabel_table` and `outputlabel_batch_mapper`.
+                """
+            raise ValueError(msg)
+        if with_labels and (outputlabel_table is not None \
+                            or outputlabel_batch_mapper is not None):
+            outputlabel_mapper = self.resolve_output_labels(
+                outputlabel_table, outputlabel_batch_mapper)
+        if with_labels and quote_labels:
+            if outputlabel_mapper is None:
+                outputlabel_mapper = _quoted_default_label
+            else:
+                base_mapper = outputlabel_mapper
+                outputlabel_mapper = lambda n: quote_label(base_mapper(n))
+        if nhx_key_filter is not None and not callable(nhx_key_filter):
+            nhx_key_filter = _DroppedKeysFilter(nhx_key_filter)
+        node_hook = None
+        if progress is not None or cancel_token is not None:
+            node_hook = self._gen_progress_hook(progress, 
+                                                cancel_token, 
+                                                progress_interval)
+        prof = self._profile
+        nhx_hook = None
+        if prof is not None:
+            start = perf_counter()
+            if with_additional_info_nhx:
+                def nhx_hook(nhx:str):
+                    prof.nhx_bytes += len(nhx)
+        yield from self._root.gen_string_parts(
+            with_labels=with_labels,
+            with_distances=with_distances,
+            with_additional_info_nhx=with_additional_info_nhx,
+            outputlabel_mapper=outputlabel_mapper,
+            hybrid_seen=set(),
+            child_order=child_order,
+            distance_formatter=distance_formatter,
+            node_hook=node_hook,
+            omitted_distance=self._default_dist if omit_default_distances else None,
+            nhx_key_filter=nhx_key_filter,
+            nhx_hook=nhx_hook)
+        yield ';'
         if append_newline:
-            ret.append(linesep)
-        return ''.join(ret)
-    
\ No newline at end of file
+            yield linesep
+        if prof is not None:
+            prof.add_time("serialize", perf_counter() - start)
+    
+    def _gen_progress_hook(self, 
+                           progress:Callable[[dict],None],
+                           cancel_token:CancelToken,
+                           progress_interval:int) -> Callable[[Node],None]:
+        """
+        For internal use only.
+        Generates the `node_hook` for `to_string()` that reports 
+        progress and checks for cancellation.
+        """
+        total = self._root.get_subtree_size()
+        start = perf_counter()
+        count = 0
+        def hook(node:Node):
+            nonlocal count
+            count += 1
+            if count % progress_interval == 0:
+                if cancel_token is not None:
+                    cancel_token.check()
+                if progress is not None:
+                    elapsed = perf_counter() - start
+                    progress({"nodes": count,
+                              "total_nodes": total,
+                              "elapsed": elapsed,
+                              "nodes_per_s": count / elapsed if elapsed > 0 else 0.0})
+        return hook
+    
+
+def _quoted_default_label(node:Node) -> str:
+    """
+    For internal use only.
+    The default output label of `node` (see `Node.to_string()`), 
+    quoted if necessary (see `util_funcs.quote_label()`). The hybrid id
+    of a `HybridNode` is appended outside of the quotes.
+    """
+    if isinstance(node, HybridNode):
+        return quote_label(node._label) + node.gen_hybrid_id_string()
+    return quote_label(node._label)
+
+
+class _DroppedKeysFilter:
+    """
+    For internal use only.
+    The `nhx_key_filter` for a collection of keys to leave out (see 
+    `Tree.to_string()`). Filters of the same keys are equal, so that 
+    the memoized strings of shared subtrees (see `Node.to_string()`) 
+    are reused across calls.
+    """
+
+    __slots__ = ("_keys",)
+
+
+    def __init__(self, keys:Iterable[str]):
+        self._keys = frozenset(keys)
+
+    def __call__(self, key:str) -> bool:
+        return key not in self._keys
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, _DroppedKeysFilter) \
+            and self._keys == other._keys
+
+    def __hash__(self) -> int:
+        return hash(self._keys)
@@ -4,8 +4,122 @@ by several other modules.
 """
 
 
-def format_float(num:float) -> str:
-    return format(num, 'f').rstrip('0').rstrip('.')
+from collections.abc import Callable, Iterable
+from functools import lru_cache
+
+
+def make_float_formatter(mode:str="fixed", 
+                         precision:int=6,
+                         cache_size:int=4096,
+                         pinned:Iterable[float]=(1.0,)) -> Callable[[float],str]:
+    """
+    Creates a function that converts floats (e.g. distances) to 
+    strings. The strings of the `pinned` values (such as the default 
+    distance) and of the `cache_size` most recently used other values 
+    are cached, which makes frequent values nearly free. Zeros and NaN
+    are never cached, so that -0.0 keeps its sign.
+
+    Args:
+        mode (str, optional): 
+            One of
+              * `"fixed"`: `precision` decimal places, with trailing 
+                zeros (and point) stripped. Small values may be 
+                rounded to 0.
+              * `"significant"`: `precision` significant digits, 
+                switching to exponent notation for very small or large
+                values.
+              * `"shortest"`: the shortest string that reads back as 
+                exactly the same float (like `repr`), without a 
+                trailing `.0`. `precision` is ignored.
+            Defaults to `"fixed"`.
+        precision (int, optional): 
+            Number of decimal places or significant digits. 
+            Defaults to 6.
+        cache_size (int, optional): 
+            Maximum number of cached values besides the `pinned` ones
+            (least recently used first out). Defaults to 4096.
+        pinned (Iterable[float], optional):
+            Values whose strings are always cached, e.g. the default 
+            distance of the trees. Defaults to `(1.0,)`.
+
+    Returns:
+        Callable[[float],str]: the formatting function. Its 
+        `cache_info()` reports on the cache of the other values (see 
+        `functools.lru_cache`).
+    """
+    if mode == "fixed":
+        fmt = '.' + format_int(precision) + 'f'
+        if precision > 0:
+            convert = lambda num: format(num, fmt).rstrip('0').rstrip('.')
+        else:
+            convert = lambda num: format(num, fmt)
+    elif mode == "significant":
+        fmt = '.' + format_int(max(precision, 1)) + 'g'
+        convert = lambda num: format(num, fmt)
+    elif mode == "shortest":
+        def convert(num):
+            ret = repr(num)
+            return ret[:-2] if ret.endswith('.0') else ret
+    else:
+        msg = \
+            """
+            The `mode` has to be "fixed", "significant" or "shortest".
+            """
+        raise ValueError(mode, msg)
+    # keyed by equality, so without 0.0 == -0.0 and NaN
+    pinned = {num: convert(num) for num in pinned if num and num == num}
+    cached = lru_cache(maxsize=cache_size)(convert)
+    def format_float(num:float) -> str:
+        ret = pinned.get(num)
+        if ret is None:
+            if num and num == num:
+                return cached(num)
+            return convert(num)
+        return ret
+    format_float.cache_info = cached.cache_info
+    return format_float
 
 def format_int(num:int) -> str:
-    return format(num, 'd')
\ No newline at end of file
+    return format(num, 'd')
+
+# default formatter: 6 decimal places, trailing zeros stripped
+format_float = make_float_formatter()
+
+# characters that cannot appear in unquoted Newick labels (besides 
+# other whitespace)
+_QUOTE_NEEDED = frozenset(" \t\n\r\x0b\x0c()[]':;,")
+
+def quote_label(label:str) -> str:
+    """
+    Quotes a label for Newick output if (and only if) it has to be 
+    quoted: when it contains whitespace or one of `()[]':;,`. Quotes 
+    in the label are doubled. Other labels are returned unchanged, 
+    which keeps the output minimal.
+
+    Args:
+        label (str): the label.
+
+    Returns:
+        str: the label as it is to be written.
+    """
+    if _QUOTE_NEEDED.isdisjoint(label) \
+            and (label.isprintable() or not any(map(str.isspace, label))):
+        return label
+    return "'" + label.replace("'", "''") + "'"
+
+def canonical_repr(obj) -> str:
+    """
+    Like `repr`, but independent of the iteration order of sets and 
+    dictionaries, so that equal objects have equal representations 
+    across processes.
+    """
+    if isinstance(obj, dict):
+        items = sorted(canonical_repr(k) + ':' + canonical_repr(v) 
+                       for k, v in obj.items())
+        return '{' + ','.join(items) + '}'
+    elif isinstance(obj, (set, frozenset)):
+        return '{' + ','.join(sorted(canonical_repr(v) for v in obj)) + '}'
+    elif isinstance(obj, (list, tuple)):
+        return '[' + ','.join(canonical_repr(v) for v in obj) + ']'
+    else:
+        return repr(obj)
\ No newline at end of file
@@ -0,0 +1,310 @@
+"""
+Command-line tool that converts path tables (see `very_basic`) into
+Newick/NHX trees, processing many input files in parallel.
+
+Usage (see `newick --help`):
+    newick [options] INPUT [INPUT ...]
+where each INPUT is a file, a directory or a glob pattern. Compressed
+inputs are decompressed transparently.
+"""
+import argparse
+import glob
+import os
+import sys
+
+
+DIST_ADJUST_STRATS = ("average", "new", "old", "roll2")
+CHILD_ORDERS = ("insertion", "label", "size")
+FLOAT_MODES = ("fixed", "significant", "shortest")
+
+
+def collect_inputs(inputs:list, pattern:str="*", recursive:bool=False,
+                   with_base_dirs:bool=False) -> list:
+    """
+    Expands the given files, directories and glob patterns into a list
+    of files, keeping the given order and dropping repetitions.
+
+    Args:
+        inputs (list): files, directories or glob patterns.
+        pattern (str, optional):
+            Glob pattern for the files to take from directories.
+            Defaults to "*".
+        recursive (bool, optional):
+            Whether to include the files in subdirectories of
+            directories. Defaults to False.
+        with_base_dirs (bool, optional):
+            Whether to also return the directory each file was found
+            under (see `output_path()`). Defaults to False.
+
+    Raises:
+        ValueError: When an input neither exists nor matches any file.
+
+    Returns:
+        list: paths of the input files, or with `with_base_dirs`,
+        tuples of the path and the input directory it was found under
+        (None for files and glob matches).
+    """
+    ret = dict()  # path -> base directory
+    for inp in inputs:
+        base_dir = None
+        if os.path.isdir(inp):
+            base_dir = inp
+            if recursive:
+                found = glob.glob(os.path.join(glob.escape(inp), "**", pattern),
+                                  recursive=True)
+            else:
+                found = glob.glob(os.path.join(glob.escape(inp), pattern))
+            found = sorted(f for f in found if os.path.isfile(f))
+        elif os.path.isfile(inp):
+            found = [inp]
+        else:
+            found = sorted(f for f in glob.glob(inp, recursive=True)
+                           if os.path.isfile(f))
+            if len(found) == 0:
+                msg = \
+                    "No such file, directory or matching files."
+                raise ValueError(inp, msg)
+        for f in found:
+            ret.setdefault(f, base_dir)
+    if with_base_dirs:
+        return list(ret.items())
+    return list(ret)
+
+def output_path(input_file:str, output_dir:str, suffix:str,
+                base_dir:str=None) -> str:
+    """
+    Args:
+        input_file (str): path of the input file.
+        output_dir (str): the output directory.
+        suffix (str): extension of the output file.
+        base_dir (str, optional):
+            Directory the input file was found under. Its path relative
+            to `base_dir` is mirrored in `output_dir`, so that files of
+            the same name in different subdirectories do not overwrite
+            each other. Defaults to None (directly in `output_dir`).
+
+    Returns:
+        str: the path of the output file for `input_file` in
+        `output_dir`, with its extension replaced by `suffix`.
+    """
+    subdir = ""
+    if base_dir is not None:
+        subdir = os.path.relpath(os.path.dirname(input_file), base_dir)
+    return os.path.normpath(os.path.join(output_dir, subdir,
+                                         _stem(input_file) + suffix))
+
+def _stem(filename:str) -> str:
+    """
+    Returns:
+        str: the file name without directory, compression extension
+        and extension.
+    """
+    from newick.frontend.compression import compression_by_extension
+    stem = os.path.basename(filename)
+    if compression_by_extension(stem) is not None:
+        stem = os.path.splitext(stem)[0]
+    return os.path.splitext(stem)[0]
+
+def convert_file(task:tuple) -> tuple:
+    """
+    Converts a single file. This is run in the worker processes, so
+    it only takes and returns picklable values.
+
+    Args:
+        task (tuple):
+            The input path, the output path (or None to return the
+            tree's string) and the options (see `_gen_options()`).
+
+    Returns:
+        tuple: the input path, the tree's string (or None if written
+        to the output path) and an error message (or None).
+    """
+    from newick.frontend.very_basic import tree_parse_file, BlacklistTokenStrat
+    from newick.frontend.compression import write_tree_file
+    from newick.backend.tree import Tree
+    from newick.backend.util_funcs import make_float_formatter
+    input_file, output_file, opts = task
+    strats = {"average": Tree._DIST_ADJUST_STRAT_AVERAGE,
+              "new": Tree._DIST_ADJUST_STRAT_NEW,
+              "old": Tree._DIST_ADJUST_STRAT_OLD,
+              "roll2": Tree._DIST_ADJUST_STRAT_ROLL2}
+    try:
+        root_label = opts["root_label"]
+        if root_label is None and opts["root_from_filename"]:
+            root_label = _stem(input_file)
+        tree = tree_parse_file(input_file,
+                               root_label,
+                               encoding=opts["encoding"],
+                               line_delim=opts["line_delim"],
+                               waypoint_sep=opts["waypoint_sep"],
+                               label_dist_sep=opts["label_dist_sep"],
+                               blacklist=opts["blacklist"],
+                               blacklist_token_strat=BlacklistTokenStrat[opts["blacklist_strat"]],
+                               default_dist=opts["default_dist"],
+                               dist_adjust_strategy=strats[opts["dist_adjust"]],
+                               aggregate_lines=opts["aggregate_lines"])
+        formatter = None
+        if opts["float_format"] != "fixed" or opts["precision"] != 6:
+            formatter = make_float_formatter(opts["float_format"],
+                                             opts["precision"])
+        child_order = opts["child_order"]
+        out_opts = {"with_labels": not opts["no_labels"],
+                    "with_distances": not opts["no_distances"],
+                    "with_additional_info_nhx": opts["nhx"],
+                    "child_order": None if child_order == "insertion" else child_order,
+                    "distance_formatter": formatter,
+                    "omit_default_distances": opts["omit_default_distances"],
+                    "nhx_key_filter": opts["nhx_drop_keys"] or None,
+                    "quote_labels": opts["quote_labels"]}
+        if output_file is None:
+            return (input_file, tree.to_string(**out_opts) + '\n', None)
+        # compressed by the extension of the output file
+        write_tree_file(tree, output_file, opts["encoding"], **out_opts)
+    except (OSError, ValueError, EOFError, UnicodeDecodeError) as e:
+        return (input_file, None, str(e))
+    return (input_file, None, None)
+
+def _gen_options(args:argparse.Namespace) -> dict:
+    return {"encoding": args.encoding,
+            "root_label": args.root_label,
+            "root_from_filename": args.root_from_filename,
+            "line_delim": args.line_delim,
+            "waypoint_sep": args.waypoint_sep,
+            "label_dist_sep": args.label_dist_sep,
+            "blacklist": args.blacklist,
+            "blacklist_strat": args.blacklist_strat,
+            "default_dist": args.default_dist,
+            "dist_adjust": args.dist_adjust,
+            "aggregate_lines": args.aggregate_lines,
+            "nhx": args.nhx,
+            "no_labels": args.no_labels,
+            "no_distances": args.no_distances,
+            "child_order": args.child_order,
+            "float_format": args.float_format,
+            "precision": args.precision,
+            "omit_default_distances": args.omit_default_distances,
+            "nhx_drop_keys": args.nhx_drop_keys,
+            "quote_labels": args.quote_labels}
+
+def gen_arg_parser() -> argparse.ArgumentParser:
+    from newick.frontend.very_basic import BlacklistTokenStrat
+    parser = argparse.ArgumentParser(
+        prog="newick",
+        description="Converts path tables into Newick (or NHX) trees.")
+    parser.add_argument("inputs", nargs="+", metavar="INPUT",
+                        help="input file, directory or glob pattern")
+    inp = parser.add_argument_group("input files")
+    inp.add_argument("--pattern", default="*",
+                     help="glob pattern for the files in directories (default: %(default)s)")
+    inp.add_argument("-r", "--recursive", action="store_true",
+                     help="also take the files in subdirectories")
+    inp.add_argument("--encoding", default="utf-8",
+                     help="text encoding of inputs and outputs (default: %(default)s)")
+    out = parser.add_argument_group("output")
+    out.add_argument("-o", "--output-dir", default=None,
+                     help="write one file per input into this directory "
+                          "(default: write all trees to stdout, in order)")
+    out.add_argument("--suffix", default=".nwk",
+                     help="extension of the output files, add e.g. '.gz' to "
+                          "compress them (default: %(default)s)")
+    out.add_argument("--nhx", action="store_true",
+                     help="write the attached information as NHX")
+    out.add_argument("--no-labels", action="store_true")
+    out.add_argument("--no-distances", action="store_true")
+    out.add_argument("--child-order", choices=CHILD_ORDERS, default="insertion")
+    out.add_argument("--float-format", choices=FLOAT_MODES, default="fixed",
+                     help="how to write distances (default: %(default)s)")
+    out.add_argument("--precision", type=int, default=6,
+                     help="decimal places or significant digits (default: %(default)s)")
+    out.add_argument("--omit-default-distances", action="store_true",
+                     help="leave out distances equal to --default-dist")
+    out.add_argument("--nhx-drop-keys", nargs="*", default=[], metavar="KEY",
+                     help="NHX keys to leave out, e.g. the parser's own "
+                          "_parse_index and _had_blacklisted_child")
+    out.add_argument("--quote-labels", action="store_true",
+                     help="quote labels containing whitespace or Newick symbols")
+    prs = parser.add_argument_group("parser")
+    prs.add_argument("--root-label", default=None,
+                     help="label of the root node (default: none)")
+    prs.add_argument("--root-from-filename", action="store_true",
+                     help="label the root by the name of the input file")
+    prs.add_argument("--line-delim", default=";")
+    prs.add_argument("--waypoint-sep", default=",")
+    prs.add_argument("--label-dist-sep", default=":")
+    prs.add_argument("--blacklist", nargs="*", default=["n.a.", "O", "Unclassified"],
+                     metavar="LABEL", help="blacklisted labels (default: %(default)s)")
+    prs.add_argument("--blacklist-strat", default=BlacklistTokenStrat.DROP_AFTER_FIRST.name,
+                     choices=[s.name for s in BlacklistTokenStrat])
+    prs.add_argument("--default-dist", type=float, default=1.0)
+    prs.add_argument("--dist-adjust", choices=DIST_ADJUST_STRATS, default="average",
+                     help="distance adjustment on duplicates (default: %(default)s)")
+    prs.add_argument("--aggregate-lines", type=int, default=0, metavar="N",
+                     help="pre-aggregate up to N distinct repeated lines before "
+                          "inserting them, for inputs with many duplicates "
+                          "(default: off)")
+    parser.add_argument("-j", "--jobs", type=int, default=0,
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="do not report progress on stderr")
+    return parser
+
+def main(argv:list=None) -> int:
+    """
+    Entry point of the `newick` command.
+
+    Returns:
+        int: the exit code: 0 on success, 1 if any input failed, 2 on
+        invalid arguments.
+    """
+    parser = gen_arg_parser()
+    args = parser.parse_args(argv)
+    try:
+        files = collect_inputs(args.inputs, args.pattern, args.recursive,
+                               with_base_dirs=True)
+    except ValueError as e:
+        parser.error(f"{e.args[0]}: {e.args[1]}")
+    outputs = [None] * len(files)
+    if args.output_dir is not None:
+        outputs = [output_path(f, args.output_dir, args.suffix, base_dir)
+                   for f, base_dir in files]
+        # e.g. glob matches of the same name in different directories
+        seen = dict()
+        for (f, _), out in zip(files, outputs):
+            key = os.path.normcase(out)
+            if key in seen:
+                parser.error(f"{seen[key]} and {f} would both be written to {out}")
+            seen[key] = f
+        for out_dir in dict.fromkeys(os.path.dirname(out) for out in outputs):
+            os.makedirs(out_dir, exist_ok=True)
+    opts = _gen_options(args)
+    tasks = [(f, out, opts) for (f, _), out in zip(files, outputs)]
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    jobs = min(jobs, len(tasks))
+    failed = 0
+    if jobs <= 1:
+        results = map(convert_file, tasks)
+        pool = None
+    else:
+        from multiprocessing import Pool
+        pool = Pool(jobs)
+        # results are yielded in order, as soon as they are available;
+        # batching many small files saves round trips to the workers
+        chunksize = max(1, min(16, len(tasks) // (jobs * 4)))
+        results = pool.imap(convert_file, tasks, chunksize=chunksize)
+    try:
+        for done, (input_file, out, error) in enumerate(results, 1):
+            if error is not None:
+                failed += 1
+                print(f"newick: {input_file}: {error}", file=sys.stderr)
+            elif out is not None:
+                sys.stdout.write(out)
+            if not args.quiet and args.output_dir is not None:
+                print(f"[{done}/{len(tasks)}] {input_file}", file=sys.stderr)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return 1 if failed > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,311 @@
+"""
+Transparent reading and writing of compressed text files (gzip, bz2,
+xz and, if the standard library provides it, zstd).
+
+Decompression and compression run on a background thread, so that
+they overlap with parsing and serialization. The codecs release the
+GIL while they work.
+"""
+import codecs
+import os
+import queue
+import threading
+
+
+# name -> (magic bytes, file extensions, module providing `open()`)
+CODECS = {
+    "gzip":  (b"\x1f\x8b",                  (".gz", ".gzip"),  "gzip"),
+    "bz2":   (b"BZh",                       (".bz2",),         "bz2"),
+    "xz":    (b"\xfd7zXZ\x00",              (".xz", ".lzma"),  "lzma"),
+    "zstd":  (b"\x28\xb5\x2f\xfd",          (".zst", ".zstd"), "compression.zstd"),
+}
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+_END = object()  # marks the end of a queue
+
+
+def is_available(compression:str) -> bool:
+    """
+    Returns:
+        bool: whether the codec of the given name can be used with
+        this Python installation (zstd is in the standard library
+        from Python 3.14 on).
+    """
+    try:
+        _get_module(compression)
+    except ValueError:
+        return False
+    return True
+
+def _get_module(compression:str):
+    if compression not in CODECS:
+        msg = \
+            "Unknown compression. Use one of " + ", ".join(CODECS) + "."
+        raise ValueError(compression, msg)
+    module = CODECS[compression][2]
+    try:
+        return __import__(module, fromlist=["open"])
+    except ImportError:
+        msg = \
+            "This compression is not supported by your Python installation."
+        raise ValueError(compression, msg)
+
+def compression_by_extension(filename:str) -> str:
+    """
+    Returns:
+        str: the name of the compression belonging to the extension of
+        `filename`, or None if it is not a known one.
+    """
+    ext = os.path.splitext(str(filename))[1].lower()
+    for name, (_, exts, _) in CODECS.items():
+        if ext in exts:
+            return name
+    return None
+
+def detect_compression(filename:str) -> str:
+    """
+    Detects the compression of an existing file by its magic bytes,
+    or by its extension if the file is too short.
+
+    Returns:
+        str: the name of the compression, or None if the file is not
+        compressed.
+    """
+    with open(filename, 'rb') as f:
+        head = f.read(8)
+    for name, (magic, _, _) in CODECS.items():
+        if head.startswith(magic):
+            return name
+    if len(head) < 6:
+        return compression_by_extension(filename)
+    return None
+
+def open_binary(filename:str, mode:str='rb', compression:str="auto", level:int=None):
+    """
+    Opens a file in binary mode, decompressing or compressing it if
+    needed.
+
+    Args:
+        filename (str): path of the file.
+        mode (str, optional): 'rb', 'wb' or 'ab'. Defaults to 'rb'.
+        compression (str, optional):
+            Name of the compression (see `CODECS`), None for none, or
+            "auto" to detect it when reading (see
+            `detect_compression()`) and to choose it by the extension
+            when writing. Defaults to "auto".
+        level (int, optional):
+            Compression level, or None for the codec's default.
+
+    Returns:
+        A binary file object.
+    """
+    if compression == "auto":
+        if 'r' in mode:
+            compression = detect_compression(filename)
+        else:
+            compression = compression_by_extension(filename)
+    if compression is None:
+        return open(filename, mode)
+    module = _get_module(compression)
+    if level is None or 'r' in mode:
+        return module.open(filename, mode)
+    if compression == "xz":
+        return module.open(filename, mode, preset=level)
+    if compression == "zstd":
+        return module.open(filename, mode, level=level)
+    return module.open(filename, mode, compresslevel=level)
+
+
+class BackgroundReader:
+    """
+    Reads a (possibly compressed) text file on a background thread and
+    provides its content as an iterator of decoded chunks.
+    At most `queue_size` chunks are read ahead.
+    """
+
+    def __init__(self,
+                 filename:str,
+                 encoding:str="utf-8",
+                 compression:str="auto",
+                 chunk_size:int=DEFAULT_CHUNK_SIZE,
+                 queue_size:int=8):
+        """
+        Opens the file and starts reading.
+
+        Args:
+            filename (str): path of the file.
+            encoding (str, optional): text encoding. Defaults to "utf-8".
+            compression (str, optional): see `open_binary()`.
+                Defaults to "auto".
+            chunk_size (int, optional):
+                number of (uncompressed) bytes per chunk.
+            queue_size (int, optional):
+                maximum number of chunks read ahead.
+        """
+        self._file = open_binary(filename, 'rb', compression)
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._chunk_size = chunk_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stop:
+                data = self._file.read(self._chunk_size)
+                if not data:
+                    break
+                text = self._decoder.decode(data)
+                if text:
+                    self._queue.put(text)
+            if not self._stop:
+                text = self._decoder.decode(b"", final=True)
+                if text:
+                    self._queue.put(text)
+        except BaseException as e:
+            self._queue.put(e)
+        finally:
+            self._file.close()
+            self._queue.put(_END)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def close(self):
+        """
+        Stops reading and releases the file.
+        """
+        self._stop = True
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self._thread.join()
+
+    def __enter__(self) -> 'BackgroundReader':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+class BackgroundWriter:
+    """
+    Text stream that encodes, compresses (if needed) and writes to a
+    file on a background thread, so that the producer is not stalled.
+    Close it (or use it as a context manager) to flush everything;
+    errors of the background thread are raised on `write()` or
+    `close()`.
+    """
+
+    def __init__(self,
+                 filename:str,
+                 encoding:str="utf-8",
+                 compression:str="auto",
+                 level:int=None,
+                 queue_size:int=8):
+        """
+        Opens the file for writing, replacing its content.
+
+        Args:
+            filename (str): path of the file.
+            encoding (str, optional): text encoding. Defaults to "utf-8".
+            compression (str, optional): see `open_binary()`.
+                Defaults to "auto" (by extension).
+            level (int, optional): compression level, or None for the
+                codec's default.
+            queue_size (int, optional):
+                maximum number of pending writes.
+        """
+        self._file = open_binary(filename, 'wb', compression, level)
+        self._encoding = encoding
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _END:
+                    break
+                if self._error is None:
+                    self._file.write(item.encode(self._encoding))
+        except BaseException as e:
+            self._error = e
+            # keep consuming, so that the producer does not block
+            while self._queue.get() is not _END:
+                pass
+        finally:
+            try:
+                self._file.close()
+            except BaseException as e:
+                if self._error is None:
+                    self._error = e
+
+    def write(self, text:str) -> int:
+        if self._error is not None:
+            raise self._error
+        if self._closed:
+            msg = \
+                "The writer has been closed."
+            raise ValueError(self, msg)
+        self._queue.put(text)
+        return len(text)
+
+    def close(self):
+        """
+        Writes all pending data and closes the file.
+        """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_END)
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self) -> 'BackgroundWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def write_tree_file(tree,
+                    filename:str,
+                    encoding:str="utf-8",
+                    compression:str="auto",
+                    level:int=None,
+                    **kwargs) -> int:
+    """
+    Writes a tree to a (possibly compressed) file, see `Tree.write()`.
+    The tree is serialized one top-level subtree at a time, while the
+    previous parts are compressed and written on a background thread.
+
+    Args:
+        tree (Tree): the tree to write.
+        filename (str): path of the file.
+        encoding (str, optional): text encoding. Defaults to "utf-8".
+        compression (str, optional): see `open_binary()`.
+            Defaults to "auto" (by extension).
+        level (int, optional): compression level, or None for the
+            codec's default.
+        **kwargs: the arguments of `Tree.write()`.
+
+    Returns:
+        int: the number of characters written.
+    """
+    with BackgroundWriter(filename, encoding, compression, level) as writer:
+        return tree.write(writer, **kwargs)
@@ -0,0 +1,276 @@
+"""
+Reading and writing of forests: files holding many `;`-terminated
+Newick trees (e.g. bootstrap replicates or per-gene trees).
+
+Trees are read one at a time, so that a forest never has to be held
+in memory as a whole. The tokenizer and the reader/writer threads are
+set up once per file and reused for all its trees.
+"""
+import re
+from collections.abc import Iterable, Iterator
+from newick.backend.tree import Tree
+from newick.backend.node import Node, RootNode
+from newick.backend.nhx_util import parse_nhx
+
+
+# tokens of Newick trees: '(' ')' ',' ';' "[comment]" ":distance" "label"
+_RE_TOKEN = re.compile(r"""
+      (?P<sym>[(),;])
+    | (?P<comment>\[(?:\\.|[^\]\\])*\])
+    | :\s*(?P<dist>[^\s,();\[]+)
+    | (?P<quoted>'(?:[^']|'')*')
+    | (?P<label>[^,();:\[\]']+)
+    """, re.VERBOSE | re.DOTALL)
+
+# symbols that matter when splitting a stream into trees
+_RE_SPLIT = re.compile(r"[\[\]'\\;]")
+
+
+def parse_newick(text:str, default_dist:float=1.0) -> Tree:
+    """
+    Parses a single tree in Newick (or NHX) format, e.g. one written
+    by `Tree.to_string()`.
+
+    Note:
+      * NHX comments are read into the additional info; all keys and
+        values are strings. Other comments are ignored.
+      * Hybrid nodes are read as regular nodes (with "#id" labels).
+      * Children with the same label are merged like duplicates.
+
+    Args:
+        text (str): the tree, with or without the terminating ";".
+        default_dist (float, optional):
+            Distance of nodes without a distance. Defaults to 1.0.
+
+    Raises:
+        ValueError: When the text is not a well-formed tree.
+
+    Returns:
+        Tree: the tree.
+    """
+    # stack of the child lists of the currently open nodes
+    stack = [[]]
+    # the node being read: label, distance, additional info, children
+    cur = None
+    for m in _RE_TOKEN.finditer(text):
+        kind = m.lastgroup
+        if kind == "label":
+            label = m.group(kind).strip()
+            if label == "":
+                continue
+            if cur is None:
+                cur = [label, None, None, None]
+            elif cur[0] == "":
+                cur[0] = label
+            else:
+                msg = \
+                    "Unexpected label."
+                raise ValueError(m.start(), msg)
+        elif kind == "sym":
+            sym = m.group(kind)
+            if sym == '(':
+                if cur is not None:
+                    msg = \
+                        "Unexpected '('."
+                    raise ValueError(m.start(), msg)
+                stack.append([])
+            elif sym == ',' or sym == ')':
+                if len(stack) <= 1:
+                    msg = \
+                        "Unexpected '" + sym + "'."
+                    raise ValueError(m.start(), msg)
+                stack[-1].append(_gen_node(cur, default_dist))
+                cur = None
+                if sym == ')':
+                    cur = ["", None, None, stack.pop()]
+            else:  # ';'
+                break
+        else:
+            if cur is None:
+                cur = ["", None, None, None]
+            if kind == "quoted":
+                cur[0] = m.group(kind)[1:-1].replace("''", "'")
+            elif kind == "comment":
+                comment = m.group(kind)
+                if comment.startswith("[&&NHX"):
+                    cur[2] = parse_nhx(comment)
+            else:
+                cur[1] = float(m.group(kind))
+    if len(stack) != 1:
+        msg = \
+            "Unbalanced parentheses."
+        raise ValueError(text, msg)
+    if cur is None:
+        cur = ["", None, None, None]
+    root = RootNode(cur[0],
+                    additional_info=cur[2],
+                    children=cur[3] or [])
+    return Tree(root, default_dist=default_dist)
+
+def _gen_node(cur:list, default_dist:float) -> Node:
+    if cur is None:
+        cur = ["", None, None, None]
+    label, dist, info, children = cur
+    return Node(label,
+                distance=default_dist if dist is None else dist,
+                additional_info=info,
+                children=children or [])
+
+def split_trees(chunks:Iterable[str]) -> Iterator[str]:
+    """
+    Splits a text given in chunks (e.g. by a `BackgroundReader`) into
+    the texts of the single trees, at every ";" that is neither in a
+    comment nor in a quoted label. Whitespace-only rests are dropped.
+
+    Yields:
+        str: the text of each tree, including its ";".
+    """
+    in_comment = False
+    in_quote = False
+    escaped = False
+    parts = []
+    for chunk in chunks:
+        start = 0
+        skip = -1
+        if escaped:
+            skip = 0
+            escaped = False
+        for m in _RE_SPLIT.finditer(chunk):
+            pos = m.start()
+            if pos == skip:
+                continue
+            c = m.group()
+            if in_comment:
+                if c == '\\':
+                    if pos + 1 < len(chunk):
+                        skip = pos + 1
+                    else:
+                        escaped = True
+                elif c == ']':
+                    in_comment = False
+            elif in_quote:
+                if c == "'":
+                    in_quote = False
+            elif c == '[':
+                in_comment = True
+            elif c == "'":
+                in_quote = True
+            elif c == ';':
+                parts.append(chunk[start:pos + 1])
+                yield ''.join(parts)
+                parts = []
+                start = pos + 1
+        parts.append(chunk[start:])
+    rest = ''.join(parts)
+    if not rest.isspace() and rest != "":
+        yield rest
+
+def iter_newick(chunks:Iterable[str], default_dist:float=1.0) -> Iterator[Tree]:
+    """
+    Parses the trees of a forest given as a text or in chunks, one at
+    a time.
+
+    Args:
+        chunks (Iterable[str]): the text, or chunks of it.
+        default_dist (float, optional): see `parse_newick()`.
+
+    Yields:
+        Tree: the trees, in order.
+    """
+    if isinstance(chunks, str):
+        chunks = (chunks,)
+    for text in split_trees(chunks):
+        yield parse_newick(text, default_dist)
+
+def read_forest(filename:str,
+                default_dist:float=1.0,
+                encoding:str="utf-8",
+                compression:str="auto",
+                chunk_size:int=1 << 20) -> Iterator[Tree]:
+    """
+    Reads the trees of a (possibly compressed) forest file lazily, one
+    at a time, while the next chunks are read and decompressed on a
+    background thread.
+
+    Args:
+        filename (str): path of the file.
+        default_dist (float, optional): see `parse_newick()`.
+        encoding (str, optional): text encoding. Defaults to "utf-8".
+        compression (str, optional):
+            see `compression.open_binary()`. Defaults to "auto".
+        chunk_size (int, optional):
+            Number of (decompressed) bytes to read at once.
+
+    Yields:
+        Tree: the trees, in order.
+    """
+    from newick.frontend.compression import BackgroundReader
+    with BackgroundReader(filename, encoding, compression, chunk_size) as reader:
+        yield from iter_newick(reader, default_dist)
+
+def write_forest(trees:Iterable[Tree],
+                 file,
+                 encoding:str="utf-8",
+                 compression:str="auto",
+                 level:int=None,
+                 **kwargs) -> int:
+    """
+    Writes many trees into one stream or file, one per line.
+    The output options are applied to all trees; a label table, batch
+    mapper or distance formatter is set up once and shared by all
+    trees.
+
+    Args:
+        trees (Iterable[Tree]): the trees, e.g. from `read_forest()`.
+        file:
+            A text stream (with a `write(str)` method), or the path of
+            a file to (re-)write, which is compressed on a background
+            thread if the extension asks for it.
+        encoding (str, optional): text encoding of a file.
+            Defaults to "utf-8".
+        compression (str, optional): see `compression.open_binary()`.
+            Defaults to "auto" (by extension).
+        level (int, optional): compression level of a file.
+        **kwargs: the arguments of `Tree.write()`.
+
+    Returns:
+        int: the number of characters written.
+    """
+    if not hasattr(file, "write"):
+        from newick.frontend.compression import BackgroundWriter
+        with BackgroundWriter(file, encoding, compression, level) as writer:
+            return write_forest(trees, writer, **kwargs)
+    kwargs.setdefault("append_newline", True)
+    # small trees are collected, so that `file` is written in blocks
+    buf = _BlockBuffer(file)
+    ret = 0
+    for tree in trees:
+        ret += tree.write(buf, **kwargs)
+    buf.flush()
+    return ret
+
+
+class _BlockBuffer:
+    """
+    Collects written strings and passes them on in blocks of at least
+    `block_size` characters.
+    """
+
+    def __init__(self, stream, block_size:int=65536):
+        self._stream = stream
+        self._block_size = block_size
+        self._parts = []
+        self._len = 0
+
+    def write(self, text:str) -> int:
+        self._parts.append(text)
+        self._len += len(text)
+        if self._len >= self._block_size:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self._len > 0:
+            self._stream.write(''.join(self._parts))
+            self._parts = []
+            self._len = 0
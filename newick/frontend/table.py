@@ -0,0 +1,348 @@
+"""
+Tabular export and import of trees: one row per node, with the columns
+  id, parent, label, distance, dupcount, depth
+and one column "nhx:<key>" per key of the additional info.
+
+Rows are in pre-order, so that each parent comes before its children
+and the id of a node is its row number. This allows to rebuild a tree
+from a table in one linear pass.
+
+Tables can be written as CSV (values as text) or in a binary columnar
+layout (typed columns, see `write_columnar()`), both using the
+standard library only.
+
+Additional info values other than int, float and str are written as
+their string representation and are read back as strings, e.g. the
+sets of line indices under `very_basic.PARSER_INFO_KEYS` come back as
+"{'0', '3'}". Convert or remove such values before the export if they
+are needed as such.
+"""
+from array import array
+import csv
+import json
+import sys
+from newick.backend.tree import Tree
+from newick.backend.node import Node, RootNode
+
+
+BASE_COLUMNS = ("id", "parent", "label", "distance", "dupcount", "depth")
+INFO_PREFIX = "nhx:"
+
+_COLUMNAR_MAGIC = b"NWKCOL1\0"
+
+
+def to_columns(tree:Tree) -> dict:
+    """
+    Flattens the `tree` into columns in a single iterative pre-order
+    pass. Nodes appearing in several places (hybrids and shared
+    subtrees) get a row per place.
+
+    Args:
+        tree (Tree): the tree.
+
+    Returns:
+        dict: the columns by name: "id", "parent" (-1 for the root),
+        "dupcount" and "depth" as `array('q')`, "distance" as
+        `array('d')`, "label" as a list, and a list per additional info
+        key (named `INFO_PREFIX + key`, None where a node lacks the
+        key), in order of appearance.
+    """
+    parents = array('q')
+    labels = []
+    distances = array('d')
+    dupcounts = array('q')
+    depths = array('q')
+    info = dict()  # key -> list of values
+    # (node, id of parent, depth)
+    stack = [(tree._root, -1, 0)]
+    n = 0
+    while len(stack) > 0:
+        node, parent, depth = stack.pop()
+        parents.append(parent)
+        labels.append(node._label)
+        distances.append(node._distance)
+        dupcounts.append(node._dupcount)
+        depths.append(depth)
+        for key, val in node._additional_info.items():
+            col = info.get(key)
+            if col is None:
+                col = info[key] = []
+            # pad the rows of the nodes without the key since its last value
+            if len(col) < n:
+                col.extend([None] * (n - len(col)))
+            col.append(val)
+        n += 1
+        children = node._children
+        if len(children) > 0:
+            # pushed in reverse, so that they are visited in order
+            for child in reversed(list(children)):
+                stack.append((child, n - 1, depth + 1))
+    ret = {"id": array('q', range(n)),
+           "parent": parents,
+           "label": labels,
+           "distance": distances,
+           "dupcount": dupcounts,
+           "depth": depths}
+    for key, col in info.items():
+        if len(col) < n:
+            col.extend([None] * (n - len(col)))
+        ret[INFO_PREFIX + str(key)] = col
+    return ret
+
+def from_columns(columns:dict) -> Tree:
+    """
+    Rebuilds a tree from columns as created by `to_columns()`, in one
+    linear pass: the nodes are attached to their parents directly,
+    without going through paths. The "id" and "depth" columns are not
+    needed; rows have to be in an order where each parent comes before
+    its children (as in pre-order).
+
+    Args:
+        columns (dict): the columns by name. "parent" and "label" are
+            required; "distance" (1.0), "dupcount" (0) and the
+            additional info columns are optional.
+
+    Raises:
+        ValueError: When a parent does not come before its child, or
+            when there is not exactly one root (in the first row).
+
+    Returns:
+        Tree: the tree.
+    """
+    parents = columns["parent"]
+    labels = columns["label"]
+    distances = columns.get("distance")
+    dupcounts = columns.get("dupcount")
+    info_cols = [(name[len(INFO_PREFIX):], col) for name, col in columns.items()
+                 if name.startswith(INFO_PREFIX)]
+    n = len(parents)
+    if n == 0 or parents[0] != -1:
+        msg = \
+            "The first row has to be the root (with parent -1)."
+        raise ValueError(columns, msg)
+    nodes = [None] * n
+    for i in range(n):
+        info = dict()
+        for key, col in info_cols:
+            val = col[i]
+            if val is not None:
+                info[key] = val
+        parent = parents[i]
+        if i == 0:
+            nodes[0] = RootNode(labels[0], additional_info=info)
+            continue
+        if parent < 0 or parent >= i:
+            msg = \
+                "Each row has to come after the row of its parent."
+            raise ValueError(i, msg)
+        node = Node(labels[i],
+                    distance=1.0 if distances is None else distances[i],
+                    duplicates_count=0 if dupcounts is None else dupcounts[i],
+                    additional_info=info)
+        _, nodes[i] = nodes[parent].add_child(node)
+    return Tree(nodes[0])
+
+def _gen_columns(tree_or_columns) -> dict:
+    if isinstance(tree_or_columns, Tree):
+        return to_columns(tree_or_columns)
+    return tree_or_columns
+
+def write_csv(tree_or_columns, file) -> int:
+    """
+    Writes a tree (or its columns, see `to_columns()`) as CSV, with a
+    header row. Missing additional info values are written as empty
+    cells.
+
+    Args:
+        tree_or_columns (Tree | dict): the tree or its columns.
+        file: a text stream, or the path of a file to (re-)write.
+
+    Returns:
+        int: the number of rows written (without the header).
+    """
+    if not hasattr(file, "write"):
+        with open(file, 'w', newline='', encoding="utf-8") as f:
+            return write_csv(tree_or_columns, f)
+    columns = _gen_columns(tree_or_columns)
+    writer = csv.writer(file)
+    writer.writerow(columns.keys())
+    cols = [["" if v is None else v for v in col] if isinstance(col, list) else col
+            for col in columns.values()]
+    writer.writerows(zip(*cols))
+    return len(columns["parent"])
+
+def read_csv(file) -> Tree:
+    """
+    Reads a tree from a CSV file as written by `write_csv()`.
+    Additional info values are read as strings (like from NHX), and
+    empty cells as missing values.
+
+    Args:
+        file: a text stream, or the path of a file.
+
+    Raises:
+        ValueError: When the table is malformed, see `from_columns()`.
+
+    Returns:
+        Tree: the tree.
+    """
+    if not hasattr(file, "read"):
+        with open(file, newline='', encoding="utf-8") as f:
+            return read_csv(f)
+    reader = csv.reader(file)
+    header = next(reader, None)
+    if header is None or "parent" not in header or "label" not in header:
+        msg = \
+            "The CSV file has no header with the parent and label columns."
+        raise ValueError(file, msg)
+    cols = [list(col) for col in zip(*reader)] or [[] for _ in header]
+    columns = dict()
+    for name, col in zip(header, cols):
+        if name in ("id", "parent", "dupcount", "depth"):
+            columns[name] = array('q', map(int, col))
+        elif name == "distance":
+            columns[name] = array('d', map(float, col))
+        elif name.startswith(INFO_PREFIX):
+            columns[name] = [None if v == "" else v for v in col]
+        else:
+            columns[name] = col
+    return from_columns(columns)
+
+
+def _column_type(col) -> tuple:
+    """
+    Returns:
+        tuple: the type of the column in the columnar layout ("int",
+        "float" or "str") and whether it contains missing values.
+    """
+    if isinstance(col, array):
+        return ("int" if col.typecode == 'q' else "float", False)
+    nullable = False
+    kind = "int"
+    for val in col:
+        if val is None:
+            nullable = True
+        elif kind == "int" and type(val) is int:
+            pass
+        elif kind != "str" and type(val) in (int, float):
+            kind = "float"
+        else:
+            kind = "str"
+    return (kind, nullable)
+
+def write_columnar(tree_or_columns, file) -> int:
+    """
+    Writes a tree (or its columns, see `to_columns()`) in a binary
+    columnar layout:
+      * the magic bytes `b"NWKCOL1\\0"`,
+      * the length (8 bytes, little-endian) of a JSON header holding
+        the byte order, the number of rows and the name, type ("int",
+        "float" or "str") and nullability of each column,
+      * the header,
+      * the columns, one after the other: a validity byte per row if
+        nullable, then 8 byte integers or floats per row, or for
+        strings the offsets (rows + 1 integers, in characters), the
+        length of the text in bytes and the UTF-8 text of all values.
+    Integers and floats keep their type (other additional info values
+    are written as strings), and each numeric column can be read with a
+    single `array.frombytes()`.
+
+    Args:
+        tree_or_columns (Tree | dict): the tree or its columns.
+        file: a binary stream, or the path of a file to (re-)write.
+
+    Returns:
+        int: the number of rows written.
+    """
+    if not hasattr(file, "write"):
+        with open(file, 'wb') as f:
+            return write_columnar(tree_or_columns, f)
+    columns = _gen_columns(tree_or_columns)
+    n = len(columns["parent"])
+    specs = []
+    for name, col in columns.items():
+        kind, nullable = _column_type(col)
+        specs.append({"name": name, "type": kind, "nullable": nullable})
+    header = json.dumps({"byteorder": sys.byteorder,
+                         "rows": n,
+                         "columns": specs}).encode("utf-8")
+    file.write(_COLUMNAR_MAGIC)
+    file.write(len(header).to_bytes(8, "little"))
+    file.write(header)
+    for spec, col in zip(specs, columns.values()):
+        if spec["nullable"]:
+            file.write(bytes(0 if v is None else 1 for v in col))
+        kind = spec["type"]
+        if kind == "str":
+            texts = ["" if v is None else str(v) for v in col]
+            offsets = array('q', [0])
+            pos = 0
+            for text in texts:
+                pos += len(text)
+                offsets.append(pos)
+            data = ''.join(texts).encode("utf-8")
+            file.write(offsets.tobytes())
+            file.write(array('q', [len(data)]).tobytes())
+            file.write(data)
+        elif isinstance(col, array):
+            file.write(col.tobytes())
+        else:
+            typecode = 'q' if kind == "int" else 'd'
+            zero = 0 if kind == "int" else 0.0
+            file.write(array(typecode, (zero if v is None else v for v in col))
+                       .tobytes())
+    return n
+
+def read_columns(file) -> dict:
+    """
+    Reads the columns of a file written by `write_columnar()`.
+
+    Args:
+        file: a binary stream, or the path of a file.
+
+    Raises:
+        ValueError: When the file is not in the columnar layout.
+
+    Returns:
+        dict: the columns by name, see `to_columns()`.
+    """
+    if not hasattr(file, "read"):
+        with open(file, 'rb') as f:
+            return read_columns(f)
+    if file.read(len(_COLUMNAR_MAGIC)) != _COLUMNAR_MAGIC:
+        msg = \
+            "The file is not in the columnar layout."
+        raise ValueError(file, msg)
+    header_len = int.from_bytes(file.read(8), "little")
+    header = json.loads(file.read(header_len).decode("utf-8"))
+    n = header["rows"]
+    swap = header["byteorder"] != sys.byteorder
+    ret = dict()
+    for spec in header["columns"]:
+        valid = file.read(n) if spec["nullable"] else None
+        kind = spec["type"]
+        if kind == "str":
+            offsets = _read_array(file, 'q', n + 1, swap)
+            n_bytes = _read_array(file, 'q', 1, swap)[0]
+            text = file.read(n_bytes).decode("utf-8")
+            col = [text[offsets[i]:offsets[i + 1]] for i in range(n)]
+        else:
+            col = _read_array(file, 'q' if kind == "int" else 'd', n, swap)
+        if valid is not None:
+            col = [v if ok else None for v, ok in zip(col, valid)]
+        ret[spec["name"]] = col
+    return ret
+
+def _read_array(file, typecode:str, count:int, swap:bool) -> array:
+    ret = array(typecode)
+    ret.frombytes(file.read(count * ret.itemsize))
+    if swap:
+        ret.byteswap()
+    return ret
+
+def read_columnar(file) -> Tree:
+    """
+    Reads a tree from a file written by `write_columnar()`, see
+    `read_columns()` and `from_columns()`.
+    """
+    return from_columns(read_columns(file))
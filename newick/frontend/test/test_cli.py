@@ -0,0 +1,86 @@
+from newick.frontend.cli import main, collect_inputs
+import pytest
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    indir = tmp_path / "in"
+    indir.mkdir()
+    for i in range(4):
+        (indir / f"t{i}.txt").write_text(f"a,b{i};a,c:2;a,n.a.,d;\n")
+    (indir / "sub").mkdir()
+    (indir / "sub" / "t9.txt").write_text("x;\n")
+    return indir
+
+def test_collect_inputs(inputs):
+    files = collect_inputs([str(inputs)])
+    assert [f.split("/")[-1] for f in files] == ["t0.txt", "t1.txt", "t2.txt", "t3.txt"]
+    assert len(collect_inputs([str(inputs)], recursive=True)) == 5
+    assert collect_inputs([str(inputs / "t1.*"), str(inputs / "t1.txt")]) \
+        == [str(inputs / "t1.txt")]
+    with pytest.raises(ValueError):
+        collect_inputs([str(inputs / "nope*")])
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_main_stdout(inputs, capsys, jobs):
+    assert main([str(inputs / "*.txt"), "-j", str(jobs), "--root-label", "r"]) == 0
+    out = capsys.readouterr().out.splitlines()
+    assert out == [f"((b{i}:1,c:2,n.a.:1)a:1)r;" for i in range(4)]
+
+def test_main_output_dir(inputs, tmp_path):
+    outdir = tmp_path / "out"
+    assert main([str(inputs), "-o", str(outdir), "-j", "2", "-q", 
+                 "--root-from-filename", "--blacklist", 
+                 "--no-distances", "--child-order", "label"]) == 0
+    assert (outdir / "t3.nwk").read_text() == "((b3,c,(d)n.a.)a)t3;\n"
+
+def test_main_output_dir_recursive(inputs, tmp_path, capsys):
+    for sub in ("s1", "s2"):
+        (inputs / sub).mkdir()
+        (inputs / sub / "x.txt").write_text(f"{sub};")
+    outdir = tmp_path / "out"
+    assert main([str(inputs), "-r", "-o", str(outdir), "-q"]) == 0
+    assert (outdir / "s1" / "x.nwk").read_text() == "(s1:1);\n"
+    assert (outdir / "s2" / "x.nwk").read_text() == "(s2:1);\n"
+    assert (outdir / "sub" / "t9.nwk").exists()
+    # same-named glob matches cannot be told apart
+    with pytest.raises(SystemExit):
+        main([str(inputs / "*" / "x.txt"), "-o", str(outdir)])
+    assert "x.txt" in capsys.readouterr().err
+
+def test_main_parser_options(inputs, capsys):
+    (inputs / "x.tsv").write_text("a|b=2.5#a|b=0.5#")
+    assert main([str(inputs / "x.tsv"), "--line-delim", "#", 
+                 "--waypoint-sep", "|", "--label-dist-sep", "=",
+                 "--dist-adjust", "new", "--float-format", "shortest"]) == 0
+    assert capsys.readouterr().out == "((b:0.5)a:1);\n"
+
+def test_main_failure(inputs, capsys):
+    (inputs / "bad.txt").write_text("a,b:x;")
+    assert main([str(inputs / "bad.txt"), str(inputs / "t0.txt")]) == 1
+    captured = capsys.readouterr()
+    assert "bad.txt" in captured.err
+    assert captured.out == "((b0:1,c:2,n.a.:1)a:1);\n"
+
+def test_main_compressed(inputs, tmp_path):
+    import gzip
+    with gzip.open(inputs / "z.txt.gz", "wt") as f:
+        f.write("a,b;a,c;")
+    outdir = tmp_path / "out"
+    assert main([str(inputs / "z.txt.gz"), "-o", str(outdir), "-q",
+                 "--suffix", ".nwk.gz", "--root-from-filename"]) == 0
+    with gzip.open(outdir / "z.nwk.gz", "rt") as f:
+        assert f.read() == "((b:1,c:1)a:1)z;\n"
+
+def test_main_compact_output(inputs, capsys):
+    (inputs / "x.txt").write_text("a b,c:2;a b,d;")
+    assert main([str(inputs / "x.txt"), "--nhx", "--omit-default-distances", 
+                 "--quote-labels", "--nhx-drop-keys", "_parse_index", 
+                 "_had_blacklisted_child"]) == 0
+    assert capsys.readouterr().out == "((c:2,d)'a b');\n"
+
+def test_main_aggregate_lines(inputs, capsys):
+    assert main([str(inputs / "t0.txt"), "--nhx", "--aggregate-lines", "2"]) == 0
+    aggregated = capsys.readouterr().out
+    assert main([str(inputs / "t0.txt"), "--nhx"]) == 0
+    assert aggregated == capsys.readouterr().out
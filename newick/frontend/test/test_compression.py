@@ -0,0 +1,49 @@
+from newick.frontend.compression import BackgroundReader, BackgroundWriter, \
+    detect_compression, is_available, open_binary, write_tree_file
+from newick.frontend.very_basic import tree_parse_basic
+import pytest
+
+
+CODECS = [c for c in ("gzip", "bz2", "xz", "zstd") if is_available(c)]
+EXTENSIONS = {"gzip": ".gz", "bz2": ".bz2", "xz": ".xz", "zstd": ".zst"}
+
+
+@pytest.mark.parametrize("codec", CODECS + [None])
+def test_roundtrip(tmp_path, codec):
+    filename = tmp_path / ("t.txt" + EXTENSIONS.get(codec, ""))
+    text = "".join(f"a{i},b{i % 7},c;\n" for i in range(5000)) + "äöü"
+    with BackgroundWriter(filename) as w:
+        for i in range(0, len(text), 1000):
+            w.write(text[i:i + 1000])
+    assert detect_compression(filename) == codec
+    # detection by magic bytes, regardless of the name
+    renamed = tmp_path / "renamed"
+    filename.rename(renamed)
+    with BackgroundReader(renamed, chunk_size=333) as r:
+        assert "".join(r) == text
+
+def test_reader_close_early(tmp_path):
+    filename = tmp_path / "t.txt.gz"
+    with open_binary(filename, 'wb') as f:
+        f.write(b"x" * 100000)
+    with BackgroundReader(filename, chunk_size=10, queue_size=2) as r:
+        assert next(iter(r)) == "x" * 10
+
+def test_reader_error(tmp_path):
+    filename = tmp_path / "t.txt"
+    filename.write_bytes(b"\x1f\x8b broken")
+    with pytest.raises(Exception):
+        with BackgroundReader(filename) as r:
+            list(r)
+
+def test_unknown_compression(tmp_path):
+    with pytest.raises(ValueError):
+        open_binary(tmp_path / "t", 'wb', compression="rar")
+
+def test_write_tree_file(tmp_path):
+    t = tree_parse_basic("a,b;a,c;d;", "r")
+    filename = tmp_path / "t.nwk.gz"
+    assert write_tree_file(t, filename, with_additional_info_nhx=True) > 0
+    assert detect_compression(filename) == "gzip"
+    with BackgroundReader(filename) as r:
+        assert "".join(r).strip() == t.to_string(with_additional_info_nhx=True)
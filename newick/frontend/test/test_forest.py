@@ -0,0 +1,58 @@
+from newick.frontend.forest import parse_newick, split_trees, iter_newick, \
+    read_forest, write_forest
+from newick.frontend.very_basic import tree_parse_basic
+from newick.backend.path import Path
+import io
+import pytest
+
+
+def test_parse_newick_roundtrip():
+    t = tree_parse_basic("a,b:2;a,c:0.5;a,b,x;d;", "r")
+    for nhx in (False, True):
+        out = t.to_string(with_additional_info_nhx=nhx)
+        assert parse_newick(out).to_string(with_additional_info_nhx=nhx) == out
+
+def test_parse_newick():
+    t = parse_newick(r" ( (x ,'y''s':3)a:2, b[&&NHX:k=v\;w][other]:1.5 )root[&&NHX:r=1];")
+    assert t.to_string(with_additional_info_nhx=True) \
+        == r"((x:1,y's:3)a:2,b[&&NHX:k=v\;w]:1.5)root[&&NHX:r=1];"
+    assert parse_newick("(a,a:3)r;").get_node(Path("r", [("a", 1.0)])) \
+        .get_duplication_count() == 1
+    assert parse_newick("r;").to_string() == "r;"
+    assert parse_newick("(,);").to_string() == "(:1);"
+    for bad in ("((a)r;", "(a))r;", "a,b;", "(a)b c(d);"):
+        with pytest.raises(ValueError):
+            parse_newick(bad)
+
+def test_split_trees():
+    text = "(a,b)r;\n(c[&&NHX:k=x\\;y])s;\n('q;',d)t;\n  \n"
+    expected = ["(a,b)r;", "\n(c[&&NHX:k=x\\;y])s;", "\n('q;',d)t;"]
+    assert list(split_trees([text])) == expected
+    # any chunking gives the same result
+    for size in (1, 2, 3, 7):
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        assert list(split_trees(chunks)) == expected
+    assert list(split_trees(["(a)r"])) == ["(a)r"]
+
+def test_forest_roundtrip(tmp_path):
+    trees = [tree_parse_basic(f"a,b{i};a,c:{i};", f"r{i}") for i in range(50)]
+    expected = ''.join(t.to_string(append_newline=True) for t in trees)
+    stream = io.StringIO()
+    assert write_forest(trees, stream) == len(expected)
+    assert stream.getvalue() == expected
+    assert [t.to_string() for t in iter_newick(expected)] \
+        == [t.to_string() for t in trees]
+    filename = tmp_path / "forest.nwk.gz"
+    write_forest(iter(trees), filename, with_additional_info_nhx=True)
+    read = list(read_forest(filename, chunk_size=64))
+    assert [t.to_string(with_additional_info_nhx=True) for t in read] \
+        == [t.to_string(with_additional_info_nhx=True) for t in trees]
+
+def test_read_forest_lazy(tmp_path):
+    filename = tmp_path / "forest.nwk"
+    filename.write_text("(a)r;\n(b)s;\n(((c)t;\n")
+    forest = read_forest(filename)
+    assert next(forest).to_string() == "(a:1)r;"
+    assert next(forest).to_string() == "(b:1)s;"
+    with pytest.raises(ValueError):
+        next(forest)
@@ -0,0 +1,70 @@
+from newick.frontend.table import to_columns, from_columns, write_csv, read_csv, \
+    write_columnar, read_columns, read_columnar
+from newick.frontend.very_basic import tree_parse_basic
+from newick.backend.path import Path
+import io
+import pytest
+
+
+def _gen_tree():
+    t = tree_parse_basic("a,b:2;a,c:0.5;a,b,x;d;d;", "r")
+    t.get_node(Path("r", [("a", 1.0)]))._additional_info.update({"n": 3, "s": "v,w"})
+    t.get_node(Path("r", [("d", 1.0)]))._additional_info.update({"n": 1.5})
+    return t
+
+def test_to_columns():
+    cols = to_columns(_gen_tree())
+    assert list(cols["label"]) == ["r", "a", "b", "x", "c", "d"]
+    assert list(cols["parent"]) == [-1, 0, 1, 2, 1, 0]
+    assert list(cols["depth"]) == [0, 1, 2, 3, 2, 1]
+    assert list(cols["dupcount"]) == [0, 0, 0, 0, 0, 1]
+    assert cols["distance"][2] == 2.0
+    assert cols["nhx:n"] == [None, 3, None, None, None, 1.5]
+    assert cols["nhx:s"] == [None, "v,w", None, None, None, None]
+
+def test_from_columns():
+    t = _gen_tree()
+    t2 = from_columns(to_columns(t))
+    assert t2.to_string() == t.to_string()
+    for label in ("a", "d"):
+        path = Path("r", [(label, 1.0)])
+        assert t2.get_node(path).get_additional_info() \
+            == t.get_node(path).get_additional_info()
+    assert t2.get_node(Path("r", [("d", 1.0)])).get_duplication_count() == 1
+    with pytest.raises(ValueError):
+        from_columns({"parent": [-1, 2, 0], "label": ["r", "a", "b"]})
+    with pytest.raises(ValueError):
+        from_columns({"parent": [0], "label": ["r"]})
+
+def test_csv():
+    t = _gen_tree()
+    f = io.StringIO()
+    assert write_csv(t, f) == 6
+    assert f.getvalue().splitlines()[0] == "id,parent,label,distance,dupcount,depth,nhx:n,nhx:s,nhx:_parse_index"
+    f.seek(0)
+    t2 = read_csv(f)
+    assert t2.to_string() == t.to_string()
+    assert t2.get_node(Path("r", [("a", 1.0)])).get_additional_info()["n"] == "3"
+    # sets (of line indices) come back as their string representation
+    c = t2.get_node(Path("r", [("a", 1.0), ("c", 0.5)]))
+    assert c.get_additional_info()["_parse_index"] == "{'1'}"
+
+def test_columnar(tmp_path):
+    t = _gen_tree()
+    path = tmp_path / "t.col"
+    assert write_columnar(t, str(path)) == 6
+    cols = read_columns(str(path))
+    assert cols["nhx:n"] == [None, 3.0, None, None, None, 1.5]
+    assert cols["nhx:s"][1] == "v,w" and cols["nhx:s"][0] is None
+    assert cols["label"] == ["r", "a", "b", "x", "c", "d"]
+    assert read_columnar(str(path)).to_string() == t.to_string()
+    # typed columns keep ints and non-ASCII labels
+    t = tree_parse_basic("ä,ö;", "r")
+    t.get_node(Path("r", [("ä", 1.0)]))._additional_info["k"] = 7
+    f = io.BytesIO()
+    write_columnar(t, f)
+    f.seek(0)
+    cols = read_columns(f)
+    assert cols["label"] == ["r", "ä", "ö"] and cols["nhx:k"] == [None, 7, None]
+    with pytest.raises(ValueError):
+        read_columns(io.BytesIO(b"nope"))
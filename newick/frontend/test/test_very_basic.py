@@ -119,4 +119,96 @@ def test_file0():
         with open("./test_file0_out.tree", "w") as out:
             out_str = t.to_string()
             out.write(out_str)
-            
\ No newline at end of file
+            
+def test_profile():
+    from newick.backend.profiling import BuildProfile
+    txt = """
+    a0,b0,c0;
+    a0,b0,c0;
+    a0,n.a.,c1;
+    n.a.;
+    """
+    prof = BuildProfile(timings=True)
+    t = tree_parse_basic(txt, "r", profile=prof,
+                         blacklist_token_strat=BlacklistTokenStrat.DROP_ENTIRE_LINE)
+    assert t.get_profile() is prof
+    assert prof.lines_parsed == 4
+    assert prof.lines_dropped == 2
+    assert prof.nodes_created == 3
+    assert prof.duplicates_merged == 1
+    assert set(prof.timings) == {"tokenize", "insert"}
+    t.to_string()
+    assert "serialize" in prof.as_dict()["timings"]
+
+def test_progress_cancel_resume(tmp_path):
+    from newick.backend.progress import CancelToken, Cancelled
+    from newick.frontend.very_basic import ParseCheckpoint
+    txt = ''.join(f"a{i % 3},b{i % 7},c{i};\n" for i in range(100))
+    expected = tree_parse_basic(txt, "r").to_string(with_additional_info_nhx=True)
+    reports = []
+    t = tree_parse_basic(txt, "r", progress=reports.append, progress_interval=10)
+    assert t.to_string(with_additional_info_nhx=True) == expected
+    assert t.get_profile() is None
+    assert [r["lines"] for r in reports] == list(range(10, 101, 10))
+    assert reports[-1]["nodes"] == t._root.get_subtree_size()
+    assert reports[0]["offset"] == txt.index(";\na1,b3,c10") + 1
+    token = CancelToken()
+    def cancel_at_30(info):
+        if info["lines"] == 30:
+            token.cancel()
+    with pytest.raises(Cancelled) as exc:
+        tree_parse_basic(txt, "r", progress=cancel_at_30, 
+                         cancel_token=token, progress_interval=10)
+    checkpoint = exc.value.checkpoint
+    assert checkpoint.index == 40
+    checkpoint.save(tmp_path / "cp")
+    checkpoint = ParseCheckpoint.load(tmp_path / "cp")
+    t = tree_parse_basic(txt, "r", resume_from=checkpoint)
+    assert t.to_string(with_additional_info_nhx=True) == expected
+
+def test_parse_file(tmp_path):
+    import gzip
+    from newick.backend.progress import CancelToken, Cancelled
+    from newick.frontend.very_basic import tree_parse_file
+    txt = ''.join(f"a{i % 3},b{i % 7}:{i},c{i};;\n" for i in range(100))
+    expected = tree_parse_basic(txt, "r", line_delim=";;")
+    filename = tmp_path / "t.txt.gz"
+    with gzip.open(filename, "wt") as f:
+        f.write(txt)
+    for chunk_size in (7, 1 << 20):
+        t = tree_parse_file(filename, "r", line_delim=";;", chunk_size=chunk_size)
+        assert t.to_string(with_additional_info_nhx=True) \
+            == expected.to_string(with_additional_info_nhx=True)
+    token = CancelToken()
+    token.cancel()
+    with pytest.raises(Cancelled) as exc:
+        tree_parse_file(filename, "r", line_delim=";;", chunk_size=7,
+                        cancel_token=token, progress_interval=30)
+    t = tree_parse_file(filename, line_delim=";;", chunk_size=7,
+                        resume_from=exc.value.checkpoint)
+    assert t.to_string(with_additional_info_nhx=True) \
+        == expected.to_string(with_additional_info_nhx=True)
+
+@pytest.mark.parametrize("strat", ["AVERAGE", "NEW", "OLD", "ROLL2"])
+def test_aggregate_lines(strat):
+    from newick.backend.tree import Tree
+    from newick.backend.profiling import BuildProfile
+    from newick.frontend.table import to_columns
+    strategy = getattr(Tree, "_DIST_ADJUST_STRAT_" + strat)
+    lines = [f"a{i % 3},b{i % 5},n.a.,c{i % 2}" for i in range(60)]
+    lines[7] = "a1:2,b2:0.5"  # explicit distances, never aggregated
+    lines[30] = "a1:3,b2:1.5,x"
+    lines[41] = "n.a.,y"
+    txt = ";".join(lines * 2)
+    for bl_strat in BlacklistTokenStrat:
+        expected_profile = BuildProfile()
+        expected = tree_parse_basic(txt, "r", blacklist_token_strat=bl_strat,
+                                    dist_adjust_strategy=strategy,
+                                    profile=expected_profile)
+        for limit in (1, 4, 1000):
+            profile = BuildProfile()
+            t = tree_parse_basic(txt, "r", blacklist_token_strat=bl_strat,
+                                 dist_adjust_strategy=strategy,
+                                 profile=profile, aggregate_lines=limit)
+            assert to_columns(t) == to_columns(expected)
+            assert profile.as_dict() == expected_profile.as_dict()
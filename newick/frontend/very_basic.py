@@ -2,10 +2,22 @@ from newick.backend.tree import Tree
 from newick.backend.node import RootNode, Node
 from newick.backend.path import Path
 from newick.backend.util_funcs import format_int
-from typing import Callable
+from newick.backend.profiling import BuildProfile
+from newick.backend.progress import CancelToken
+from time import perf_counter
+from collections.abc import Callable, Iterable
 from enum import Enum
 
 
+# keys of the additional info that the parser attaches to the nodes;
+# pass them as `nhx_key_filter` to `Tree.to_string()` to leave them out
+PARSER_INFO_KEYS = ("_parse_index", "_had_blacklisted_child")
+
+# marks a pre-aggregated line that is dropped entirely (see 
+# `aggregate_lines` of `tree_parse_basic()`)
+_DROPPED_LINE = (None, None, None)
+
+
 class BlacklistTokenStrat(Enum):
     """
     Defines constants representing the paticular strategies of 
@@ -32,6 +44,63 @@ class BlacklistTokenStrat(Enum):
     DROP_TOKEN = 1
     DROP_AFTER_FIRST = 2
     DROP_ENTIRE_LINE = 3
+
+
+class ParseCheckpoint:
+    """
+    State of an interrupted `tree_parse_basic()` run: the partially 
+    built tree and the position in the input text from where on 
+    parsing has to be resumed. 
+    Pass it as `resume_from` to continue parsing the same text.
+    """
+    
+    def __init__(self, tree:Tree, offset:int, index:int):
+        """
+        Args:
+            tree (Tree): the partially built tree.
+            offset (int): 
+                Position in the input text where the next line starts.
+            index (int): Index of the next line (see `_parse_index`).
+        """
+        self.tree = tree
+        self.offset = offset
+        self.index = index
+    
+    def save(self, filename:str):
+        """
+        Saves the checkpoint to a file (using `pickle`, so the 
+        distance adjustment strategy of the tree has to be a 
+        module-level function, e.g. one of the `Tree._DIST_ADJUST_STRAT_...`s).
+        The tree keeps changing while parsing goes on, so save a 
+        checkpoint right when it is reported.
+
+        Args:
+            filename (str): path of the file to write.
+        """
+        import pickle
+        with open(filename, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    @staticmethod
+    def load(filename:str) -> 'ParseCheckpoint':
+        """
+        Loads a checkpoint written by `save()`. 
+        Only load files from trusted sources (see `pickle`).
+
+        Args:
+            filename (str): path of the file to read.
+
+        Returns:
+            ParseCheckpoint: the checkpoint.
+        """
+        import pickle
+        with open(filename, 'rb') as f:
+            ret = pickle.load(f)
+        if not isinstance(ret, ParseCheckpoint):
+            msg = \
+                "The file does not contain a ParseCheckpoint."
+            raise ValueError(filename, msg)
+        return ret
     
 
 def tree_parse_basic(text:str, 
@@ -43,7 +112,13 @@ def tree_parse_basic(text:str,
                      blacklist:list[str]=["n.a.", "O", "Unclassified"],
                      blacklist_token_strat:BlacklistTokenStrat=BlacklistTokenStrat.DROP_AFTER_FIRST,
                      default_dist:float=1.0,
-                     dist_adjust_strategy:Callable[[Node,float],float]=None) -> Tree:
+                     dist_adjust_strategy:Callable[[Node,float],float]=None,
+                     profile:BuildProfile=None,
+                     progress:Callable[[dict],None]=None,
+                     cancel_token:CancelToken=None,
+                     progress_interval:int=10000,
+                     resume_from:ParseCheckpoint=None,
+                     aggregate_lines:int=0) -> Tree:
     """
     A very ugly, very basic parser that produces a newick tree out 
     of a given set of tree paths.
@@ -150,23 +225,267 @@ def tree_parse_basic(text:str,
               * _DIST_ADJUST_STRAT_AVERAGE:
                 Average over all the distances given for that node.
                 This is the default.
+        profile (BuildProfile, optional):
+            Profile to collect counters (and timings, if enabled in
+            the profile) in, while parsing and building the tree. 
+            It stays attached to the returned tree, so that later
+            insertions and serializations are counted as well.
+            Defaults to None (no profiling).
+        progress (Callable[[dict],None], optional):
+            Function that is called every `progress_interval` lines 
+            with a dict of the number of "lines" and "nodes" processed 
+            so far, the "offset" reached in the `text`, its "total" 
+            length, the "elapsed" seconds, the throughput in 
+            "lines_per_s" and "chars_per_s", and a "checkpoint" 
+            (`ParseCheckpoint`) to resume from. 
+            Defaults to None.
+        cancel_token (CancelToken, optional):
+            Token that is checked every `progress_interval` lines. 
+            Once it is cancelled, `progress.Cancelled` is raised, 
+            carrying a `ParseCheckpoint` of the work done so far.
+            Defaults to None.
+        progress_interval (int, optional):
+            Number of lines between two progress reports or 
+            cancellation checks. Defaults to 10000.
+        resume_from (ParseCheckpoint, optional):
+            Checkpoint of an earlier run on the same `text` to resume.
+            Parsing continues into its tree, starting from its offset,
+            and the settings of that tree (including the root label)
+            are kept. 
+            Defaults to None.
+        aggregate_lines (int, optional):
+            Maximum number of distinct lines to pre-aggregate before 
+            they are inserted into the tree, or 0 to insert every line
+            right away. Repeated lines are then only counted (with the
+            indices of their occurrences) instead of being split and 
+            merged into the tree one by one; each distinct line is 
+            inserted once per flush with its count (see 
+            `Tree.add_new_node()`). The lines are flushed in the order
+            of their first occurrence when the limit is reached, 
+            before a line with explicit distances (as the distance 
+            adjustment depends on the order of the lines, such lines 
+            are never aggregated), before progress reports or 
+            cancellation checks and at the end. The resulting tree is
+            the same as without aggregation. This pays off for inputs 
+            with many repeated lines, e.g. one classification per read.
+            Defaults to 0.
+
+    Raises:
+        Cancelled: When the `cancel_token` has been cancelled.
 
     Returns:
         Tree: An object representing a newick tree from the given 
         input. It can be converted into a newick string using the
         `to_string` method, which has a lot of options. Check it out!
     """
-    index = 0
-    lines = text.split(line_delim)
-    outtree = Tree(RootNode(root_label), 
-                   default_dist=default_dist)
-    outtree.set_dist_adjust_strat(dist_adjust_strategy)
+    if resume_from is None:
+        index = 0
+        offset = 0
+        lines = text.split(line_delim)
+        outtree = Tree(RootNode(root_label), 
+                       default_dist=default_dist)
+        outtree.set_dist_adjust_strat(dist_adjust_strategy)
+    else:
+        index = resume_from.index
+        offset = resume_from.offset
+        lines = text[offset:].split(line_delim)
+        outtree = resume_from.tree
+    return _parse_lines(outtree, lines, index, offset, len(text), 
+                        line_delim, waypoint_sep, 
+                        label_dist_sep, trim_sym, blacklist, 
+                        blacklist_token_strat, profile, progress, 
+                        cancel_token, progress_interval, aggregate_lines)
+
+def tree_parse_file(filename:str,
+                    root_label:str=None,
+                    encoding:str="utf-8",
+                    compression:str="auto",
+                    line_delim:str=";", 
+                    waypoint_sep:str=",",
+                    label_dist_sep:str=":", 
+                    trim_sym:str='\r\n ',
+                    blacklist:list[str]=["n.a.", "O", "Unclassified"],
+                    blacklist_token_strat:BlacklistTokenStrat=BlacklistTokenStrat.DROP_AFTER_FIRST,
+                    default_dist:float=1.0,
+                    dist_adjust_strategy:Callable[[Node,float],float]=None,
+                    profile:BuildProfile=None,
+                    progress:Callable[[dict],None]=None,
+                    cancel_token:CancelToken=None,
+                    progress_interval:int=10000,
+                    resume_from:ParseCheckpoint=None,
+                    chunk_size:int=1 << 20,
+                    aggregate_lines:int=0) -> Tree:
+    """
+    Parses a file like `tree_parse_basic()` parses a text, but reads 
+    it in chunks, without loading it into memory as a whole. 
+    Compressed files (gzip, bz2, xz and zstd, if available) are 
+    decompressed transparently on a background thread, so that 
+    decompression overlaps with building the tree.
+
+    Args:
+        filename (str): path of the file to parse.
+        root_label (str, optional): see `tree_parse_basic()`.
+        encoding (str, optional): 
+            Text encoding of the file. Defaults to "utf-8".
+        compression (str, optional): 
+            Compression of the file ("gzip", "bz2", "xz", "zstd"), 
+            None for an uncompressed file, or "auto" to detect it by
+            the magic bytes. Defaults to "auto".
+        chunk_size (int, optional): 
+            Number of (decompressed) bytes to read at once.
+            Defaults to 1 MiB.
+        aggregate_lines (int, optional): see `tree_parse_basic()`.
+        All other args: see `tree_parse_basic()`. The offsets (in 
+        progress reports and checkpoints) count the characters of the
+        decompressed text, and the "total" is unknown (None).
+
+    Raises:
+        Cancelled: When the `cancel_token` has been cancelled.
+
+    Returns:
+        Tree: the parsed tree.
+    """
+    from newick.frontend.compression import BackgroundReader
+    if resume_from is None:
+        index = 0
+        offset = 0
+        outtree = Tree(RootNode(root_label), 
+                       default_dist=default_dist)
+        outtree.set_dist_adjust_strat(dist_adjust_strategy)
+    else:
+        index = resume_from.index
+        offset = resume_from.offset
+        outtree = resume_from.tree
+    with BackgroundReader(filename, encoding, compression, chunk_size) as reader:
+        lines = _split_chunks(reader, line_delim, offset)
+        return _parse_lines(outtree, lines, index, offset, None, 
+                            line_delim, waypoint_sep, 
+                            label_dist_sep, trim_sym, blacklist, 
+                            blacklist_token_strat, profile, progress, 
+                            cancel_token, progress_interval, aggregate_lines)
+
+def _split_chunks(chunks:Iterable[str], line_delim:str, skip:int=0):
+    """
+    Splits a text given in chunks into lines, like `str.split()` 
+    would split the whole text, after skipping the first `skip` 
+    characters.
+    """
+    rest = ""
+    for chunk in chunks:
+        if skip > 0:
+            if len(chunk) <= skip:
+                skip -= len(chunk)
+                continue
+            chunk = chunk[skip:]
+            skip = 0
+        lines = (rest + chunk).split(line_delim)
+        rest = lines.pop()
+        yield from lines
+    yield rest
+
+def _parse_lines(outtree:Tree,
+                 lines:Iterable[str],
+                 index:int,
+                 offset:int,
+                 total:int,
+                 line_delim:str,
+                 waypoint_sep:str,
+                 label_dist_sep:str,
+                 trim_sym:str,
+                 blacklist:list[str],
+                 blacklist_token_strat:BlacklistTokenStrat,
+                 profile:BuildProfile,
+                 progress:Callable[[dict],None],
+                 cancel_token:CancelToken,
+                 progress_interval:int,
+                 aggregate_lines:int=0) -> Tree:
+    """
+    For internal use only.
+    Parses the `lines` into `outtree`, see `tree_parse_basic()`.
+    """
+    root_label = outtree._root.get_label()
+    timed = False
+    t_insert = 0.0
+    if profile is not None:
+        outtree.enable_profiling(profile)
+        timed = profile.is_timed()
+        t_tokenize = 0.0
+    # pre-aggregated lines: cleaned line -> (path, has_blacklisted_child,
+    # indices of its occurrences), or `_DROPPED_LINE`
+    aggregated = dict() if aggregate_lines > 0 else None
+    def flush():
+        nonlocal t_insert
+        if timed:
+            t_start = perf_counter()
+        for line_path, line_blacklisted, line_indices in aggregated.values():
+            if line_path is None:
+                continue
+            myaddinfo = {"_parse_index": set(map(format_int, line_indices))}
+            if blacklist_token_strat == BlacklistTokenStrat.DROP_TOKEN:
+                myaddinfo["_had_blacklisted_child"] = line_blacklisted
+            outtree.add_new_node(line_path, 
+                                 additional_info=myaddinfo, 
+                                 count=len(line_indices))
+        aggregated.clear()
+        if timed:
+            t_insert += perf_counter() - t_start
+    monitored = progress is not None or cancel_token is not None
+    if monitored:
+        # count the created nodes using a profile
+        mon_profile = outtree.get_profile()
+        mon_own_profile = mon_profile is None
+        if mon_own_profile:
+            mon_profile = outtree.enable_profiling()
+        mon_nodes = outtree._root.get_subtree_size() - mon_profile.nodes_created
+        mon_start = perf_counter()
+        mon_first_index = index
+        mon_first_offset = offset
+        delim_len = len(line_delim)
     for line in lines:
+        if monitored:
+            if index > mon_first_index \
+                    and (index - mon_first_index) % progress_interval == 0:
+                if aggregated:
+                    flush()
+                checkpoint = ParseCheckpoint(outtree, offset, index)
+                if cancel_token is not None:
+                    if mon_own_profile and cancel_token.is_cancelled():
+                        outtree.disable_profiling()
+                    cancel_token.check(checkpoint)
+                if progress is not None:
+                    elapsed = perf_counter() - mon_start
+                    rate = 1 / elapsed if elapsed > 0 else 0.0
+                    progress({"lines": index,
+                              "nodes": mon_nodes + mon_profile.nodes_created,
+                              "offset": offset,
+                              "total": total,
+                              "elapsed": elapsed,
+                              "lines_per_s": (index - mon_first_index) * rate,
+                              "chars_per_s": (offset - mon_first_offset) * rate,
+                              "checkpoint": checkpoint})
+            offset += len(line) + delim_len
+        if timed:
+            t_start = perf_counter()
         line = clean_token(line, trim_sym)
         if line != "":
+            if aggregated is not None:
+                entry = aggregated.get(line)
+                if entry is not None:
+                    # repeated line: only counted until the next flush
+                    if entry[0] is not None:
+                        entry[2].append(index)
+                    if profile is not None:
+                        profile.lines_parsed += 1
+                        if entry[0] is None:
+                            profile.lines_dropped += 1
+                    if timed:
+                        t_tokenize += perf_counter() - t_start
+                    index += 1
+                    continue
             waypoints = line.split(waypoint_sep)
             outpath = Path(root_label=root_label)
             has_blacklisted_child = False # for DROP_TOKEN strat
+            has_distances = False
             for waypoint in waypoints:
                 flag_drop_after_token = False
                 waypoint = clean_token(waypoint, trim_sym)
@@ -186,17 +505,50 @@ def tree_parse_basic(text:str,
                     ndist = float("-inf")
                 else:
                     ndist = float(waypoint_split[1])
+                    has_distances = True
                 nlabel = waypoint_split[0]
                 outpath.add(nlabel, ndist)
                 if flag_drop_after_token:
                     break
-            if outpath and len(outpath) > 1:
+            if profile is not None:
+                profile.lines_parsed += 1
+            if outpath and len(outpath) > 1 \
+                    and aggregated is not None and not has_distances:
+                if len(aggregated) >= aggregate_lines:
+                    flush()
+                aggregated[line] = (outpath, has_blacklisted_child, [index])
+                if timed:
+                    t_tokenize += perf_counter() - t_start
+            elif outpath and len(outpath) > 1:
+                if aggregated:
+                    # the lines before have to be inserted first
+                    flush()
                 myaddinfo = {"_parse_index": { format_int(index) }}
                 if blacklist_token_strat == BlacklistTokenStrat.DROP_TOKEN:
                     myaddinfo["_had_blacklisted_child"] = has_blacklisted_child
+                if timed:
+                    t_mid = perf_counter()
+                    t_tokenize += t_mid - t_start
                 outtree.add_new_node(outpath, 
                                     additional_info=myaddinfo)
+                if timed:
+                    t_insert += perf_counter() - t_mid
+            else:
+                if aggregated is not None \
+                        and len(aggregated) < aggregate_lines:
+                    aggregated[line] = _DROPPED_LINE
+                if profile is not None:
+                    profile.lines_dropped += 1
+                if timed:
+                    t_tokenize += perf_counter() - t_start
         index += 1
+    if aggregated:
+        flush()
+    if timed:
+        profile.add_time("tokenize", t_tokenize)
+        profile.add_time("insert", t_insert)
+    if monitored and mon_own_profile:
+        outtree.disable_profiling()
     return outtree
 
 def clean_token(token, trim_sym):
@@ -0,0 +1,2 @@
+import sys
+sys.path.append('.')
\ No newline at end of file
@@ -0,0 +1,41 @@
+import newick
+import subprocess
+import sys
+import pytest
+
+
+def import_times(statement:str) -> dict:
+    """
+    Runs `statement` in a fresh interpreter with `-X importtime` and 
+    returns the cumulative import time (in microseconds) by module.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                          capture_output=True, text=True, check=True)
+    ret = dict()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        ret[name.strip()] = int(cumulative)
+    return ret
+
+def test_lazy_names():
+    assert newick.parse is newick.tree_parse_basic
+    t = newick.parse("a,b;a,c;", "r")
+    assert isinstance(t, newick.Tree)
+    assert t.to_string() == "((b:1,c:1)a:1)r;"
+    assert "Tree" in dir(newick)
+    with pytest.raises(AttributeError):
+        newick.no_such_name
+
+def test_import_is_lazy():
+    times = import_times("import newick")
+    assert "newick" in times
+    assert not any(name.startswith("newick.") for name in times)
+
+def test_import_footprint():
+    times = import_times("import newick; newick.parse")
+    for heavy in ("typing", "hashlib", "pickle", "contextlib", "mmap", "re"):
+        assert heavy not in times
+    # generous budget, to catch regressions rather than to benchmark
+    assert times["newick.frontend.very_basic"] < 200_000